@@ -0,0 +1,134 @@
+import os
+import time
+import weakref
+import hashlib
+import queue
+import threading
+import state
+import profiler
+from tank_format import pack_tank, write_atomic
+from tank_journal import TankJournal, get_journal_fp, encode_journal_header, append_journal_entry
+
+AUTOSAVE_INTERVAL = 30 # Seconds between checkpoints
+AUTOSAVE_FP = os.path.join(state.SAVES_FP, "autosave")
+AUTOSAVE_UNTITLED_NAME = "Untitled"
+AUTOSAVE_COMPACT_RATIO = 1.0 # Journal size, relative to its snapshot, at which a new snapshot is written instead
+AUTOSAVE_SLOTS_KEPT = 20 # Most recent slots kept when a new one is made, older ones are deleted
+
+def is_autosave_fp(tank_fp: str) -> bool:
+    return os.path.dirname(os.path.abspath(tank_fp)) == os.path.abspath(AUTOSAVE_FP)
+
+# Checkpoints each tank to its own autosave slot as a snapshot and then journal entries, written on a worker
+class Autosaver:
+    def __init__(self, interval: float = AUTOSAVE_INTERVAL, directory: str = AUTOSAVE_FP):
+        self.interval = interval
+        self.directory = directory
+        self.session = time.strftime("%Y%m%d %H%M%S")
+        self.slots: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary() # Slot path of each tank
+        self.session_slot_fps: set[str] = set()
+        self.last_save_time = time.perf_counter()
+        self.journal = TankJournal()
+        self.journal_tank = None
+        self.journal_fp: str | None = None
+        self.journal_size = 0
+        self.snapshot_size = 0
+        self.requests: queue.Queue = queue.Queue()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.last_error: Exception | None = None
+        self.failed_writes = 0 # Only counted up by the worker
+        self.snapshot_failed_writes = 0 # failed_writes when the main thread last took a snapshot
+        self.worker = threading.Thread(target=self.run_worker, name="autosave", daemon=True)
+        self.worker.start()
+
+    def get_autosave_fp(self, tank) -> str:
+        if tank not in self.slots:
+            self.slots[tank] = self.new_slot_fp(tank)
+            self.session_slot_fps.add(self.slots[tank])
+        return self.slots[tank]
+
+    # A slot path no file has yet, which the first snapshot to it creates
+    def new_slot_fp(self, tank) -> str:
+        name = os.path.splitext(os.path.basename(tank.filepath or ''))[0] or AUTOSAVE_UNTITLED_NAME
+        path_hash = hashlib.sha1(os.path.abspath(tank.filepath).encode()).hexdigest()[:8] if tank.filepath \
+                    else 'new'
+        count = 1
+        while True:
+            suffix = f" {count}" if count > 1 else ""
+            tank_fp = os.path.join(self.directory, f"{name} {path_hash} {self.session}{suffix}.tank")
+            if tank_fp not in self.session_slot_fps and not os.path.exists(tank_fp):
+                return tank_fp
+            count += 1
+
+    # Deletes all but the most recent slots, except those of this session
+    def prune_slots(self):
+        session_slot_fps = set(self.session_slot_fps)
+        try:
+            slot_fps = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                        if name.endswith(".tank")]
+            slot_fps.sort(key=os.path.getmtime, reverse=True)
+            for tank_fp in slot_fps[AUTOSAVE_SLOTS_KEPT:]:
+                if tank_fp not in session_slot_fps:
+                    os.remove(tank_fp)
+                    if os.path.exists(get_journal_fp(tank_fp)):
+                        os.remove(get_journal_fp(tank_fp))
+        except OSError:
+            pass # Left for the next session to clear up
+
+    def needs_snapshot(self, tank, tank_fp: str) -> bool:
+        # After a failed write the journal no longer follows on from what is on disk
+        return (tank is not self.journal_tank or tank_fp != self.journal_fp
+                or self.failed_writes != self.snapshot_failed_writes
+                or self.journal_size >= self.snapshot_size * AUTOSAVE_COMPACT_RATIO)
+
+    def update(self, tank):
+        if time.perf_counter() - self.last_save_time >= self.interval and self.idle.is_set():
+            self.save(tank)
+
+    def save(self, tank):
+        tank_fp = self.get_autosave_fp(tank)
+        with profiler.section('autosave checkpoint'):
+            if self.needs_snapshot(tank, tank_fp):
+                self.snapshot_failed_writes = self.failed_writes
+                snapshot = tank.snapshot(self.journal)
+                request = ('snapshot', tank_fp, snapshot, tank.saved_at)
+                self.journal_tank = tank
+                self.journal_fp = tank_fp
+                self.journal_size = 0
+                self.snapshot_size = sum(table.nbytes for table in snapshot[0]) + len(snapshot[1])
+            else:
+                entry = tank.checkpoint(self.journal)
+                request = ('journal', tank_fp, entry)
+                self.journal_size += len(entry)
+        self.last_save_time = time.perf_counter()
+        self.idle.clear()
+        self.requests.put(request)
+
+    def run_worker(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            kind, tank_fp, *contents = request
+            try:
+                if kind == 'snapshot':
+                    snapshot, saved_at = contents
+                    os.makedirs(os.path.dirname(tank_fp), exist_ok=True)
+                    is_new_slot = not os.path.exists(tank_fp)
+                    write_atomic(tank_fp, pack_tank(*snapshot))
+                    write_atomic(get_journal_fp(tank_fp), encode_journal_header(saved_at))
+                    if is_new_slot:
+                        self.prune_slots()
+                else:
+                    append_journal_entry(get_journal_fp(tank_fp), contents[0])
+                self.last_error = None
+            except OSError as error:
+                self.last_error = error
+                self.failed_writes += 1
+            finally:
+                self.idle.set()
+
+    # Finish any write in progress and stop the worker
+    def close(self, timeout: float | None = None):
+        self.requests.put(None)
+        self.worker.join(timeout)
@@ -4,14 +4,10 @@ class Angle(Organism):
     def __init__(self, softbody: Softbody):
         super().__init__(softbody)
 
-    def render(self, tank_rect: pygame.Rect) -> pygame.Surface:
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
-
+    def draw_onto(self, surface: pygame.Surface):
         for link in self.softbody.links:
             pygame.draw.line(surface, BLACK, link.v1.x_y(), link.v2.x_y())
 
-        return surface
-
     def update_ai(self, tank):
         pass
 
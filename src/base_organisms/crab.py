@@ -17,8 +17,7 @@ class Crab(Organism):
         pygame.draw.line(surface, BLACK, (limb.v1.x, limb.v1.y), 
                          (limb.v2.x, limb.v2.y), max(1, int(self.size / 6)))
         
-    def render(self, tank_rect: pygame.Rect) -> pygame.Surface:
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
+    def draw_onto(self, surface: pygame.Surface):
         body_top_left, body_top_right, body_bottom_left, body_bottom_right = self.softbody.vertices[:4]
         arm_left, arm_right, clawtip_left, clawtip_right = self.softbody.vertices[-4:]
         limbs = self.softbody.links[4:-4]
@@ -36,8 +35,9 @@ class Crab(Organism):
             self.render_limb_onto(limb, surface)
 
         # Claws
-        
-        return surface
+
+    def render_margin(self) -> float:
+        return self.size/12 + 2
 
     def update_ai(self, tank):
         pass
@@ -111,15 +111,14 @@ class Crab(Organism):
     def bubble_spawn_chance(self) -> float | None:
         return CRAB_BUBBLE_SPAWN_CHANCE
     
-    def to_json(self) -> dict:
-        json_dict = super().to_json()
+    def to_fields(self) -> dict:
+        json_dict = super().to_fields()
         json_dict['type'] = 'Crab'
         json_dict['size'] = self.size
         return json_dict
     
     @staticmethod
-    def from_json(json_dict: dict, ids_to_vertices: dict):
-        softbody = Softbody.from_json(json_dict['softbody'], ids_to_vertices)
+    def from_fields(json_dict: dict, softbody: Softbody):
         return Crab(softbody, json_dict['size'])
     
     @staticmethod
@@ -11,14 +11,13 @@ class Egg(Organism):
         self.radius = radius
         self.density = density
 
-    def render(self, tank_rect: pygame.Rect) -> pygame.Surface:
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
-
+    def draw_onto(self, surface: pygame.Surface):
         shell_color = (self.color.r, self.color.g, self.color.b, min(255, self.color.a*2))
         pygame.draw.circle(surface, self.color, self.root_position(), self.radius)
         pygame.draw.circle(surface, shell_color, self.root_position(), self.radius, 1)
 
-        return surface
+    def render_margin(self) -> float:
+        return self.radius + 2
 
     def update_ai(self, tank):
         if self.age > self.hatch_age:
@@ -33,8 +32,8 @@ class Egg(Organism):
         egg_softbody = Softbody([Vertex(x, y, density, [], VertexFlag.EGG)], [])
         return Egg(egg_softbody, species, hatch_age, color, radius, density)
     
-    def to_json(self) -> dict:
-        json_dict = super().to_json()
+    def to_fields(self) -> dict:
+        json_dict = super().to_fields()
         json_dict['type'] = 'Egg'
         json_dict['species'] = self.species.__name__
         json_dict['hatch_age'] = self.hatch_age
@@ -44,9 +43,8 @@ class Egg(Organism):
         return json_dict
     
     @staticmethod
-    def from_json(json_dict: dict, ids_to_vertices: dict):
+    def from_fields(json_dict: dict, softbody: Softbody):
         from tank import SUPPORTED_ORGANISM_TYPES
-        softbody = Softbody.from_json(json_dict['softbody'], ids_to_vertices)
         age = json_dict['age']
         species: Type[Organism] = SUPPORTED_ORGANISM_TYPES[json_dict['species']]
         hatch_age = json_dict['hatch_age']
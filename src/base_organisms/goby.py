@@ -1,5 +1,3 @@
-from pygame import Rect
-from pygame.surface import Surface
 from organism import *
 from softbody import *
 from resources import *
@@ -103,12 +101,12 @@ class Goby(Organism):
             self.turn_around()
 
     def random_wander_destination(self) -> tuple[int, int]:
-        collision_sculptures = state.selected_tank.get_collision_sculptures() # type: ignore
+        static_collision = state.selected_tank.get_static_collision() # type: ignore
         destination = (0, 0)
         for _ in range(20):
             destination = (random.randint(10, state.tank_width()-10),
                         random.randint(10, state.tank_height()-10))
-            if not Vertex.collides_with_any_sculptures(*destination, collision_sculptures):
+            if not static_collision.contains_point(*destination):
                 return destination
         return destination
 
@@ -142,8 +140,7 @@ class Goby(Organism):
             tailfin.lx -= self.fin_position * self.direction[1] * min(2, self.speed) * 10
             tailfin.ly -= self.fin_position * self.direction[0] * min(2, self.speed) * 10
     
-    def render(self, tank_rect: Rect) -> Surface:
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
+    def draw_onto(self, surface: pygame.Surface):
         head, abdomen, knee, tailfin = self.softbody.vertices
 
         pygame.draw.polygon(surface, GOBY_FIN_COLOR, [
@@ -167,7 +164,8 @@ class Goby(Organism):
         if self.alive:
             surface.set_at((int(head.x), int(head.y-1)), GOBY_EYE_COLOR)
 
-        return surface
+    def render_margin(self) -> float:
+        return self.size/4 + 2
     
     @staticmethod
     def generate_random(root_position: tuple[float, float], age: int | None = None):
@@ -208,8 +206,8 @@ class Goby(Organism):
     def bubble_spawn_chance(self) -> float | None:
         return GOBY_BUBBLE_SPAWN_CHANCE
     
-    def to_json(self) -> dict:
-        json_dict = super().to_json()
+    def to_fields(self) -> dict:
+        json_dict = super().to_fields()
         json_dict['type'] = 'Goby'
         json_dict['destination'] = self.destination
         json_dict['direction'] = self.direction
@@ -217,8 +215,7 @@ class Goby(Organism):
         return json_dict
     
     @staticmethod
-    def from_json(json_dict: dict, ids_to_vertices: dict):
-        softbody = Softbody.from_json(json_dict['softbody'], ids_to_vertices)
+    def from_fields(json_dict: dict, softbody: Softbody):
         age = json_dict['age']
         destination = json_dict['destination']
         direction = json_dict['direction']
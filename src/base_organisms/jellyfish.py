@@ -27,9 +27,7 @@ class Jellyfish(Organism):
         super().__init__(softbody, age)
         self.destination: tuple[int, int] | None = None
 
-    def render(self, tank_rect: pygame.Rect) -> pygame.Surface:
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
-
+    def draw_onto(self, surface: pygame.Surface):
         head = self.softbody.vertices[0]
         bell_vertices = self.softbody.vertices[1:1+JELLYFISH_NUM_BELL_VERTICES]
         arm_links = self.softbody.links[-10-JELLYFISH_NUM_ARM_VERTICES:-6]
@@ -54,8 +52,9 @@ class Jellyfish(Organism):
             pygame.draw.line(surface, JELLYFISH_FLESH_COLOR, link.v1.x_y(), link.v2.x_y())
         pygame.draw.circle(surface, JELLYFISH_FLESH_COLOR, left_tentacle_links[-2].v2.x_y(), gonad_radius)
         pygame.draw.circle(surface, JELLYFISH_FLESH_COLOR, right_tentacle_links[-2].v2.x_y(), gonad_radius)
-            
-        return surface
+
+    def render_margin(self) -> float:
+        return Jellyfish.get_size(self.age)/4 + 2
 
     def update_ai(self, tank):
         if not self.destination or self.satisfied_with_destination():
@@ -69,7 +68,7 @@ class Jellyfish(Organism):
             if self.age == JELLYFISH_REPRODUCTION_AGE:
                 self.lay_egg(tank)
 
-        if state.frame_count % SOFTBODY_SIZE_REFRESH_RATE:
+        if state.tick_count % SOFTBODY_SIZE_REFRESH_RATE:
             self.softbody.links = Jellyfish.generate_links(self.softbody.vertices, self.age)
 
     def polyp_mode(self):
@@ -105,12 +104,12 @@ class Jellyfish(Organism):
         return dest_distance < JELLYFISH_DESTINATION_SATISFACTION_RADIUS
 
     def random_wander_destination(self) -> tuple[int, int]:
-        collision_sculptures = state.selected_tank.get_collision_sculptures() # type: ignore
+        static_collision = state.selected_tank.get_static_collision() # type: ignore
         destination = (0, 0)
         for _ in range(20):
             destination = (random.randint(10, state.tank_width()-10),
                         random.randint(10, int(state.tank_height()/2-10)))
-            if not Vertex.collides_with_any_sculptures(*destination, collision_sculptures):
+            if not static_collision.contains_point(*destination):
                 return destination
         return destination
 
@@ -221,14 +220,13 @@ class Jellyfish(Organism):
     def generate_newborn(root_position: tuple[float, float]):
         return Jellyfish.generate_random(root_position, 0)
     
-    def to_json(self) -> dict:
-        json_dict = super().to_json()
+    def to_fields(self) -> dict:
+        json_dict = super().to_fields()
         json_dict['type'] = 'Jellyfish'
         return json_dict
     
     @staticmethod
-    def from_json(json_dict: dict, ids_to_vertices: dict):
-        softbody = Softbody.from_json(json_dict['softbody'], ids_to_vertices)
+    def from_fields(json_dict: dict, softbody: Softbody):
         return Jellyfish(softbody, json_dict['age'])
     
     @staticmethod
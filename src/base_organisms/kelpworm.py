@@ -30,10 +30,9 @@ class KelpWorm(Organism):
         self.destination = destination
         self.targeted_organism: Organism | None = None
         self.caught_organism: Organism | None = None
+        self.caught_organism_id: int | None = None # Saved id of caught_organism until the tank resolves it
 
-    def render(self, tank_rect: pygame.Rect) -> pygame.Surface:
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
-
+    def draw_onto(self, surface: pygame.Surface):
         head, bladder = self.softbody.vertices[:2]
         body_links = self.softbody.links[1:] if not self.caught_organism else self.softbody.links[1:-1]
 
@@ -55,7 +54,8 @@ class KelpWorm(Organism):
         spike_point = (head.x_y()[0] + head_direction[0]*4, head.x_y()[1] + head_direction[1]*4)
         pygame.draw.line(surface, KELPWORM_BONE_COLOR, head.x_y(), spike_point, 1)
 
-        return surface
+    def render_margin(self) -> float:
+        return KELPWORM_WIDTH/2 + 6
 
     def update_ai(self, tank):
         self.update_ai_status()
@@ -69,10 +69,10 @@ class KelpWorm(Organism):
     def update_ai_status(self):
 
         # If prey is caught and the time since last catch is less than the digesting period, digest
-        if self.caught_organism and state.frame_count - self.time_of_last_catch < KELPWORM_DIGEST_PERIOD:
+        if self.caught_organism and state.tick_count - self.time_of_last_catch < KELPWORM_DIGEST_PERIOD:
             self.ai_status = AIStatus.DIGESTING
         # If the time since last catch is more than the digesting period + wander time, hunt
-        elif state.frame_count - self.time_of_last_catch > KELPWORM_WANDER_TIME + KELPWORM_DIGEST_PERIOD:
+        elif state.tick_count - self.time_of_last_catch > KELPWORM_WANDER_TIME + KELPWORM_DIGEST_PERIOD:
             self.ai_status = AIStatus.HUNTING
         else:
             self.ai_status = AIStatus.WANDERING
@@ -86,11 +86,11 @@ class KelpWorm(Organism):
         self.retract(keep_anchor=True)
 
         # Kill the prey halfway through digesting
-        if state.frame_count - self.time_of_last_catch > KELPWORM_DIGEST_PERIOD/2:
+        if state.tick_count - self.time_of_last_catch > KELPWORM_DIGEST_PERIOD/2:
             self.caught_organism.alive = False # type: ignore
 
         # Delete the prey right before digesting period ends and reset anchor
-        if state.frame_count - self.time_of_last_catch == KELPWORM_DIGEST_PERIOD-1:
+        if state.tick_count - self.time_of_last_catch == KELPWORM_DIGEST_PERIOD-1:
             if self.caught_organism in tank.organisms:
                 tank.organisms.remove(self.caught_organism)
             self.caught_organism = None
@@ -129,7 +129,7 @@ class KelpWorm(Organism):
         if prey_distance < KELPWORM_GRAB_RADIUS:
             self.grab(self.targeted_organism)
             self.caught_organism = self.targeted_organism
-            self.time_of_last_catch = state.frame_count
+            self.time_of_last_catch = state.tick_count
                     
     def wander(self):
         self.retract()
@@ -147,12 +147,12 @@ class KelpWorm(Organism):
         head.ly -= vy
 
     def random_wander_destination(self) -> tuple[int, int]:
-        collision_sculptures = state.selected_tank.get_collision_sculptures() # type: ignore
+        static_collision = state.selected_tank.get_static_collision() # type: ignore
         destination = (0, 0)
         for _ in range(20):
             destination = (random.randint(10, state.tank_width()-10),
                         random.randint(10, state.tank_height()-10))
-            if not Vertex.collides_with_any_sculptures(*destination, collision_sculptures):
+            if not static_collision.contains_point(*destination):
                 return destination
         return destination
     
@@ -203,20 +203,30 @@ class KelpWorm(Organism):
     def bubble_spawn_chance(self) -> float | None:
         return 0.01
     
-    def to_json(self) -> dict:
-        json_dict = super().to_json()
+    def to_fields(self) -> dict:
+        json_dict = super().to_fields()
         json_dict['type'] = 'KelpWorm'
         json_dict['destination'] = self.destination
         json_dict['time_of_last_catch'] = self.time_of_last_catch
+        json_dict['caught_organism'] = self.caught_organism.id if self.caught_organism else None
         return json_dict
     
     @staticmethod
-    def from_json(json_dict: dict, ids_to_vertices: dict):
-        softbody = Softbody.from_json(json_dict['softbody'], ids_to_vertices)
+    def from_fields(json_dict: dict, softbody: Softbody):
         destination = json_dict['destination']
         ai_status = AIStatus(json_dict['ai_status'])
         time_of_last_catch = json_dict['time_of_last_catch']
-        return KelpWorm(softbody, time_of_last_catch, ai_status, destination)
+        kelpworm = KelpWorm(softbody, time_of_last_catch, ai_status, destination)
+        kelpworm.caught_organism_id = json_dict.get('caught_organism')
+        return kelpworm
+
+    # The grab link is the last link and ends at the prey's first vertex
+    def resolve_references(self, organism_ids):
+        caught_organism = organism_ids.get(self.caught_organism_id)
+        if (caught_organism and self.softbody.links
+            and self.softbody.links[-1].v2 is caught_organism.softbody.vertices[0]):
+            self.caught_organism = caught_organism
+        self.caught_organism_id = None
     
     @staticmethod
     def get_do_collision() -> bool:
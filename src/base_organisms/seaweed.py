@@ -10,9 +10,7 @@ class Seaweed(Organism):
     def __init__(self, softbody: Softbody):
         super().__init__(softbody)
 
-    def render(self, tank_rect: pygame.Rect) -> pygame.Surface:
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
-
+    def draw_onto(self, surface: pygame.Surface):
         for vertex in self.softbody.vertices:
             if vertex.flag == VertexFlag.SEAWEED_BLADDER:
                 pygame.draw.circle(surface, SEAWEED_STIPE_COLOR, (vertex.x, vertex.y), 
@@ -37,8 +35,6 @@ class Seaweed(Organism):
                 p1 = (link.v1.x+SEAWEED_BLADDER_RADIUS, link.v1.y)
                 p2 = (link.v2.x-SEAWEED_BLADDER_RADIUS, link.v2.y)
                 pygame.draw.line(surface, color, p1, p2, SEAWEED_STIPE_THICKNESS)
-            
-        return surface
 
     def update_ai(self, tank):
         return
@@ -85,14 +81,13 @@ class Seaweed(Organism):
     def generate_newborn(root_position: tuple[float, float]):
         return Seaweed.generate_random(root_position)
     
-    def to_json(self) -> dict:
-        json_dict = super().to_json()
+    def to_fields(self) -> dict:
+        json_dict = super().to_fields()
         json_dict['type'] = 'Seaweed'
         return json_dict
     
     @staticmethod
-    def from_json(json_dict: dict, ids_to_vertices: dict):
-        softbody = Softbody.from_json(json_dict['softbody'], ids_to_vertices)
+    def from_fields(json_dict: dict, softbody: Softbody):
         return Seaweed(softbody)
     
     @staticmethod
@@ -79,7 +79,7 @@ class Snail(Organism):
     def crawl(self):
         self.stick_to_walls()
         head, chest = self.softbody.vertices[:2]
-        if state.frame_count % SNAIL_LURCH_DELAY == 0:
+        if state.tick_count % SNAIL_LURCH_DELAY == 0:
             head.x += wall_to_direction(self.wall)[0] * SNAIL_SPEED * SNAIL_LURCH_DELAY
             head.y += wall_to_direction(self.wall)[1] * SNAIL_SPEED * SNAIL_LURCH_DELAY
 
@@ -107,8 +107,7 @@ class Snail(Organism):
             self.put_down_head()
 
 
-    def render_body(self, tank_rect: pygame.Rect) -> pygame.Surface:
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
+    def draw_body_onto(self, surface: pygame.Surface):
         head, chest, knee, toe, shell_center, eye_tip_1, eye_tip_2 = self.softbody.vertices
 
         pygame.draw.polygon(surface, SNAIL_BODY_COLOR, [
@@ -122,19 +121,17 @@ class Snail(Organism):
         pygame.draw.line(surface, SNAIL_BODY_COLOR, head.x_y(), eye_tip_1.x_y())
         pygame.draw.line(surface, SNAIL_BODY_COLOR, head.x_y(), eye_tip_2.x_y())
 
-        surface.set_alpha(SNAIL_BODY_ALPHA)
-        return surface
-
-    def render(self, tank_rect: pygame.Rect) -> pygame.Surface:
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
+    def draw_onto(self, surface: pygame.Surface):
         shell_center, eye_tip_1, eye_tip_2 = self.softbody.vertices[-3:]
 
-        surface.blit(self.render_body(tank_rect), (0, 0))
+        # The body is translucent as a whole, so it gets a scratch layer of its own
+        blit_drawing_onto(surface, self.render_bounds(), self.draw_body_onto, SNAIL_BODY_ALPHA, level=1)
         surface.set_at((eye_tip_1.x, eye_tip_1.y), SNAIL_EYE_COLOR)
         surface.set_at((eye_tip_2.x, eye_tip_2.y), SNAIL_EYE_COLOR)
         pygame.draw.circle(surface, SNAIL_SHELL_COLOR, (shell_center.x, shell_center.y), self.size/4)
 
-        return surface
+    def render_margin(self) -> float:
+        return self.size/4 + 2
     
     @staticmethod
     def generate_random(root_position: tuple[float, float]):
@@ -174,16 +171,15 @@ class Snail(Organism):
     def bubble_spawn_chance(self) -> float | None:
         return SNAIL_BUBBLE_SPAWN_RATE
 
-    def to_json(self) -> dict:
-        json_dict = super().to_json()
+    def to_fields(self) -> dict:
+        json_dict = super().to_fields()
         json_dict['type'] = 'Snail'
         json_dict['size'] = self.size
         json_dict['wall'] = self.wall.value
         return json_dict
     
     @staticmethod
-    def from_json(json_dict: dict, ids_to_vertices: dict):
-        softbody = Softbody.from_json(json_dict['softbody'], ids_to_vertices)
+    def from_fields(json_dict: dict, softbody: Softbody):
         size = json_dict['size']
         wall = Wall(json_dict['wall'])
         return Snail(softbody, size, wall)
@@ -0,0 +1,220 @@
+import os
+import sys
+import math
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from typing import Callable
+
+from headless import *
+from autosave import Autosaver
+import profiler
+
+BENCHMARK_VERSION = 1
+BENCHMARK_SEED = 1234
+BENCHMARK_FRAMES = 600
+BENCHMARK_WARMUP_FRAMES = 60
+BENCHMARK_MEMORY_FRAMES = 120
+BENCHMARK_TOLERANCE = 0.1 # Relative slowdown against the baseline that counts as a regression
+BENCHMARK_NOISE_FLOOR = 0.05 # ms, sections faster than this in the baseline are not compared
+BENCHMARK_SAVES = ["Twin Rocks", "Kelp Cave", "King of the Hill", "Panorama Garden"]
+STRESS_TANK_SIZE = (300, 150)
+STRESS_ORGANISM_COUNT = 60
+MOUSE_GRAB_FRAMES = (200, 260) # The scripted mouse holds the left button over this frame range
+AUTOSAVE_CHECKPOINT_FRAMES = 60 # Frames run between the timed autosave snapshot and journal checkpoint
+
+def build_save_tank(name: str) -> Callable[[], Tank]:
+    return lambda: load_headless_tank(os.path.join(state.SAVES_FP, f"{name}.tank"))
+
+# A bare tank crowded with randomly placed organisms of the given species
+def build_stress_tank(species: list[str], count: int = STRESS_ORGANISM_COUNT) -> Callable[[], Tank]:
+    def build() -> Tank:
+        width, height = STRESS_TANK_SIZE
+        # Organisms take their boundaries from the selected tank, so it has to exist first
+        tank = Tank(pygame.Rect(0, 0, width, height), [], [])
+        state.selected_tank = tank
+        for index in range(count):
+            organism_type = SPAWNABLE_ORGANISM_TYPES[species[index % len(species)]]
+            tank.organisms.append(organism_type.generate_random(
+                (random.uniform(width*0.1, width*0.9), random.uniform(height*0.2, height*0.9))))
+        return tank
+    return build
+
+def get_benchmark_cases() -> dict[str, Callable[[], Tank]]:
+    cases = {name: build_save_tank(name) for name in BENCHMARK_SAVES}
+    cases["Stress Gobies"] = build_stress_tank(["Goby"])
+    cases["Stress Mixed"] = build_stress_tank(list(SPAWNABLE_ORGANISM_TYPES.keys()))
+    return cases
+
+# The mouse sweeps a Lissajous curve over the tank and briefly drags whatever it passes over
+def scripted_mouse(input_source: SyntheticInput) -> Callable[[int], None]:
+    def script(frame: int):
+        width, height = state.tank_size()
+        input_source.move_mouse((0.5 + 0.4*math.sin(frame/19)) * width * state.SCALE,
+                                (0.5 + 0.4*math.sin(frame/13)) * height * state.SCALE)
+        input_source.mouse_presses = (MOUSE_GRAB_FRAMES[0] <= frame < MOUSE_GRAB_FRAMES[1], False, False)
+    return script
+
+def start_case(build: Callable[[], Tank], seed: int) -> tuple[Tank, Callable[[int], None]]:
+    random.seed(seed)
+    state.tick_count = 0
+    state.frame_count = 0
+    state.vertex_grabbed = None
+    input_source = SyntheticInput()
+    set_input_source(input_source)
+    return build(), scripted_mouse(input_source)
+
+def summarize_sections() -> tuple[dict, dict]:
+    sections = {}
+    counts = {}
+    for name in profiler.get_report():
+        history = profiler.get_history(name)
+        percentiles = profiler.get_percentiles(name, (50, 95))
+        if name in profiler.counter_names:
+            counts[name] = {'mean': float(history.mean()), 'max': float(history.max())}
+        else:
+            sections[name] = {'mean': float(history.mean()) * 1000, 'p50': percentiles[50] * 1000,
+                              'p95': percentiles[95] * 1000}
+    return sections, counts
+
+def run_case(build: Callable[[], Tank], frames: int, warmup_frames: int, seed: int) -> dict:
+    tank, script = start_case(build, seed)
+    run_headless(tank, warmup_frames, render_every=1, script=script)
+
+    profiler.reset(frames)
+    profiler.enable()
+    try:
+        elapsed = run_headless(tank, frames, render_every=1,
+                               script=lambda frame: script(frame + warmup_frames))
+    finally:
+        profiler.disable()
+    sections, counts = summarize_sections()
+
+    # Only the autosave's main thread work is timed, since that is what holds up a frame
+    with tempfile.TemporaryDirectory() as directory:
+        autosaver = Autosaver(directory=directory)
+        try:
+            start_time = time.perf_counter()
+            autosaver.save(tank)
+            autosave_snapshot_ms = (time.perf_counter() - start_time) * 1000
+            autosaver.idle.wait()
+            run_headless(tank, AUTOSAVE_CHECKPOINT_FRAMES,
+                         script=lambda frame: script(frame + warmup_frames + frames))
+            start_time = time.perf_counter()
+            autosaver.save(tank)
+            autosave_checkpoint_ms = (time.perf_counter() - start_time) * 1000
+        finally:
+            autosaver.close()
+
+    # Round trip through a save file
+    with tempfile.TemporaryDirectory() as directory:
+        tank_fp = os.path.join(directory, "benchmark.tank")
+        start_time = time.perf_counter()
+        tank.save_to(tank_fp)
+        save_ms = (time.perf_counter() - start_time) * 1000
+        start_time = time.perf_counter()
+        tank.load(tank_fp)
+        load_ms = (time.perf_counter() - start_time) * 1000
+
+    # Memory is traced in a separate, shorter run since tracing is slow. SDL's surface pixels aren't traced
+    tracemalloc.start()
+    try:
+        tank, script = start_case(build, seed)
+        run_headless(tank, BENCHMARK_MEMORY_FRAMES, render_every=1, script=script)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'fps': frames / elapsed, 'ms_per_frame': elapsed / frames * 1000, 'load_ms': load_ms,
+            'save_ms': save_ms, 'autosave_snapshot_ms': autosave_snapshot_ms,
+            'autosave_checkpoint_ms': autosave_checkpoint_ms, 'peak_memory_mb': peak_memory / 2**20, 'sections': sections, 'counts': counts}
+
+def run_benchmark(case_names: list[str] | None = None, frames: int = BENCHMARK_FRAMES,
+                  warmup_frames: int = BENCHMARK_WARMUP_FRAMES, seed: int = BENCHMARK_SEED,
+                  progress: Callable[[str, dict], None] | None = None) -> dict:
+    cases = get_benchmark_cases()
+    results = {}
+    for name in case_names or cases.keys():
+        results[name] = run_case(cases[name], frames, warmup_frames, seed)
+        if progress:
+            progress(name, results[name])
+    return {'version': BENCHMARK_VERSION, 'seed': seed, 'frames': frames, 'warmup_frames': warmup_frames,
+            'python': platform.python_version(), 'pygame': pygame.version.ver, 'platform': platform.platform(),
+            'cases': results}
+
+# Lines describing every change against the baseline, and whether any of them is a regression
+def compare_results(results: dict, baseline: dict, tolerance: float = BENCHMARK_TOLERANCE) -> tuple[list[str], bool]:
+    lines = []
+    regressed = False
+    def compare(label: str, value: float, baseline_value: float):
+        nonlocal regressed
+        change = value / baseline_value - 1 if baseline_value else 0
+        flag = ''
+        if change > tolerance:
+            flag = ' REGRESSION'
+            regressed = True
+        elif change < -tolerance:
+            flag = ' improved'
+        lines.append(f"  {label}: {round(baseline_value, 3)} -> {round(value, 3)} ({change:+.1%}){flag}")
+
+    for name, case in results['cases'].items():
+        baseline_case = baseline['cases'].get(name)
+        if baseline_case is None:
+            lines.append(f"{name}: not in baseline")
+            continue
+        lines.append(f"{name}:")
+        for metric in ('ms_per_frame', 'load_ms', 'save_ms', 'autosave_snapshot_ms', 'autosave_checkpoint_ms',
+                       'peak_memory_mb'):
+            if metric in baseline_case:
+                compare(metric, case[metric], baseline_case[metric])
+        for section, timing in case['sections'].items():
+            baseline_timing = baseline_case['sections'].get(section)
+            if baseline_timing and baseline_timing['mean'] >= BENCHMARK_NOISE_FLOOR:
+                compare(section, timing['mean'], baseline_timing['mean'])
+    return lines, regressed
+
+def print_case(name: str, case: dict):
+    print(f"{name}: {round(case['fps'], 1)} fps ({round(case['ms_per_frame'], 3)} ms/frame), "
+          f"load {round(case['load_ms'], 1)} ms, save {round(case['save_ms'], 1)} ms, "
+          f"autosave snapshot {round(case['autosave_snapshot_ms'], 1)} ms, "
+          f"checkpoint {round(case['autosave_checkpoint_ms'], 1)} ms, "
+          f"peak {round(case['peak_memory_mb'], 1)} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run reproducible headless benchmarks")
+    parser.add_argument('cases', nargs='*', help="cases to run (default: all)")
+    parser.add_argument('--frames', type=int, default=BENCHMARK_FRAMES)
+    parser.add_argument('--warmup', type=int, default=BENCHMARK_WARMUP_FRAMES)
+    parser.add_argument('--seed', type=int, default=BENCHMARK_SEED)
+    parser.add_argument('--output', default="benchmark.json", help="file to write results to")
+    parser.add_argument('--baseline', default=None, help="earlier results to compare against")
+    parser.add_argument('--tolerance', type=float, default=BENCHMARK_TOLERANCE)
+    parser.add_argument('--list', action='store_true', help="list the available cases")
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(get_benchmark_cases().keys()))
+        return
+    unknown_cases = set(args.cases) - get_benchmark_cases().keys()
+    if unknown_cases:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown_cases))}")
+
+    init_headless_display()
+    results = run_benchmark(args.cases, args.frames, args.warmup, args.seed, print_case)
+    with open(args.output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            lines, regressed = compare_results(results, json.load(baseline_file), args.tolerance)
+        print('\n'.join(lines))
+        if regressed:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import numpy as np
+import pygame
+from softbody import *
+
+GRID_CELL_SIZE = 8
+
+# Uniform grid over static sculpture links, stored as a compressed cell -> link index table
+class StaticLinkGrid:
+    def __init__(self, links: list[Link], cell_size: float = GRID_CELL_SIZE,
+                 padding: float = VERTEX_COLLISION_RADIUS):
+        self.cell_size = cell_size
+        x1 = np.array([link.v1.x for link in links], dtype=float)
+        y1 = np.array([link.v1.y for link in links], dtype=float)
+        x2 = np.array([link.v2.x for link in links], dtype=float)
+        y2 = np.array([link.v2.y for link in links], dtype=float)
+        self.links = (x1, y1, x2, y2, np.minimum(x1, x2), np.minimum(y1, y2),
+                      np.maximum(x1, x2), np.maximum(y1, y2))
+        self.num_links = len(links)
+        if not self.num_links:
+            return
+
+        # Grid covers the padded bounds of all links
+        min_x, min_y, max_x, max_y = self.links[4:]
+        self.origin_x = min_x.min() - padding
+        self.origin_y = min_y.min() - padding
+        self.columns = int((max_x.max() + padding - self.origin_x) // cell_size) + 1
+        self.rows = int((max_y.max() + padding - self.origin_y) // cell_size) + 1
+
+        # Every link is listed in each cell its padded AABB overlaps
+        column_0, row_0 = self.cell_coordinates(min_x - padding, min_y - padding)
+        column_1, row_1 = self.cell_coordinates(max_x + padding, max_y + padding)
+        link_indices, cell_indices = self.expand_cell_ranges(np.arange(self.num_links),
+                                                             column_0, row_0, column_1, row_1)
+        order = np.lexsort((link_indices, cell_indices))
+        self.cell_links = link_indices[order]
+        self.cell_offsets = np.searchsorted(cell_indices[order], np.arange(self.columns * self.rows + 1))
+
+    def cell_coordinates(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        column = np.clip(((x - self.origin_x) // self.cell_size).astype(int), 0, self.columns - 1)
+        row = np.clip(((y - self.origin_y) // self.cell_size).astype(int), 0, self.rows - 1)
+        return column, row
+
+    # Pairs every owner with each cell in its inclusive column/row range
+    def expand_cell_ranges(self, owners: np.ndarray, column_0: np.ndarray, row_0: np.ndarray,
+                           column_1: np.ndarray, row_1: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        widths = column_1 - column_0 + 1
+        counts = widths * (row_1 - row_0 + 1)
+        repeated = np.repeat(np.arange(len(owners)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        columns = column_0[repeated] + offsets % widths[repeated]
+        rows = row_0[repeated] + offsets // widths[repeated]
+        return owners[repeated], rows * self.columns + columns
+
+    # Candidate (vertex, link) pairs along each vertex's swept path, sorted by vertex and then link
+    def query(self, vertex_indices: np.ndarray, x: np.ndarray, y: np.ndarray, lx: np.ndarray,
+              ly: np.ndarray, margin: float) -> tuple[np.ndarray, np.ndarray]:
+        empty = np.zeros(0, dtype=int)
+        if not self.num_links or not len(vertex_indices):
+            return empty, empty
+
+        curr_x, curr_y = x[vertex_indices], y[vertex_indices]
+        prev_x, prev_y = lx[vertex_indices], ly[vertex_indices]
+        path_min_x = np.minimum(curr_x, prev_x) - margin
+        path_min_y = np.minimum(curr_y, prev_y) - margin
+        path_max_x = np.maximum(curr_x, prev_x) + margin
+        path_max_y = np.maximum(curr_y, prev_y) + margin
+
+        # Skip vertices whose path lies entirely outside the grid
+        inside = ((path_max_x >= self.origin_x) & (path_max_y >= self.origin_y) &
+                  (path_min_x < self.origin_x + self.columns * self.cell_size) &
+                  (path_min_y < self.origin_y + self.rows * self.cell_size))
+        if not inside.any():
+            return empty, empty
+        owners = np.nonzero(inside)[0]
+        column_0, row_0 = self.cell_coordinates(path_min_x[owners], path_min_y[owners])
+        column_1, row_1 = self.cell_coordinates(path_max_x[owners], path_max_y[owners])
+        owners, cells = self.expand_cell_ranges(owners, column_0, row_0, column_1, row_1)
+
+        # Expand each touched cell into the links it holds
+        starts = self.cell_offsets[cells]
+        counts = self.cell_offsets[cells + 1] - starts
+        owners = np.repeat(owners, counts)
+        positions = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        pairs = np.unique(owners * self.num_links + self.cell_links[positions])
+        owners, link_indices = pairs // self.num_links, pairs % self.num_links
+
+        # Drop links that share a cell with the path but not its bounding box
+        min_x, min_y, max_x, max_y = (array[link_indices] for array in self.links[4:])
+        overlapping = ((path_max_x[owners] >= min_x) & (path_min_x[owners] <= max_x) &
+                       (path_max_y[owners] >= min_y) & (path_min_y[owners] <= max_y))
+        return vertex_indices[owners[overlapping]], link_indices[overlapping]
+
+OCCUPANCY_RESOLUTION = 4 # Samples per tank unit along each axis
+
+# Sub-pixel coverage count of the collision sculptures, each rasterized once per edit
+class SculptureOccupancy:
+    def __init__(self, size: tuple[int, int], resolution: int = OCCUPANCY_RESOLUTION):
+        self.size = size
+        self.resolution = resolution
+        self.coverage = np.zeros((size[1] * resolution + 1, size[0] * resolution + 1), dtype=np.int16)
+        self.masks: dict[int, tuple[object, int, np.ndarray, int, int]] = {}
+
+    def update(self, collision_sculptures: list):
+        current = {id(sculpture): sculpture for sculpture in collision_sculptures}
+        for key in list(self.masks.keys()):
+            if current.get(key) is not self.masks[key][0] or self.masks[key][1] != current[key].version:
+                self.remove_mask(key)
+        for key, sculpture in current.items():
+            if key not in self.masks:
+                self.add_mask(key, sculpture)
+
+    def add_mask(self, key: int, sculpture):
+        mask, row, column = self.rasterize(sculpture.vertices)
+        self.masks[key] = (sculpture, sculpture.version, mask, row, column)
+        self.coverage[row:row + mask.shape[0], column:column + mask.shape[1]] += mask
+
+    def remove_mask(self, key: int):
+        _, _, mask, row, column = self.masks.pop(key)
+        self.coverage[row:row + mask.shape[0], column:column + mask.shape[1]] -= mask
+
+    # Even-odd fill sampled at cell centers
+    def rasterize(self, vertices: list[Vertex]) -> tuple[np.ndarray, int, int]:
+        rows, columns = self.coverage.shape
+        if len(vertices) < 3:
+            return np.zeros((0, 0), dtype=np.int16), 0, 0
+        x1 = np.array([vertex.x for vertex in vertices], dtype=float)
+        y1 = np.array([vertex.y for vertex in vertices], dtype=float)
+        x2 = np.roll(x1, -1)
+        y2 = np.roll(y1, -1)
+
+        column_0 = max(0, int(x1.min() * self.resolution))
+        column_1 = min(columns, int(x1.max() * self.resolution) + 1)
+        row_0 = max(0, int(y1.min() * self.resolution))
+        row_1 = min(rows, int(y1.max() * self.resolution) + 1)
+        if column_0 >= column_1 or row_0 >= row_1:
+            return np.zeros((0, 0), dtype=np.int16), 0, 0
+        sample_x = (np.arange(column_0, column_1) + 0.5) / self.resolution
+        sample_y = (np.arange(row_0, row_1) + 0.5) / self.resolution
+
+        # Every edge crossing a sample row flips every sample to its left
+        py = sample_y[:, None]
+        intersects = (y1 > py) != (y2 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_intersect = x1 + (py - y1) / (y2 - y1) * (x2 - x1)
+        crossing_rows, crossing_edges = np.nonzero(intersects)
+        crossing_columns = np.searchsorted(sample_x, x_intersect[crossing_rows, crossing_edges], side='left')
+        crossings = np.zeros((len(sample_y), len(sample_x) + 1), dtype=np.int32)
+        np.add.at(crossings, (crossing_rows, crossing_columns), 1)
+        crossings_to_right = np.cumsum(crossings[:, ::-1], axis=1)[:, ::-1][:, 1:]
+        return (crossings_to_right % 2).astype(np.int16), row_0, column_0
+
+    def contains(self, px: np.ndarray, py: np.ndarray) -> np.ndarray:
+        rows, columns = self.coverage.shape
+        column = np.floor(px * self.resolution).astype(int)
+        row = np.floor(py * self.resolution).astype(int)
+        in_range = (column >= 0) & (column < columns) & (row >= 0) & (row < rows)
+        inside = np.zeros(len(column), dtype=bool)
+        inside[in_range] = self.coverage[row[in_range], column[in_range]] > 0
+        return inside
+
+    def contains_point(self, px: float, py: float) -> bool:
+        column = int(px * self.resolution // 1)
+        row = int(py * self.resolution // 1)
+        if 0 <= row < self.coverage.shape[0] and 0 <= column < self.coverage.shape[1]:
+            return bool(self.coverage[row, column] > 0)
+        return False
+
+# Everything the organisms collide with, rebuilt only when told the sculptures changed
+class StaticCollisionCache:
+    def __init__(self):
+        self.valid = False
+        self.grid = StaticLinkGrid([])
+        self.occupancy: SculptureOccupancy | None = None
+
+    def invalidate(self):
+        self.valid = False
+
+    def refresh(self, tank_rect: pygame.Rect, sculptures: list):
+        if self.valid and self.occupancy and self.occupancy.size == tank_rect.size:
+            return
+
+        collision_sculptures = [sculpture for sculpture in sculptures if not sculpture.is_background]
+        links = []
+        for sculpture in collision_sculptures:
+            links += sculpture.links
+        self.grid = StaticLinkGrid(links)
+
+        if not self.occupancy or self.occupancy.size != tank_rect.size:
+            self.occupancy = SculptureOccupancy(tank_rect.size)
+        self.occupancy.update(collision_sculptures)
+        self.valid = True
+
+    def contains_point(self, px: float, py: float) -> bool:
+        return self.occupancy.contains_point(px, py) # type: ignore
@@ -0,0 +1,145 @@
+import pygame
+import state
+import profiler
+from state import BufferKey
+from resources import BLACK
+from typing import Callable
+
+# Bottom to top
+LAYER_ORDER = [BufferKey.BACKGROUND_SCULPTURES, BufferKey.BACKGROUND, BufferKey.ORGANISMS, BufferKey.BUBBLES,
+               BufferKey.GODRAYS, BufferKey.FOREGROUND_SCULPTURES, BufferKey.UI, BufferKey.PROFILER]
+LAYER_SECTIONS = {key: f"render {key.name.lower()}" for key in LAYER_ORDER} # Profiler section names
+TRANSPARENT = (0, 0, 0, 0)
+DIRTY_FLIP_THRESHOLD = 0.4 # Flip the whole window once more than this fraction of it changed
+
+# Union overlapping rects so no region is composited or pushed twice
+def merge_rects(rects: list[pygame.Rect]) -> list[pygame.Rect]:
+    merged: list[pygame.Rect] = []
+    for rect in rects:
+        rect = rect.copy()
+        while (index := rect.collidelist(merged)) != -1:
+            rect.union_ip(merged.pop(index))
+        merged.append(rect)
+    return merged
+
+# One surface per layer, redrawn only when dirty, then composited and scaled
+class Compositor:
+    def __init__(self):
+        self.tank_size = (0, 0)
+        self.scale: float = 0
+        self.layers: dict[BufferKey, pygame.Surface] = {}
+        self.dirty: set[BufferKey] = set()
+        self.signatures: dict[BufferKey, object] = {}
+        self.frame = pygame.Surface((0, 0), pygame.SRCALPHA)
+        self.scaled_frame = pygame.Surface((0, 0), pygame.SRCALPHA)
+        self.regions: dict[BufferKey, list[pygame.Rect]] = {} # What each layer drew last time, in tank pixels
+        self.damage: list[pygame.Rect] | None = None # Changed since the last composite, None for everything
+        self.screen_damage: list[pygame.Rect] | None = None # Changed since the last present, in window pixels
+        self.presented_background: pygame.Surface | None = None
+
+    # Reallocate everything only when the tank size or scale changes
+    def fit(self, tank_size: tuple[int, int], scale: float):
+        if tank_size == self.tank_size and scale == self.scale:
+            return
+        self.tank_size = tank_size
+        self.scale = scale
+        frame_size = (tank_size[0], tank_size[1] + state.UI_HEIGHT)
+        self.layers = {key: pygame.Surface(frame_size if key == BufferKey.UI else tank_size, pygame.SRCALPHA)
+                       for key in LAYER_ORDER}
+        self.frame = pygame.Surface(frame_size, pygame.SRCALPHA)
+        self.scaled_frame = pygame.Surface((int(frame_size[0] * scale), int(frame_size[1] * scale)),
+                                           pygame.SRCALPHA)
+        profiler.increment('surfaces', len(self.layers) + 2)
+        self.dirty = set(LAYER_ORDER) | {BufferKey.RENDERED_FRAME}
+        self.signatures = {}
+        self.regions = {}
+        self.damage = None
+        self.screen_damage = None
+
+    def is_dirty(self, key: BufferKey) -> bool:
+        return key in self.dirty or key in state.buffer_update_flags
+
+    def mark_dirty(self, key: BufferKey):
+        self.dirty.add(key)
+
+    # Cached layers are redrawn when dirty or their signature changes. draw may return the rects it drew into
+    def draw_layer(self, key: BufferKey, draw: Callable[[pygame.Surface], list[pygame.Rect] | None],
+                   cached: bool = False, signature: object = None):
+        cached = cached or signature is not None
+        if cached and not self.is_dirty(key) and self.signatures.get(key) == signature:
+            return
+        layer = self.layers[key]
+        layer.fill(TRANSPARENT)
+        with profiler.section(LAYER_SECTIONS[key]):
+            regions = draw(layer)
+        previous_regions = self.regions.pop(key, None)
+        if regions is None or previous_regions is None:
+            self.damage = None
+        elif self.damage is not None:
+            self.damage += previous_regions + regions
+        if regions is not None:
+            self.regions[key] = regions
+        self.dirty.discard(key)
+        self.signatures[key] = signature
+
+    def has_frame(self) -> bool:
+        return BufferKey.RENDERED_FRAME not in self.dirty
+
+    def composite(self) -> pygame.Surface:
+        with profiler.section('composite'):
+            return self.composite_layers()
+
+    def composite_layers(self) -> pygame.Surface:
+        damage = self.damage
+        scale = self.scale
+        if damage is None or scale != int(scale):
+            self.frame.fill(TRANSPARENT)
+            self.frame.fblits([(self.layers[key], (0, 0)) for key in LAYER_ORDER])
+            pygame.transform.scale(self.frame, self.scaled_frame.get_size(), self.scaled_frame)
+            self.screen_damage = None
+        else:
+            # Nearest neighbour scaling by a whole factor maps each region onto its own block of the scaled frame
+            frame_rect = self.frame.get_rect()
+            screen_damage = []
+            for rect in merge_rects([rect.clip(frame_rect) for rect in damage]):
+                if not rect:
+                    continue
+                self.frame.fill(TRANSPARENT, rect)
+                self.frame.blits([(self.layers[key], rect, rect) for key in LAYER_ORDER], doreturn=False)
+                scaled_rect = pygame.Rect(rect.x*scale, rect.y*scale, rect.w*scale, rect.h*scale)
+                pygame.transform.scale(self.frame.subsurface(rect), scaled_rect.size,
+                                       self.scaled_frame.subsurface(scaled_rect))
+                screen_damage.append(scaled_rect)
+            if self.screen_damage is not None:
+                self.screen_damage += screen_damage
+        self.damage = []
+        self.dirty.discard(BufferKey.RENDERED_FRAME)
+        return self.scaled_frame
+
+    # Draw the frame onto the window, pushing only the changed regions to the display when it can
+    def present(self, window: pygame.Surface, background: pygame.Surface | None):
+        with profiler.section('present'):
+            self.present_layers(window, background)
+
+    def present_layers(self, window: pygame.Surface, background: pygame.Surface | None):
+        damage = self.screen_damage
+        window_area = window.get_width() * window.get_height()
+        if (damage is not None and background is self.presented_background
+                and window.get_size() == self.scaled_frame.get_size()
+                and sum(rect.w * rect.h for rect in damage) <= window_area * DIRTY_FLIP_THRESHOLD):
+            for rect in damage:
+                if background:
+                    window.blit(background, rect, rect)
+                else:
+                    window.fill(BLACK, rect)
+                window.blit(self.scaled_frame, rect, rect)
+            pygame.display.update(damage)
+        else:
+            if background:
+                window.blit(background, (0, 0))
+            else:
+                window.fill(BLACK)
+            window.blit(self.scaled_frame, (0, 0))
+            pygame.display.flip()
+            self.presented_background = background
+        self.screen_damage = []
@@ -1,55 +1,105 @@
 import pygame
 import state
 import math
+import numpy as np
+import profiler
 
 AMBIENT_BUBBLE_FREQUENCY = 15 # Frames to wait between spawning bubbles
 BUBBLE_DENSITY = 0.5
 BUBBLE_COLOR = (255, 255, 255)
 BUBBLE_ALPHA = 10
 MAX_BUBBLE_SIZE = 3
-class Bubble:
-    def __init__(self, radius: float, x: float, y: float):
-        self.radius = radius
-        self.x = x
-        self.y = y
+BUBBLE_CAPACITY = 256 # Bubbles spawned while the pool is full are dropped
 
-    def position(self) -> tuple[float, float]:
-        return (self.x, self.y)
+# Bubbles live in arrays and are drawn from one pre-rendered sprite per whole radius
+class BubbleSystem:
+    def __init__(self, capacity: int = BUBBLE_CAPACITY):
+        self.capacity = capacity
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.radius = np.zeros(capacity)
+        self.sprites: dict[int, pygame.Surface] = {}
 
+    def __len__(self) -> int:
+        return self.count
+
+    def spawn(self, radius: float, x: float, y: float) -> bool:
+        if self.count >= self.capacity:
+            return False
+        self.x[self.count] = x
+        self.y[self.count] = y
+        self.radius[self.count] = radius
+        self.count += 1
+        return True
+
+    # Rise every bubble, then drop the ones that left the top of the tank
     def update(self):
-        self.y -= (1/BUBBLE_DENSITY)*state.GRAVITY
+        count = self.count
+        self.y[:count] -= (1/BUBBLE_DENSITY)*state.GRAVITY
+        keep = self.y[:count] + self.radius[:count] > 0
+        if keep.all():
+            return
+        self.count = int(np.count_nonzero(keep))
+        for values in (self.x, self.y, self.radius):
+            values[:self.count] = values[:count][keep]
+
+    def get_sprite(self, radius: int) -> pygame.Surface:
+        sprite = self.sprites.get(radius)
+        if sprite is None:
+            sprite = pygame.Surface((radius*2 + 1, radius*2 + 1), pygame.SRCALPHA)
+            profiler.increment('surfaces')
+            # Bubble interior
+            pygame.draw.circle(sprite, (*BUBBLE_COLOR, BUBBLE_ALPHA), (radius, radius), radius)
+            # Bubble outline
+            pygame.draw.circle(sprite, (*BUBBLE_COLOR, min(255, BUBBLE_ALPHA*2)), (radius, radius), radius, 1)
+            self.sprites[radius] = sprite
+        return sprite
 
-    def render_onto(self, surface: pygame.Surface):
-        # Bubble interior
-        pygame.draw.circle(surface, (*BUBBLE_COLOR, BUBBLE_ALPHA), self.position(), self.radius)
-        # Bubble outline
-        pygame.draw.circle(surface, (*BUBBLE_COLOR, min(255, BUBBLE_ALPHA*2)), self.position(), self.radius, 1)
+    # Returns the rect of every drawn sprite
+    def render_onto(self, surface: pygame.Surface) -> list[pygame.Rect]:
+        count = self.count
+        radii = self.radius[:count].astype(int)
+        left = self.x[:count].astype(int) - radii
+        top = self.y[:count].astype(int) - radii
+        sprites = [(self.get_sprite(radius), (x, y))
+                   for radius, x, y in zip(radii.tolist(), left.tolist(), top.tolist()) if radius > 0]
+        surface.fblits(sprites)
+        return [sprite.get_rect(topleft=position) for sprite, position in sprites]
 
 GODRAY_FREQUENCY = 1 # Frames to wait between spawning godrays
 GODRAY_LIFESPAN = 15
 GODRAY_BRIGHTNESS = 0.03
 GODRAY_BLUR = 2
+GODRAY_MAX_SIZE = 0.1
+GODRAY_MAX_SLOPE = 1.0
+GODRAY_SIZE_STEP = 0.01 # Ray shapes are quantized to these steps so their blurred masks can be shared
+GODRAY_SLOPE_STEP = 0.025
+# Room for every quantized shape, so each is only blurred once per tank size
+GODRAY_LIBRARY_SIZE = (round(GODRAY_MAX_SIZE / GODRAY_SIZE_STEP) + 1) * \
+                      (round(2 * GODRAY_MAX_SLOPE / GODRAY_SLOPE_STEP) + 1)
 class Godray:
-    def __init__(self, size: float, slope: float, light_source: tuple[int, int] | None = None):
-        self.size = size
-        self.slope = slope
+    def __init__(self, size: float, slope: float, light_source: tuple[float, float] | None = None):
+        self.size = round(size / GODRAY_SIZE_STEP) * GODRAY_SIZE_STEP
+        self.slope = round(slope / GODRAY_SLOPE_STEP) * GODRAY_SLOPE_STEP
         self.age: int = 0
-        self.buffer: pygame.Surface = pygame.Surface(state.tank_size(), pygame.SRCALPHA)
         if not light_source:
             self.light_source = (state.tank_width()/3, -state.tank_height()*2)
         else:
             self.light_source = light_source
-        self.init_buffer()
 
-    def init_buffer(self):
-        bottom_edge_x_value = self.light_source[0] - (state.tank_height()-self.light_source[1])*self.slope
-        bottom_edge_width = (state.tank_height()-self.light_source[1])*self.size
-        pygame.draw.polygon(self.buffer, pygame.Color(255, 255, 255), [
+    def shape_key(self) -> tuple:
+        return (self.size, self.slope, self.light_source)
+
+    def get_points(self, tank_height: float) -> list[tuple[float, float]]:
+        bottom_edge_x_value = self.light_source[0] - (tank_height-self.light_source[1])*self.slope
+        bottom_edge_width = (tank_height-self.light_source[1])*self.size
+        return [
             self.light_source,
-            (bottom_edge_x_value - bottom_edge_width/2, state.tank_height()),
-            (bottom_edge_x_value + bottom_edge_width/2, state.tank_height())
-        ])
-    
+            (bottom_edge_x_value - bottom_edge_width/2, tank_height),
+            (bottom_edge_x_value + bottom_edge_width/2, tank_height)
+        ]
+
     def update(self):
         self.age += 1
 
@@ -60,7 +110,63 @@ class Godray:
         alpha = max(0, min(255, alpha))
         return alpha
 
-    def render(self) -> pygame.Surface:
-        surface = self.buffer.copy()
-        surface.fill((255, 255, 255, self.calculate_alpha()), special_flags=pygame.BLEND_RGBA_MULT)
-        return surface
\ No newline at end of file
+# Blurred coverage masks of ray shapes for one tank size, each cropped to the part of the tank it covers
+class GodrayLibrary:
+    def __init__(self):
+        self.size = (0, 0)
+        self.masks: dict[tuple, tuple[np.ndarray, pygame.Rect]] = {} # Mask and the tank rect it covers
+
+    def get_mask(self, godray: Godray) -> tuple[np.ndarray, pygame.Rect]:
+        key = godray.shape_key()
+        entry = self.masks.pop(key, None)
+        if entry is None:
+            entry = self.blur_shape(godray)
+            if len(self.masks) >= GODRAY_LIBRARY_SIZE:
+                del self.masks[next(iter(self.masks))]
+        self.masks[key] = entry # Reinserted so the dict stays in least recently used order
+        return entry
+
+    def blur_shape(self, godray: Godray) -> tuple[np.ndarray, pygame.Rect]:
+        points = godray.get_points(self.size[1])
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        # Margin for the blur to spread into, clipped to the tank so its edges blur as they would uncropped
+        left = math.floor(min(xs)) - GODRAY_BLUR*2
+        top = math.floor(min(ys)) - GODRAY_BLUR*2
+        rect = pygame.Rect(left, top, math.ceil(max(xs)) + GODRAY_BLUR*2 + 1 - left,
+                           math.ceil(max(ys)) + GODRAY_BLUR*2 + 1 - top).clip(pygame.Rect((0, 0), self.size))
+        if not rect.width or not rect.height:
+            return np.zeros((0, 0), dtype=np.uint8), rect
+        shape = pygame.Surface(rect.size, pygame.SRCALPHA)
+        profiler.increment('surfaces')
+        pygame.draw.polygon(shape, pygame.Color(255, 255, 255), [(x - rect.x, y - rect.y) for x, y in points])
+        return pygame.surfarray.array_alpha(pygame.transform.box_blur(shape, GODRAY_BLUR)), rect
+
+    # Returns the bounds of all visible rays
+    def render_onto(self, surface: pygame.Surface, godrays: list[Godray]) -> list[pygame.Rect]:
+        if surface.get_size() != self.size:
+            self.size = surface.get_size()
+            self.masks = {}
+
+        visible = []
+        for godray in godrays:
+            alpha = godray.calculate_alpha()
+            if alpha:
+                mask, rect = self.get_mask(godray)
+                if mask.size:
+                    visible.append((mask, rect, alpha))
+        surface.fill((255, 255, 255, 0))
+        if not visible:
+            return []
+
+        bounds = visible[0][1].unionall([rect for _, rect, _ in visible[1:]])
+        # Overlapping rays are layered, so the light that gets through is the product of what each ray lets through
+        transmitted = np.ones(bounds.size, dtype=np.float32)
+        for mask, rect, alpha in visible:
+            transmitted[rect.left - bounds.left:rect.right - bounds.left,
+                        rect.top - bounds.top:rect.bottom - bounds.top] *= 1 - mask * np.float32(alpha / 255**2)
+        surface_alpha = pygame.surfarray.pixels_alpha(surface)
+        surface_alpha[bounds.left:bounds.right, bounds.top:bounds.bottom] = \
+            np.rint((1 - transmitted) * 255).astype(np.uint8)
+        del surface_alpha
+        return [bounds]
@@ -0,0 +1,82 @@
+import state
+from resources import InputSnapshot
+
+GOVERNOR_MIN_FPS = 5 # Physics keeps up down to PHYSICS_RATE / MAX_PHYSICS_SUBSTEPS frames per second
+GOVERNOR_FPS_STEP = 5
+GOVERNOR_FPS_FALLOFF = 0.05 # Fraction of the gap closed per frame when slowing down, speeding up is immediate
+GOVERNOR_FRAME_MOTION = 0.5 # Pixels the fastest organism may travel between frames before the rate goes up
+GOVERNOR_INPUT_HOLD = 2 # Seconds to stay at the full rate after any input
+GOVERNOR_IDLE_DELAY = 60 # Seconds without input before the desktop counts as idle
+GOVERNOR_IDLE_FPS = 10
+GOVERNOR_DRAG_FPS = 60 # While the window is dragged, so it follows the mouse smoothly
+GOVERNOR_IDLE_QUALITY = 0.5
+GOVERNOR_LOAD_HIGH = 0.9 # Fraction of the frame time spent working
+GOVERNOR_LOAD_LOW = 0.5
+GOVERNOR_LOAD_SMOOTHING = 0.1
+GOVERNOR_ADJUST_FRAMES = 15 # Frames between budget adjustments
+GOVERNOR_QUALITY_STEP = 0.25
+GOVERNOR_MIN_QUALITY = 0.25
+
+# Picks state.fps from scene activity, and lowers state.effects_quality and then fps when frames run long
+class Governor:
+    def __init__(self, max_fps: int = state.DEFAULT_FPS):
+        self.max_fps = max_fps
+        self.fps: float = max_fps
+        self.budget_fps = max_fps
+        self.budget_quality: float = 1
+        self.load: float = 0
+        self.time_since_input: float = 0
+        self.frames_since_adjust = 0
+
+    def is_idle(self) -> bool:
+        return self.time_since_input >= GOVERNOR_IDLE_DELAY
+
+    def has_input(self, tank, input_snapshot: InputSnapshot) -> bool:
+        return (any(input_snapshot.mouse_velocity) or any(input_snapshot.mouse_presses)
+                or bool(input_snapshot.events) or bool(state.buffer_update_flags) or tank.paused)
+
+    # Frame rate at which the fastest organism moves GOVERNOR_FRAME_MOTION pixels per frame
+    def get_activity_fps(self, tank) -> float:
+        return tank.world.get_max_speed() * state.physics_rate / GOVERNOR_FRAME_MOTION
+
+    # frame_time is the time spent working this frame, excluding the sleep
+    def update(self, tank, input_snapshot: InputSnapshot, frame_time: float):
+        self.load += (frame_time / state.frame_delay() - self.load) * GOVERNOR_LOAD_SMOOTHING
+        if self.has_input(tank, input_snapshot):
+            self.time_since_input = 0
+        else:
+            self.time_since_input += state.frame_delay()
+
+        self.frames_since_adjust += 1
+        if self.frames_since_adjust >= GOVERNOR_ADJUST_FRAMES:
+            self.frames_since_adjust = 0
+            self.adjust_budget()
+
+        if self.time_since_input < GOVERNOR_INPUT_HOLD:
+            target_fps = self.max_fps
+        else:
+            target_fps = self.get_activity_fps(tank)
+        if self.is_idle():
+            target_fps = min(target_fps, GOVERNOR_IDLE_FPS)
+        target_fps = max(GOVERNOR_MIN_FPS, min(target_fps, self.budget_fps))
+        if target_fps > self.fps:
+            self.fps = target_fps
+        else:
+            self.fps += (target_fps - self.fps) * GOVERNOR_FPS_FALLOFF
+
+        # The tank is paused while it's dragged, so only the window moves and the frame budget doesn't apply
+        state.fps = GOVERNOR_DRAG_FPS if tank.paused else max(GOVERNOR_MIN_FPS, round(self.fps))
+        state.effects_quality = min(self.budget_quality, GOVERNOR_IDLE_QUALITY) if self.is_idle() \
+                                else self.budget_quality
+
+    def adjust_budget(self):
+        if self.load > GOVERNOR_LOAD_HIGH:
+            if self.budget_quality > GOVERNOR_MIN_QUALITY:
+                self.budget_quality = max(GOVERNOR_MIN_QUALITY, self.budget_quality - GOVERNOR_QUALITY_STEP)
+            else:
+                self.budget_fps = max(GOVERNOR_MIN_FPS, self.budget_fps - GOVERNOR_FPS_STEP)
+        elif self.load < GOVERNOR_LOAD_LOW:
+            if self.budget_fps < self.max_fps:
+                self.budget_fps = min(self.max_fps, self.budget_fps + GOVERNOR_FPS_STEP)
+            elif self.budget_quality < 1:
+                self.budget_quality = min(1, self.budget_quality + GOVERNOR_QUALITY_STEP)
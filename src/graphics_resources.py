@@ -1,11 +1,19 @@
 import pygame
-import win32gui
-import win32ui
-import win32con
 from resources import *
 import ctypes
 import state
 
+# Desktop screen capture needs Win32; without it (e.g. headless on Linux) only the simulation is usable
+try:
+    import win32gui
+    import win32ui
+    import win32con
+    user32 = ctypes.windll.user32
+    ctypes.windll.shcore.SetProcessDpiAwareness(2)
+    SCREEN_CAPTURE_SUPPORTED = True
+except (ImportError, AttributeError):
+    SCREEN_CAPTURE_SUPPORTED = False
+
 screen_capture_buffer: pygame.Surface | None = None
 window_position_buffer: tuple[float, float, float, float] | None = None
 
@@ -23,11 +31,13 @@ def check_window_movement() -> bool:
         return True
     return False
 
-user32 = ctypes.windll.user32
-ctypes.windll.shcore.SetProcessDpiAwareness(2)
-def pull_screen_capture() -> pygame.Surface:
+# The desktop behind the window, or None without screen capture so the window is drawn over black
+def pull_screen_capture() -> pygame.Surface | None:
     global screen_capture_buffer
 
+    if not SCREEN_CAPTURE_SUPPORTED:
+        return screen_capture_buffer
+
     if check_window_movement() or not screen_capture_buffer or state.frame_count == 2:
         hwnd = pygame.display.get_wm_info()["window"]
 
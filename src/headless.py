@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import argparse
+from typing import Callable
+
+# No window is needed; SDL's dummy driver still lets textures be converted for off-screen renders
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+from tank import *
+from resources import *
+import state
+import profiler
+
+# Scripted stand-in for the pygame mouse and event queue. Positions are in window pixels like pygame's
+class SyntheticInput(NeutralInput):
+    def __init__(self, mouse_position: tuple[int, int] = (-10000, -10000)):
+        super().__init__(mouse_position)
+        self.last_mouse_position = mouse_position
+        self.mouse_presses = (False, False, False)
+        self.events: list[pygame.Event] = []
+
+    def move_mouse(self, x: float, y: float):
+        self.mouse_position = (int(x), int(y))
+
+    def get_mouse_presses(self) -> tuple[bool, bool, bool]:
+        return self.mouse_presses
+
+    def get_mouse_rel(self) -> tuple[int, int]:
+        rel = (self.mouse_position[0] - self.last_mouse_position[0],
+               self.mouse_position[1] - self.last_mouse_position[1])
+        self.last_mouse_position = self.mouse_position
+        return rel
+
+    def get_events(self) -> list[pygame.Event]:
+        events = self.events
+        self.events = []
+        return events
+
+def init_headless_display():
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+
+def load_headless_tank(tank_fp: str) -> Tank:
+    state.selected_tank = Tank(pygame.Rect(0, 0, *state.DEFAULT_TANK_SIZE), [], [])
+    state.selected_tank = state.selected_tank.load(tank_fp)
+    return state.selected_tank # type: ignore
+
+# Advance the tank one frame per tick. script gets the frame number before input is polled
+def run_headless(tank: Tank, frames: int, render_every: int = 0, render_fp: str | None = None,
+                 script: Callable[[int], None] | None = None) -> float:
+    start_time = time.perf_counter()
+    for frame in range(frames):
+        if script:
+            script(frame)
+        tank.update(take_input_snapshot())
+        tank.step()
+        state.tick_count += 1
+        if render_every and frame % render_every == 0:
+            surface = tank.render(1)
+            if render_fp:
+                pygame.image.save(surface, os.path.join(render_fp, f"frame_{frame:05}.png"))
+        state.frame_count += 1
+        profiler.end_frame()
+    return time.perf_counter() - start_time
+
+def print_profile():
+    for name, percentiles in profiler.get_report().items():
+        unit_scale = 1 if name in profiler.counter_names else 1000
+        print(f"{name}: " + ", ".join(f"p{percentile} {round(value*unit_scale, 3)}"
+                                      for percentile, value in percentiles.items()))
+
+def print_progress(ticks_done: int, total_ticks: int, ticks_per_second: float):
+    print(f"fast forward: {ticks_done}/{total_ticks} ticks ({round(ticks_per_second)} ticks/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a tank simulation without a window")
+    parser.add_argument('tank_fp', help="path to a .tank save")
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--fast-forward', type=int, default=0, help="ticks to fast forward before running frames")
+    parser.add_argument('--catch-up', action='store_true', help="fast forward by the time since the tank was saved")
+    parser.add_argument('--render-every', type=int, default=0, help="render every N frames (0 disables)")
+    parser.add_argument('--render-fp', default=None, help="directory to save rendered frames to")
+    parser.add_argument('--profile', action='store_true', help="print per-section timings (ms) and counts")
+    args = parser.parse_args()
+
+    set_input_source(SyntheticInput())
+    init_headless_display()
+    tank = load_headless_tank(args.tank_fp)
+    if args.render_fp:
+        os.makedirs(args.render_fp, exist_ok=True)
+    if args.catch_up:
+        tank.catch_up(print_progress)
+    if args.fast_forward:
+        tank.fast_forward(args.fast_forward, print_progress)
+
+    if args.profile:
+        profiler.enable()
+    elapsed = run_headless(tank, args.frames, args.render_every, args.render_fp)
+    print(f"{args.frames} frames in {round(elapsed, 3)} s "
+          f"({round(elapsed/max(args.frames, 1)*1000, 3)} ms/frame, {len(tank.organisms)} organisms)")
+    if args.profile:
+        print_profile()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import numpy as np
+
+ID_ADOPT_SLACK = 4 # Saved ids past this many times the number of objects are replaced rather than kept
+
+# Dense ids for one kind of object in a tank, stored on the objects as .id. Freed ids are reused first
+class IdAllocator:
+    def __init__(self):
+        self.owners: list = [] # Object holding each id, None for free ones
+        self.free_ids: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.owners)
+
+    def owns(self, owner) -> bool:
+        return 0 <= owner.id < len(self.owners) and self.owners[owner.id] is owner
+
+    def get(self, object_id: int | None):
+        if object_id is None or not 0 <= object_id < len(self.owners):
+            return None
+        return self.owners[object_id]
+
+    # The owner's id, giving it one first if it has none here
+    def get_id(self, owner) -> int:
+        if self.owns(owner):
+            return owner.id
+        if self.free_ids:
+            owner.id = self.free_ids.pop()
+        else:
+            owner.id = len(self.owners)
+            self.owners.append(None)
+        self.owners[owner.id] = owner
+        return owner.id
+
+    # Keep ids from a save where they are free. Older saves used CPython ids, which are too large to keep
+    def adopt(self, owners: list):
+        limit = ID_ADOPT_SLACK * (len(self.owners) + len(owners))
+        for owner in owners:
+            object_id = getattr(owner, 'id', -1)
+            if self.owns(owner) or not 0 <= object_id < limit:
+                continue
+            if object_id >= len(self.owners):
+                self.owners += [None] * (object_id + 1 - len(self.owners))
+            if self.owners[object_id] is None:
+                self.owners[object_id] = owner
+        # Lowest ids first
+        self.free_ids = [object_id for object_id in range(len(self.owners) - 1, -1, -1)
+                         if self.owners[object_id] is None]
+        for owner in owners:
+            self.get_id(owner)
+
+    # Ids for owners, freeing those of everyone else first so newcomers can take them
+    def assign(self, owners: list) -> list[int]:
+        self.release_unused([owner.id for owner in owners if self.owns(owner)])
+        return [self.get_id(owner) for owner in owners]
+
+    # Free the ids of every owner not among ids
+    def release_unused(self, ids: list[int]):
+        used = np.zeros(len(self.owners), dtype=bool)
+        used[ids] = True
+        for object_id in np.nonzero(~used)[0].tolist():
+            if self.owners[object_id] is not None:
+                self.owners[object_id] = None
+                self.free_ids.append(object_id)
@@ -6,6 +6,11 @@ from resources import *
 import graphics_resources
 import state
 import time
+import os
+import win32api
+from governor import Governor
+from autosave import Autosaver
+import profiler
 
 DEBUG = False
 DEBUG_PRINT_INFO_FREQUENCY = 60
@@ -20,7 +25,7 @@ new_tank()
 
 # Load twin rocks as the initial tank (if it exists in saves)
 try:
-    initial_tank_fp = f"{state.SAVES_FP}\\Twin Rocks.tank"
+    initial_tank_fp = os.path.join(state.SAVES_FP, "Twin Rocks.tank")
     state.selected_tank = state.selected_tank.load(initial_tank_fp) # type: ignore
     state.selected_tank.filepath = initial_tank_fp
 except:
@@ -31,11 +36,20 @@ root = pygame.display.set_mode(state.window_size(), pygame.NOFRAME)
 pygame.display.set_window_position(state.WINDOW_POSITION)
 pygame.display.set_caption('Desktop Aquarium')
 pygame.display.set_icon(load_texture('goby_icon', True))
+state.last_win_mouse_position = win32api.GetCursorPos()
+
+if DEBUG:
+    profiler.enable(hud=True)
 
 running = True
-next_frame = time.perf_counter()
+governor = Governor()
+autosaver = Autosaver()
+physics_accumulator = 0.0
+last_frame_start_time = time.perf_counter()
 while running:
     frame_start_time = time.perf_counter()
+    physics_accumulator += frame_start_time - last_frame_start_time
+    last_frame_start_time = frame_start_time
 
     # Assign a new tank if none is selected:
     if not state.selected_tank:
@@ -44,6 +58,11 @@ while running:
     if state.frame_count == 50:
         for sculpture in state.selected_tank.sculptures: # type:ignore
             sculpture.simplify(0.5)
+        state.selected_tank.invalidate_static_collision() # type:ignore
+
+    # Poll user input once for the whole frame
+    input_snapshot = take_input_snapshot()
+    set_input_snapshot(input_snapshot)
 
     # Check for user events
     for event in get_events():
@@ -53,26 +72,51 @@ while running:
         if event.type == pygame.QUIT:
             running= False
 
-    # Render screen capture
+    # Pull screen capture
     if state.selected_tank.paused: # type: ignore
-        root.blit(graphics_resources.screen_capture_buffer, (0, 0)) # type: ignore
+        screen_capture = graphics_resources.screen_capture_buffer
     else:
-        root.blit(pull_screen_capture(), (0, 0))
+        screen_capture = pull_screen_capture()
+
+    # Update tank UI and input
+    state.selected_tank.update(input_snapshot) # type: ignore
+
+    # Run as many fixed physics ticks as real time calls for, dropping the backlog if too far behind
+    substeps = 0
+    while state.selected_tank and physics_accumulator >= state.physics_delay():
+        if substeps == state.MAX_PHYSICS_SUBSTEPS or state.selected_tank.paused:
+            physics_accumulator = 0.0
+            break
+        state.selected_tank.step()
+        state.tick_count += 1
+        physics_accumulator -= state.physics_delay()
+        substeps += 1
 
-    # Update and render tank
-    state.selected_tank.update() # type: ignore
+    # Render tank and push the regions that changed to the display
     if state.selected_tank:
-        root.blit(state.selected_tank.render(state.SCALE, overlay_frame=DEBUG), (0, 0))
+        interpolation = physics_accumulator / state.physics_delay()
+        state.selected_tank.render(state.SCALE, overlay_frame=DEBUG, interpolation=interpolation)
+        state.selected_tank.compositor.present(pygame.display.get_surface(), screen_capture)
+
+    # Snapshot the tank every so often for the autosave worker to write out
+    if state.selected_tank:
+        autosaver.update(state.selected_tank)
 
     state.last_win_mouse_position = win32api.GetCursorPos()
     state.frame_count += 1
-
-    pygame.display.flip()
+    profiler.end_frame()
     
+    # Pick the next frame rate and effect quality from this frame's load and the scene's activity
     time_elapsed = time.perf_counter() - frame_start_time
+    if state.selected_tank:
+        governor.update(state.selected_tank, input_snapshot, time_elapsed)
     time.sleep(max(0, state.frame_delay() - time_elapsed))
 
     if DEBUG and state.frame_count % DEBUG_PRINT_INFO_FREQUENCY == 0:
-        print(f"load: {round(time_elapsed/state.frame_delay()*100, 2)} %")
+        print(f"load: {round(governor.load*100, 2)} %, fps: {state.fps}, quality: {state.effects_quality}")
 
+# Autosave once more on the way out
+if state.selected_tank:
+    autosaver.save(state.selected_tank)
+autosaver.close()
 quit()
\ No newline at end of file
@@ -1,12 +1,41 @@
 import pygame
 from softbody import *
 import random
+import math
+import profiler
 from enum import Enum
+from typing import Callable
 
 FRAME_VERTEX_COLOR = pygame.Color(0, 255, 0)
 FRAME_LINK_COLOR = pygame.Color(255, 0, 0, 175)
 FRAME_INVISIBLE_LINK_COLOR = pygame.Color(70, 70, 70, 100)
 FRAME_VELOCITY_COLOR = pygame.Color(0, 0, 255, 175)
+ORGANISM_RENDER_MARGIN = 3
+
+# Transparent full-tank scratch layers, one per size and nesting level, drawn into and cleared region by region
+scratch_layers: dict[tuple[int, int, int], pygame.Surface] = {}
+def get_scratch_layer(size: tuple[int, int], level: int = 0) -> pygame.Surface:
+    key = (size[0], size[1], level)
+    if key not in scratch_layers:
+        scratch_layers[key] = pygame.Surface(size, pygame.SRCALPHA)
+        profiler.increment('surfaces')
+    return scratch_layers[key]
+
+# Run draw on a clean scratch layer clipped to bounds, then alpha blit just that region onto layer
+def blit_drawing_onto(layer: pygame.Surface, bounds: pygame.Rect, draw: Callable[[pygame.Surface], None],
+                      alpha: int | None = None, level: int = 0):
+    scratch = get_scratch_layer(layer.get_size(), level)
+    bounds = bounds.clip(layer.get_rect())
+    scratch.set_clip(bounds)
+    draw(scratch)
+    scratch.set_clip(None)
+    if alpha is None:
+        layer.blit(scratch, bounds, bounds)
+    else:
+        scratch.set_alpha(alpha)
+        layer.blit(scratch, bounds, bounds)
+        scratch.set_alpha(255) # set_alpha(None) would also drop per-pixel blending
+    scratch.fill((0, 0, 0, 0), bounds)
 
 class AIStatus(Enum):
     NONE = 0
@@ -22,6 +51,7 @@ class Organism:
     def __init__(self, softbody: Softbody, age: int = 0, ai_status: AIStatus = AIStatus.NONE, 
                  alive: bool = True):
         self.softbody = softbody
+        self.id = -1 # Given by the tank's organism IdAllocator
         self.age = age
         self.ai_status = ai_status
         self.alive = alive
@@ -30,13 +60,35 @@ class Organism:
         return (self.softbody.vertices[0].x,
                 self.softbody.vertices[0].y)
 
-    # Abstract method
-    def render(self, tank_rect: pygame.Rect) -> pygame.Surface:
+    # Abstract method: draw the organism onto surface in tank coordinates
+    def draw_onto(self, surface: pygame.Surface):
         raise NotImplementedError()
-    
-    def render_frame(self, tank_rect: pygame.Rect) -> pygame.Surface:
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
 
+    # How far the drawing can reach past the softbody's vertices
+    def render_margin(self) -> float:
+        return ORGANISM_RENDER_MARGIN
+
+    # extent is the softbody's (min_x, min_y, max_x, max_y) if already known, e.g. from PhysicsWorld.get_body_extents
+    def render_bounds(self, extent: tuple[float, float, float, float] | None = None) -> pygame.Rect:
+        if not extent:
+            xs = [vertex.x for vertex in self.softbody.vertices]
+            ys = [vertex.y for vertex in self.softbody.vertices]
+            extent = (min(xs), min(ys), max(xs), max(ys))
+        min_x, min_y, max_x, max_y = extent
+        margin = self.render_margin()
+        left, top = math.floor(min_x - margin), math.floor(min_y - margin)
+        return pygame.Rect(left, top, math.ceil(max_x + margin) - left + 1, math.ceil(max_y + margin) - top + 1)
+
+    # Organism colors carry their own alpha, so each organism is drawn apart and blended in over its bounds only
+    def render_onto(self, layer: pygame.Surface, extent: tuple[float, float, float, float] | None = None) -> pygame.Rect:
+        bounds = self.render_bounds(extent)
+        blit_drawing_onto(layer, bounds, self.draw_onto)
+        return bounds
+
+    def render_frame_onto(self, layer: pygame.Surface, extent: tuple[float, float, float, float] | None = None):
+        blit_drawing_onto(layer, self.render_bounds(extent), self.draw_frame_onto)
+
+    def draw_frame_onto(self, surface: pygame.Surface):
         for vertex in self.softbody.vertices:
             p1 = (int(vertex.x), int(vertex.y))
             p2 = (int(vertex.lx), int(vertex.ly))
@@ -52,13 +104,11 @@ class Organism:
 
         for vertex in self.softbody.vertices:
             surface.set_at((int(vertex.x), int(vertex.y)), FRAME_VERTEX_COLOR)
-
-        return surface
     
-    def update(self, tank, collision_links: list[Link] = [], collision_sculptures: list = []):
+    # Softbody motion is stepped for all organisms at once by the tank's PhysicsWorld
+    def update(self, tank):
         if self.alive:
             self.update_ai(tank)
-        self.softbody.update(collision_links, collision_sculptures, self.get_do_collision())
         self.age += 1
     
     # Abstract method
@@ -80,13 +130,30 @@ class Organism:
         return None
 
     def to_json(self) -> dict:
-        softbody = self.softbody.to_json()
-        return {'softbody': softbody, 'age': self.age, 'ai_status': self.ai_status.value,
-                'alive': self.alive}
-    
+        return dict(self.to_fields(), softbody=self.softbody.to_json())
+
+    # Everything but the softbody, shared by the JSON and binary tank formats. Species add their own fields
+    def to_fields(self) -> dict:
+        return {'id': self.id, 'age': self.age, 'ai_status': self.ai_status.value, 'alive': self.alive}
+
+    @classmethod
+    def from_json(cls, json_dict: dict, ids_to_vertices: dict):
+        return cls.from_saved_fields(json_dict, Softbody.from_json(json_dict['softbody'], ids_to_vertices))
+
+    # from_fields, keeping the id the organism was saved with
+    @classmethod
+    def from_saved_fields(cls, json_dict: dict, softbody: Softbody):
+        organism = cls.from_fields(json_dict, softbody)
+        organism.id = json_dict.get('id', -1)
+        return organism
+
+    # Point references to other organisms, saved by id, back at them once the whole tank is loaded
+    def resolve_references(self, organism_ids):
+        pass
+
     # Abstract method
     @staticmethod
-    def from_json(json_dict: dict, ids_to_vertices: dict):
+    def from_fields(json_dict: dict, softbody: Softbody):
         raise NotImplementedError()
     
     # Abstract method
@@ -0,0 +1,615 @@
+import numpy as np
+from contextlib import contextmanager
+import pygame
+import state
+import profiler
+from resources import *
+from softbody import *
+from collision import StaticLinkGrid, SculptureOccupancy
+
+WORLD_INITIAL_CAPACITY = 256
+STATIC_LINK_BROAD_PHASE_MARGIN = VERTEX_COLLISION_RADIUS * 2
+STATIC_COLLISION_PASSES = 2
+SLEEP_ENERGY_THRESHOLD = 1e-5 # Mean squared vertex speed below which a softbody counts as resting
+SLEEP_FRAMES = 30
+SLEEP_WAKE_TOLERANCE = 0.01
+MOUSE_WATER_FORCE_CUTOFF = 1e-3 # Pushes weaker than this are left out of the mouse's area of effect
+
+# Tank-wide softbody simulation. Vertex objects read and write through to their slot in these arrays
+class PhysicsWorld:
+    def __init__(self, capacity: int = WORLD_INITIAL_CAPACITY):
+        self.capacity = 0
+        self.size = 0
+        self.vertices: list[Vertex | None] = []
+        self.free_slots: list[int] = []
+        self.bodies: dict[int, Softbody] = {}
+        self.body_serials: dict[int, int] = {}
+        self.next_body_serial = 0
+        self.topology_version = 0
+        self.body_topology: dict[int, int] = {} # Bumped when a vertex of the body with that serial is added or removed
+        self.constraint_cache: dict[int, tuple] = {}
+        self.serial_keys: dict[int, int] = {}
+        self.rest_counters: dict[int, int] = {}
+        self.sleeping_links: dict[int, tuple] = {} # Constraints of each sleeping body when it fell asleep
+
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.lx = np.zeros(0)
+        self.ly = np.zeros(0)
+        self.prev_x = np.zeros(0) # Positions at the end of the previous physics tick, for render interpolation
+        self.prev_y = np.zeros(0)
+        self.density = np.zeros(0)
+        self.gx = np.zeros(0)
+        self.gy = np.zeros(0)
+        self.min_x = np.zeros(0)
+        self.min_y = np.zeros(0)
+        self.max_x = np.zeros(0)
+        self.max_y = np.zeros(0)
+        self.anchor = np.zeros(0, dtype=bool)
+        self.collides = np.zeros(0, dtype=bool)
+        self.live = np.zeros(0, dtype=bool)
+        self.body_ids = np.zeros(0, dtype=int)
+        self.asleep = np.zeros(0, dtype=bool)
+        self.rest_state = np.zeros((0, 6)) # x, y, lx, ly and gravity acceleration of sleeping vertices
+        self.grow(capacity)
+
+    def grow(self, capacity: int):
+        for name in ('x', 'y', 'lx', 'ly', 'prev_x', 'prev_y', 'density', 'gx', 'gy', 'min_x', 'min_y', 'max_x', 'max_y',
+                     'anchor', 'collides', 'live', 'body_ids', 'asleep', 'rest_state'):
+            old_array = getattr(self, name)
+            new_array = np.zeros((capacity,) + old_array.shape[1:], dtype=old_array.dtype)
+            new_array[:self.capacity] = old_array
+            setattr(self, name, new_array)
+        self.vertices += [None] * (capacity - self.capacity)
+        self.capacity = capacity
+
+    def add_vertex(self, vertex: Vertex, do_collision: bool = True, body_id: int = -1) -> int:
+        if vertex.world is not None:
+            vertex.world.remove_vertex(vertex)
+        if self.free_slots:
+            index = self.free_slots.pop()
+        else:
+            if self.size == self.capacity:
+                self.grow(self.capacity * 2)
+            index = self.size
+            self.size += 1
+
+        # Copy the vertex's local state into the slot before it becomes a view
+        x, y, lx, ly = vertex.x, vertex.y, vertex.lx, vertex.ly
+        density, anchor, gravity, boundary = vertex.density, vertex.anchor, vertex.gravity, vertex.boundary
+        vertex.world = self
+        vertex.index = index
+        vertex.x, vertex.y, vertex.lx, vertex.ly = x, y, lx, ly
+        vertex.density = density
+        vertex.anchor = anchor
+        vertex.gravity = gravity
+        vertex.boundary = boundary
+        self.prev_x[index] = x
+        self.prev_y[index] = y
+        self.collides[index] = do_collision
+        self.live[index] = True
+        self.asleep[index] = False
+        self.body_ids[index] = body_id
+        self.vertices[index] = vertex
+        self.topology_changed(body_id)
+        return index
+
+    def remove_vertex(self, vertex: Vertex):
+        index = vertex.index
+        x, y, lx, ly = vertex.x, vertex.y, vertex.lx, vertex.ly
+        density, anchor, gravity, boundary = vertex.density, vertex.anchor, vertex.gravity, vertex.boundary
+        vertex.world = None
+        vertex.index = -1
+        vertex.x, vertex.y, vertex.lx, vertex.ly = float(x), float(y), float(lx), float(ly)
+        vertex.density = float(density)
+        vertex.anchor = anchor
+        vertex.gravity = (float(gravity[0]), float(gravity[1]))
+        vertex.boundary = boundary
+        self.topology_changed(int(self.body_ids[index]))
+        self.live[index] = False
+        self.asleep[index] = False
+        self.body_ids[index] = -1
+        self.vertices[index] = None
+        self.free_slots.append(index)
+
+    def topology_changed(self, body_id: int):
+        self.topology_version += 1
+        self.body_topology[body_id] = self.body_topology.get(body_id, 0) + 1
+
+    def get_boundary(self, index: int) -> pygame.Rect:
+        return pygame.Rect(self.min_x[index], self.min_y[index],
+                           self.max_x[index] - self.min_x[index], self.max_y[index] - self.min_y[index])
+
+    def set_boundary(self, index: int, boundary: pygame.Rect):
+        self.min_x[index] = boundary.x
+        self.min_y[index] = boundary.y
+        self.max_x[index] = boundary.x + boundary.width
+        self.max_y[index] = boundary.y + boundary.height
+        self.wake_body(self.serial_keys.get(int(self.body_ids[index])))
+
+    # Attach softbodies of newly added organisms and release the ones that left the tank
+    def sync(self, organisms: list):
+        current_bodies = {id(organism.softbody): organism for organism in organisms}
+        for key in list(self.bodies.keys()):
+            if current_bodies.get(key) is None or current_bodies[key].softbody is not self.bodies[key]:
+                self.detach_body(key)
+        for key, organism in current_bodies.items():
+            if key not in self.bodies:
+                self.attach_body(organism.softbody, organism.get_do_collision())
+
+    def attach_body(self, softbody: Softbody, do_collision: bool = True):
+        key = id(softbody)
+        self.bodies[key] = softbody
+        self.body_serials[key] = self.next_body_serial
+        self.serial_keys[self.next_body_serial] = key
+        self.rest_counters[key] = 0
+        self.next_body_serial += 1
+        for vertex in softbody.vertices:
+            self.add_vertex(vertex, do_collision, self.body_serials[key])
+
+    def detach_body(self, key: int):
+        softbody = self.bodies.pop(key)
+        serial = self.body_serials.pop(key)
+        del self.serial_keys[serial]
+        del self.rest_counters[key]
+        self.sleeping_links.pop(key, None)
+        self.constraint_cache.pop(key, None)
+        for vertex in softbody.vertices:
+            if vertex.world is self:
+                self.remove_vertex(vertex)
+        # Bodies still linked to it see its version as 0, which never matches what they recorded
+        self.body_topology.pop(serial, None)
+
+    def store_previous_positions(self):
+        np.copyto(self.prev_x, self.x)
+        np.copyto(self.prev_y, self.y)
+
+    # Temporarily present positions blended between the previous and current tick, e.g. while rendering
+    @contextmanager
+    def interpolated(self, interpolation: float):
+        if interpolation >= 1:
+            yield
+            return
+        x, y = self.x, self.y
+        self.x = self.prev_x + (x - self.prev_x) * interpolation
+        self.y = self.prev_y + (y - self.prev_y) * interpolation
+        try:
+            yield
+        finally:
+            self.x, self.y = x, y
+
+    # Axis-aligned (min_x, min_y, max_x, max_y) of every attached body, keyed like bodies
+    def get_body_extents(self) -> dict[int, tuple[float, float, float, float]]:
+        n = self.size
+        indices = np.nonzero(self.live[:n] & (self.body_ids[:n] >= 0))[0]
+        if len(indices) == 0:
+            return {}
+        body_ids = self.body_ids[indices]
+        order = np.argsort(body_ids, kind='stable')
+        indices, body_ids = indices[order], body_ids[order]
+        starts = np.nonzero(np.concatenate(([True], body_ids[1:] != body_ids[:-1])))[0]
+        x, y = self.x[indices], self.y[indices]
+        extents = zip(np.minimum.reduceat(x, starts).tolist(), np.minimum.reduceat(y, starts).tolist(),
+                      np.maximum.reduceat(x, starts).tolist(), np.maximum.reduceat(y, starts).tolist())
+        return {self.serial_keys[serial]: extent for serial, extent in zip(body_ids[starts].tolist(), extents)}
+
+    def step(self, organisms: list, collision_grid: StaticLinkGrid | None = None,
+             occupancy: SculptureOccupancy | None = None, input_snapshot: InputSnapshot = NEUTRAL_INPUT):
+        with profiler.section('physics sync'):
+            self.sync(organisms)
+        with profiler.section('physics water'):
+            self.apply_water_force(input_snapshot)
+        with profiler.section('physics wake'):
+            self.wake_disturbed_bodies()
+        with profiler.section('physics integrate'):
+            self.integrate(occupancy)
+            self.apply_mouse_grab(input_snapshot)
+        with profiler.section('physics links'):
+            self.solve_constraints()
+        with profiler.section('physics collision'):
+            self.collide_with_static_links(collision_grid)
+        with profiler.section('physics sleep'):
+            self.update_sleep()
+
+    def get_vertex_count(self, awake_only: bool = False) -> int:
+        return int(np.count_nonzero(self.get_awake() if awake_only else self.live[:self.size]))
+
+    def get_awake(self) -> np.ndarray:
+        n = self.size
+        return self.live[:n] & ~self.asleep[:n]
+
+    # Fastest awake vertex in pixels per tick, 0 when everything is asleep
+    def get_max_speed(self) -> float:
+        n = self.size
+        awake = self.get_awake()
+        if not awake.any():
+            return 0
+        speed_sq = (self.x[:n][awake] - self.lx[:n][awake])**2 + (self.y[:n][awake] - self.ly[:n][awake])**2
+        return float(np.sqrt(speed_sq.max()))
+
+    def wake_body(self, key: int | None):
+        if key not in self.sleeping_links:
+            return
+        del self.sleeping_links[key]
+        self.rest_counters[key] = 0
+        self.asleep[:self.size][self.body_ids[:self.size] == self.body_serials[key]] = False
+
+    def wake_all(self):
+        for key in list(self.sleeping_links.keys()):
+            self.wake_body(key)
+
+    def put_to_sleep(self, key: int):
+        n = self.size
+        indices = np.nonzero(self.live[:n] & (self.body_ids[:n] == self.body_serials[key]))[0]
+        self.lx[indices] = self.x[indices]
+        self.ly[indices] = self.y[indices]
+        self.asleep[indices] = True
+        self.rest_state[indices] = self.get_rest_state(indices)
+        self.sleeping_links[key] = self.get_body_constraints(key)
+
+    # Whether the body's constraints still match the ones it fell asleep with
+    def is_slept_with(self, key: int, constraints: tuple) -> bool:
+        slept_with = self.sleeping_links[key]
+        for i in (2, 5, 7, 8):
+            if constraints[i] is not slept_with[i] and not np.array_equal(constraints[i], slept_with[i]):
+                return False
+        self.sleeping_links[key] = constraints
+        return True
+
+    def get_rest_state(self, indices: np.ndarray) -> np.ndarray:
+        return np.column_stack((self.x[indices], self.y[indices], self.lx[indices], self.ly[indices],
+                                self.gx[indices] * self.density[indices], self.gy[indices] * self.density[indices]))
+
+    # Wake sleeping bodies that were moved, pushed by water, re-linked or pulled through a link to an awake body
+    def wake_disturbed_bodies(self):
+        if not self.sleeping_links:
+            return
+
+        n = self.size
+        sleeping_indices = np.nonzero(self.live[:n] & self.asleep[:n])[0]
+        disturbed = np.abs(self.get_rest_state(sleeping_indices) - self.rest_state[sleeping_indices]).max(axis=1) \
+            > SLEEP_WAKE_TOLERANCE
+        for serial in np.unique(self.body_ids[sleeping_indices[disturbed]]).tolist():
+            self.wake_body(self.serial_keys.get(serial))
+
+        for key, softbody in self.bodies.items():
+            constraints = self.get_body_constraints(key)
+            if key in self.sleeping_links and not self.is_slept_with(key, constraints):
+                self.wake_body(key)
+                continue
+
+            _, _, link_indices, _, foreign, *_ = constraints
+            foreign_vertices = link_indices[foreign].ravel()
+            if self.asleep[foreign_vertices].any() and not self.asleep[foreign_vertices].all():
+                for serial in np.unique(self.body_ids[foreign_vertices]).tolist():
+                    self.wake_body(self.serial_keys.get(serial))
+
+        # Disturbances below the tolerance are dropped so they cannot creep a sleeping body out of place
+        still_sleeping = sleeping_indices[self.asleep[sleeping_indices]]
+        rest = self.rest_state[still_sleeping]
+        self.x[still_sleeping], self.y[still_sleeping] = rest[:, 0], rest[:, 1]
+        self.lx[still_sleeping], self.ly[still_sleeping] = rest[:, 2], rest[:, 3]
+
+    def update_sleep(self):
+        n = self.size
+        awake = self.get_awake()
+        body_ids = self.body_ids[:n][awake]
+        speed_sq = (self.x[:n][awake] - self.lx[:n][awake])**2 + (self.y[:n][awake] - self.ly[:n][awake])**2
+        energy = np.bincount(body_ids, weights=speed_sq, minlength=self.next_body_serial)
+        counts = np.bincount(body_ids, minlength=self.next_body_serial)
+        for key, serial in self.body_serials.items():
+            if key in self.sleeping_links:
+                continue
+            if counts[serial] and energy[serial] < SLEEP_ENERGY_THRESHOLD * counts[serial]:
+                self.rest_counters[key] += 1
+                if self.rest_counters[key] >= SLEEP_FRAMES:
+                    self.put_to_sleep(key)
+            else:
+                self.rest_counters[key] = 0
+
+    # The push falls off with squared distance, so only vertices near a moving mouse are affected
+    def apply_water_force(self, input_snapshot: InputSnapshot):
+        mouse_vx, mouse_vy = input_snapshot.mouse_velocity
+        if mouse_vx == 0 and mouse_vy == 0:
+            return
+
+        n = self.size
+        MWF = MOUSE_WATER_FORCE
+        mouse_x, mouse_y = input_snapshot.relative_mouse_position()
+        radius_sq = max(abs(mouse_vx), abs(mouse_vy)) * MWF * 10 / MOUSE_WATER_FORCE_CUTOFF
+        mouse_distance_sq = (self.x[:n] - mouse_x)**2 + (self.y[:n] - mouse_y)**2 + .1
+        affected = np.nonzero(self.live[:n] & ~self.anchor[:n] & (mouse_distance_sq < radius_sq))[0]
+        mouse_distance_sq = mouse_distance_sq[affected]
+        self.lx[affected] -= np.clip(mouse_vx * MWF / mouse_distance_sq, -MWF, MWF) * 10
+        self.ly[affected] -= np.clip(mouse_vy * MWF / mouse_distance_sq, -MWF, MWF) * 10
+
+    def integrate(self, occupancy: SculptureOccupancy | None):
+        n = self.size
+        x, y, lx, ly = self.x[:n], self.y[:n], self.lx[:n], self.ly[:n]
+        free = self.get_awake() & ~self.anchor[:n]
+
+        # Verlet step with drag and per-vertex gravity
+        vx = (x - lx) * DRAG + self.gx[:n] * self.density[:n]
+        vy = (y - ly) * DRAG + self.gy[:n] * self.density[:n]
+        np.copyto(lx, x, where=free)
+        np.copyto(ly, y, where=free)
+
+        new_x = x + vx
+        new_y = y + vy
+        moving = free.copy()
+        colliding = free & self.collides[:n]
+        if occupancy and colliding.any():
+            colliding_indices = np.nonzero(colliding)[0]
+            blocked = occupancy.contains(new_x[colliding_indices], new_y[colliding_indices])
+            moving[colliding_indices[blocked]] = False
+        np.copyto(x, new_x, where=moving)
+        np.copyto(y, new_y, where=moving)
+
+    def apply_mouse_grab(self, input_snapshot: InputSnapshot):
+        if not input_snapshot.mouse_presses[0]:
+            state.vertex_grabbed = None
+            return
+
+        mouse_position = input_snapshot.relative_mouse_position()
+        if not state.vertex_grabbed:
+            n = self.size
+            mouse_distance = np.hypot(self.x[:n] - mouse_position[0], self.y[:n] - mouse_position[1])
+            mouse_distance[~self.live[:n]] = np.inf
+            if n and mouse_distance.min() < MOUSE_GRAB_RADIUS:
+                state.vertex_grabbed = self.vertices[int(mouse_distance.argmin())]
+        if state.vertex_grabbed and state.vertex_grabbed.world is self:
+            self.wake_body(self.serial_keys.get(int(self.body_ids[state.vertex_grabbed.index])))
+            state.vertex_grabbed.apply_mouse_grab_force(mouse_position)
+
+    def constrain_tank_bounds(self):
+        n = self.size
+        x, y, lx, ly = self.x[:n], self.y[:n], self.lx[:n], self.ly[:n]
+        free = self.get_awake() & ~self.anchor[:n]
+        min_x, min_y, max_x, max_y = self.min_x[:n], self.min_y[:n], self.max_x[:n], self.max_y[:n]
+
+        for position, last_position, low, high in ((x, lx, min_x, max_x), (y, ly, min_y, max_y)):
+            below = free & (position < low)
+            above = free & ~below & (position > high)
+            clamped = np.where(below, low, np.where(above, high, position))
+            out_of_bounds = below | above
+            bounced = clamped - (clamped - last_position) * DRAG * BOUNCE_FORCE
+            np.copyto(position, clamped, where=out_of_bounds)
+            np.copyto(last_position, bounced, where=out_of_bounds)
+
+    # The body's links and angles whose vertices are all in this world, with their vertex indices
+    def index_constraints(self, softbody: Softbody) -> tuple:
+        links = [link for link in softbody.links if link.v1.world is self and link.v2.world is self]
+        angles = [angle for angle in softbody.angles
+                  if angle.v1.world is self and angle.v2.world is self and angle.v3.world is self]
+        link_indices = np.array([(link.v1.index, link.v2.index) for link in links], dtype=int).reshape(-1, 2)
+        angle_indices = np.array([(angle.v1.index, angle.v2.index, angle.v3.index) for angle in angles],
+                                 dtype=int).reshape(-1, 3)
+        return links, angles, link_indices, angle_indices
+
+    def color_constraints(self, links: list, angles: list, link_indices: np.ndarray, angle_indices: np.ndarray,
+                          body_id: int) -> tuple:
+        # Links into another body (e.g. a kelpworm's grab) share vertices with it, so they get their own group
+        foreign = np.any(self.body_ids[link_indices] != body_id, axis=1)
+        link_colors = greedy_coloring(link_indices)
+        angle_colors = greedy_coloring(angle_indices)
+        return links, angles, link_indices, link_colors, foreign, angle_indices, angle_colors
+
+    # Versions of the bodies the constraints use, or of the whole world under None if some were left out
+    def get_topology(self, key: int, links: list, angles: list, link_indices: np.ndarray,
+                     angle_indices: np.ndarray) -> tuple:
+        softbody = self.bodies[key]
+        serials = set(self.body_ids[link_indices].ravel().tolist()) | \
+                  set(self.body_ids[angle_indices].ravel().tolist()) | {self.body_serials[key]}
+        topology = tuple((serial, self.body_topology.get(serial, 0)) for serial in serials)
+        if len(links) < len(softbody.links) or len(angles) < len(softbody.angles):
+            topology += ((None, self.topology_version),)
+        return topology
+
+    def is_topology_current(self, topology: tuple) -> bool:
+        return all(version == (self.topology_version if serial is None else self.body_topology.get(serial, 0))
+                   for serial, version in topology)
+
+    # The body's coloring, then its link and angle values, reread only when its links_version changes
+    def get_body_constraints(self, key: int) -> tuple:
+        softbody = self.bodies[key]
+        cached = self.constraint_cache.get(key)
+        if (not cached or cached[0] is not softbody.links or cached[1] != len(softbody.links)
+            or not self.is_topology_current(cached[2])):
+            links, angles, link_indices, angle_indices = self.index_constraints(softbody)
+            # A links list rebuilt with the same structure, like a growing jellyfish's, keeps its coloring
+            if (cached and self.is_topology_current(cached[2]) and np.array_equal(link_indices, cached[3][2])
+                and np.array_equal(angle_indices, cached[3][5])):
+                coloring = (links, angles) + cached[3][2:]
+            else:
+                coloring = self.color_constraints(links, angles, link_indices, angle_indices,
+                                                  self.body_serials[key])
+            for constraint in links + angles:
+                constraint.softbody = softbody
+            topology = self.get_topology(key, links, angles, link_indices, angle_indices)
+            cached = (softbody.links, len(softbody.links), topology, coloring, None, ())
+            self.constraint_cache[key] = cached
+        if cached[4] != softbody.links_version:
+            links, angles = cached[3][:2]
+            values = (np.array([(link.length, link.tension) for link in links]).reshape(-1, 2),
+                      np.array([(angle.rest_angle, angle.stiffness) for angle in angles]).reshape(-1, 2))
+            cached = cached[:4] + (softbody.links_version, values)
+            self.constraint_cache[key] = cached
+        return cached[3] + cached[5]
+
+    # Sleeping bodies are left out entirely
+    def gather_constraints(self) -> tuple[list, list]:
+        link_parts = []
+        foreign_parts = []
+        angle_parts = []
+        for key in self.bodies.keys():
+            if key in self.sleeping_links:
+                continue
+            links, angles, link_indices, link_colors, foreign, angle_indices, angle_colors, link_values, \
+                angle_values = self.get_body_constraints(key)
+
+            if links:
+                own = ~foreign
+                link_parts.append((link_indices[own], link_colors[own], link_values[own]))
+                foreign_parts.append((link_indices[foreign], link_values[foreign]))
+            if angles:
+                angle_parts.append((angle_indices, angle_colors, angle_values))
+
+        link_groups = []
+        if link_parts:
+            link_indices = np.concatenate([part[0] for part in link_parts])
+            link_colors = np.concatenate([part[1] for part in link_parts])
+            link_values = np.concatenate([part[2] for part in link_parts])
+            foreign_indices = np.concatenate([part[0] for part in foreign_parts])
+            foreign_values = np.concatenate([part[1] for part in foreign_parts])
+            if len(foreign_indices):
+                link_indices = np.concatenate((link_indices, foreign_indices))
+                link_colors = np.concatenate((link_colors, link_colors.max(initial=-1) + 1
+                                              + greedy_coloring(foreign_indices)))
+                link_values = np.concatenate((link_values, foreign_values))
+            for group in split_by_color(link_colors):
+                i, j = link_indices[group, 0], link_indices[group, 1]
+                length, tension = link_values[group, 0], link_values[group, 1]
+
+                # Anchored endpoints stay put and their partner takes the whole correction
+                anchor_i, anchor_j = self.anchor[i], self.anchor[j]
+                weight_i = np.where(anchor_i, 0, np.where(anchor_j, 2, 1))
+                weight_j = np.where(anchor_i, 2, np.where(anchor_j, 0, 1))
+                link_groups.append((i, j, length, tension, weight_i, weight_j))
+
+        angle_groups = []
+        if angle_parts:
+            angle_indices = np.concatenate([part[0] for part in angle_parts])
+            angle_colors = np.concatenate([part[1] for part in angle_parts])
+            angle_values = np.concatenate([part[2] for part in angle_parts])
+            for group in split_by_color(angle_colors):
+                i, j, k = angle_indices[group, 0], angle_indices[group, 1], angle_indices[group, 2]
+                angle_groups.append((i, j, k, angle_values[group, 0], angle_values[group, 1],
+                                     ~self.anchor[i], ~self.anchor[k]))
+
+        return link_groups, angle_groups
+
+    # Each color group touches every vertex at most once, so a whole group is solved as one array operation
+    def solve_constraints(self):
+        link_groups, angle_groups = self.gather_constraints()
+        x, y = self.x, self.y
+
+        for _ in range(CONSTRAINT_ITERATIONS):
+            for i, j, length, tension, weight_i, weight_j in link_groups:
+                dx = x[j] - x[i]
+                dy = y[j] - y[i]
+                link_distance = np.maximum(np.hypot(dx, dy), 1e-6)
+                fraction = ((length - link_distance) / link_distance) * tension
+                dx *= fraction
+                dy *= fraction
+                x[i] -= dx * weight_i
+                y[i] -= dy * weight_i
+                x[j] += dx * weight_j
+                y[j] += dy * weight_j
+
+            for i, j, k, rest_angle, stiffness, free_i, free_k in angle_groups:
+                ax, ay = x[i] - x[j], y[i] - y[j]
+                bx, by = x[k] - x[j], y[k] - y[j]
+                valid = ((ax != 0) | (ay != 0)) & ((bx != 0) | (by != 0))
+                current = np.degrees(np.arctan2(by, bx) - np.arctan2(ay, ax))
+                correction = np.radians((current - rest_angle) * stiffness * 0.5)
+                cos, sin = np.cos(correction), np.sin(correction)
+                rotate_i = valid & free_i
+                rotate_k = valid & free_k
+                x[i] = np.where(rotate_i, x[j] + ax * cos + ay * sin, x[i])
+                y[i] = np.where(rotate_i, y[j] - ax * sin + ay * cos, y[i])
+                x[k] = np.where(rotate_k, x[j] + bx * cos - by * sin, x[k])
+                y[k] = np.where(rotate_k, y[j] + bx * sin + by * cos, y[k])
+
+            self.constrain_tank_bounds()
+
+    def collide_with_static_links(self, collision_grid: StaticLinkGrid | None):
+        n = self.size
+        colliding_indices = np.nonzero(self.get_awake() & self.collides[:n])[0]
+        if not collision_grid or not collision_grid.num_links or len(colliding_indices) == 0:
+            return
+
+        # Broad phase: links sharing a grid cell with the vertex's swept path
+        vertex_indices, link_indices = collision_grid.query(colliding_indices, self.x, self.y, self.lx, self.ly,
+                                                            STATIC_LINK_BROAD_PHASE_MARGIN)
+        if len(link_indices) == 0:
+            return
+
+        # Narrow phase, in rounds so each vertex still meets its candidate links one at a time, in order
+        pair_rank = np.arange(len(vertex_indices)) - np.searchsorted(vertex_indices, vertex_indices)
+        rounds = [pair_rank == rank for rank in range(pair_rank.max() + 1)]
+        for _ in range(STATIC_COLLISION_PASSES):
+            for in_round in rounds:
+                self.constrain_distance_to_static_links(vertex_indices[in_round], link_indices[in_round],
+                                                        collision_grid.links)
+
+    def constrain_distance_to_static_links(self, vertex_indices: np.ndarray, link_indices: np.ndarray,
+                                           static_links: tuple, vertex_radius: float = VERTEX_COLLISION_RADIUS):
+        link_x1, link_y1, link_x2, link_y2, link_min_x, link_min_y, link_max_x, link_max_y = \
+            (array[link_indices] for array in static_links)
+        curr_x, curr_y = self.x[vertex_indices], self.y[vertex_indices]
+        prev_x, prev_y = self.lx[vertex_indices], self.ly[vertex_indices]
+        r = vertex_radius
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # AABB rejection against the current position
+            candidate = ~((curr_x < link_min_x - r) | (curr_x > link_max_x + r) |
+                          (curr_y < link_min_y - r) | (curr_y > link_max_y + r))
+
+            link_dx = link_x2 - link_x1
+            link_dy = link_y2 - link_y1
+            link_len_sq = link_dx * link_dx + link_dy * link_dy
+            candidate &= link_len_sq != 0
+
+            # Static overlap resolution against the closest point on the link
+            t_closest = np.clip(((curr_x - link_x1) * link_dx + (curr_y - link_y1) * link_dy) / link_len_sq,
+                                0.0, 1.0)
+            sep_x = curr_x - (link_x1 + link_dx * t_closest)
+            sep_y = curr_y - (link_y1 + link_dy * t_closest)
+            separation = np.hypot(sep_x, sep_y)
+            overlapping = candidate & (0 < separation) & (separation < r)
+            penetration = (r - separation) / separation
+            resolved_x = np.where(overlapping, curr_x + sep_x * penetration, curr_x)
+            resolved_y = np.where(overlapping, curr_y + sep_y * penetration, curr_y)
+
+            # Swept test of the vertex path against the collision slab around the link
+            vel_x = curr_x - prev_x
+            vel_y = curr_y - prev_y
+            sweeping = candidate & ~overlapping & ((vel_x != 0) | (vel_y != 0))
+            inv_link_len = 1.0 / np.sqrt(link_len_sq)
+            normal_x = -link_dy * inv_link_len
+            normal_y = link_dx * inv_link_len
+            prev_signed_dist = (prev_x - link_x1) * normal_x + (prev_y - link_y1) * normal_y
+            curr_signed_dist = (curr_x - link_x1) * normal_x + (curr_y - link_y1) * normal_y
+            sweeping &= ~(((prev_signed_dist > r) & (curr_signed_dist > r)) |
+                          ((prev_signed_dist < -r) & (curr_signed_dist < -r)))
+            denom = prev_signed_dist - curr_signed_dist
+            sweeping &= denom != 0
+            toi = (prev_signed_dist - r) / denom
+            sweeping &= (toi >= 0) & (toi <= 1)
+
+            hit_x = prev_x + vel_x * toi
+            hit_y = prev_y + vel_y * toi
+            proj = ((hit_x - link_x1) * link_dx + (hit_y - link_y1) * link_dy) / link_len_sq
+            sweeping &= (proj >= 0) & (proj <= 1)
+
+        self.x[vertex_indices] = np.where(sweeping, hit_x + normal_x * r, resolved_x)
+        self.y[vertex_indices] = np.where(sweeping, hit_y + normal_y * r, resolved_y)
+
+# Greedy edge coloring: no two constraints of the same color share a vertex
+def greedy_coloring(constraint_indices: np.ndarray) -> np.ndarray:
+    colors = np.zeros(len(constraint_indices), dtype=int)
+    used_colors: dict[int, set[int]] = {}
+    for n, vertex_indices in enumerate(constraint_indices.tolist()):
+        taken = set().union(*(used_colors.get(index, ()) for index in vertex_indices))
+        color = 0
+        while color in taken:
+            color += 1
+        colors[n] = color
+        for index in vertex_indices:
+            used_colors.setdefault(index, set()).add(color)
+    return colors
+
+def split_by_color(colors: np.ndarray) -> list[np.ndarray]:
+    order = np.argsort(colors, kind='stable')
+    boundaries = np.nonzero(np.diff(colors[order]))[0] + 1
+    return np.split(order, boundaries)
@@ -0,0 +1,132 @@
+import pygame
+import time
+import numpy as np
+from contextlib import nullcontext
+
+PROFILER_WINDOW = 120 # Default frames kept for the rolling percentiles
+PROFILER_PERCENTILES = (50, 95, 99)
+PROFILER_HUD_INTERVAL = 15 # Frames between HUD refreshes
+PROFILER_HUD_LINES = 16
+PROFILER_HUD_COLOR = (200, 200, 200)
+PROFILER_HUD_BACKGROUND = (0, 0, 0, 160)
+PROFILER_HUD_LINE_HEIGHT = 5
+
+# Off by default. While off, sections are a shared no-op context and counters return immediately
+enabled = False
+hud_enabled = False
+frame_index = 0
+frame_times: dict[str, float] = {} # Seconds spent per section this frame
+frame_counts: dict[str, float] = {}
+histories: dict[str, np.ndarray] = {} # Ring buffers of the last history_window frames
+history_sizes: dict[str, int] = {}
+history_window = PROFILER_WINDOW
+counter_names: set[str] = set()
+NULL_SECTION = nullcontext()
+
+def enable(hud: bool = False):
+    global enabled, hud_enabled
+    enabled = True
+    hud_enabled = hud
+
+def disable():
+    global enabled, hud_enabled
+    enabled = False
+    hud_enabled = False
+
+class Section:
+    __slots__ = ('name', 'start_time')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+
+    def __exit__(self, *exc):
+        frame_times[self.name] = frame_times.get(self.name, 0) + time.perf_counter() - self.start_time
+
+# Time a block: with profiler.section('name'): ...
+def section(name: str) -> Section | nullcontext:
+    return Section(name) if enabled else NULL_SECTION
+
+def increment(name: str, amount: float = 1):
+    if enabled:
+        frame_counts[name] = frame_counts.get(name, 0) + amount
+        counter_names.add(name)
+
+def record(name: str, value: float):
+    if enabled:
+        frame_counts[name] = value
+        counter_names.add(name)
+
+def push_history(name: str, value: float):
+    if name not in histories:
+        histories[name] = np.zeros(history_window)
+        history_sizes[name] = 0
+    histories[name][history_sizes[name] % history_window] = value
+    history_sizes[name] += 1
+
+# Roll this frame's times and counts into the histories. Known names missing this frame record 0
+def end_frame():
+    global frame_index
+    if not enabled:
+        return
+    for name in histories.keys() | frame_times.keys() | frame_counts.keys():
+        push_history(name, frame_times.get(name, frame_counts.get(name, 0)))
+    frame_times.clear()
+    frame_counts.clear()
+    frame_index += 1
+
+# Forget all measurements, keeping the last window frames from now on
+def reset(window: int = PROFILER_WINDOW):
+    global frame_index, history_window
+    history_window = window
+    frame_times.clear()
+    frame_counts.clear()
+    histories.clear()
+    history_sizes.clear()
+    counter_names.clear()
+    frame_index = 0
+
+def get_history(name: str) -> np.ndarray:
+    return histories[name][:min(history_sizes[name], history_window)]
+
+# Section times are in seconds, counters in their own units
+def get_percentiles(name: str, percentiles: tuple[int, ...] = PROFILER_PERCENTILES) -> dict[int, float]:
+    history = get_history(name)
+    values = np.percentile(history, percentiles) if len(history) else np.zeros(len(percentiles))
+    return dict(zip(percentiles, values.tolist()))
+
+def get_report(percentiles: tuple[int, ...] = PROFILER_PERCENTILES) -> dict[str, dict[int, float]]:
+    return {name: get_percentiles(name, percentiles) for name in sorted(histories.keys())}
+
+def get_hud_signature() -> object:
+    return frame_index // PROFILER_HUD_INTERVAL if hud_enabled else False
+
+# Slowest sections by p95 in microseconds, then counters. The font has no punctuation, so only integers are shown
+def get_hud_lines() -> list[str]:
+    percentiles = PROFILER_PERCENTILES
+    report = get_report(percentiles)
+    sections = {name: values for name, values in report.items() if name not in counter_names}
+    counters = {name: values for name, values in report.items() if name in counter_names}
+    slowest = sorted(sections, key=lambda name: -sections[name][percentiles[1]])
+    lines = ['us ' + ' '.join(f"p{percentile}" for percentile in percentiles)]
+    for name in slowest[:max(PROFILER_HUD_LINES - len(counters) - 1, 0)]:
+        lines.append(f"{name} " + ' '.join(str(round(value*1e6)) for value in sections[name].values()))
+    for name, values in counters.items():
+        lines.append(f"{name} {round(values[percentiles[0]])}")
+    return lines
+
+def render_hud_onto(surface: pygame.Surface) -> list[pygame.Rect]:
+    if not hud_enabled:
+        return []
+    from ui import render_text
+    labels = [render_text(clean_hud_text(line), PROFILER_HUD_COLOR) for line in get_hud_lines()]
+    hud_rect = pygame.Rect(0, 0, max(label.get_width() for label in labels) + 2,
+                           len(labels) * PROFILER_HUD_LINE_HEIGHT + 1)
+    surface.fill(PROFILER_HUD_BACKGROUND, hud_rect)
+    surface.fblits([(label, (1, 1 + index * PROFILER_HUD_LINE_HEIGHT)) for index, label in enumerate(labels)])
+    return [hud_rect]
+
+def clean_hud_text(text: str) -> str:
+    return ''.join(letter if letter.isalnum() or letter in '=_*' else ' ' for letter in text.lower())
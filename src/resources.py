@@ -2,8 +2,8 @@ import pygame
 import state
 import random
 from enum import Enum
-import tkinter
-import tkinter.filedialog
+from typing import NamedTuple
+import os
 
 WHITE = pygame.Color(255, 255, 255)
 BLACK = pygame.Color(0, 0, 0)
@@ -13,44 +13,87 @@ def distance(p1: tuple[float, float], p2: tuple[float, float]) -> float:
     x2, y2 = p2
     return ((x2-x1)**2 + (y2-y1)**2)**(1/2)
 
+# Where mouse and event input comes from. Headless runs swap in a scripted source
+class InputSource:
+    def get_mouse_position(self) -> tuple[int, int]:
+        return pygame.mouse.get_pos()
+
+    def get_mouse_presses(self) -> tuple[bool, bool, bool]:
+        return pygame.mouse.get_pressed()
+
+    def get_mouse_rel(self) -> tuple[int, int]:
+        return pygame.mouse.get_rel()
+
+    def get_events(self) -> list[pygame.Event]:
+        return pygame.event.get()
+
+# Mouse parked far outside the tank, nothing pressed and no events
+class NeutralInput(InputSource):
+    def __init__(self, mouse_position: tuple[int, int] = (-10000, -10000)):
+        self.mouse_position = mouse_position
+
+    def get_mouse_position(self) -> tuple[int, int]:
+        return self.mouse_position
+
+    def get_mouse_presses(self) -> tuple[bool, bool, bool]:
+        return (False, False, False)
+
+    def get_mouse_rel(self) -> tuple[int, int]:
+        return (0, 0)
+
+    def get_events(self) -> list[pygame.Event]:
+        return []
+
+input_source = InputSource()
+def get_input_source() -> InputSource:
+    return input_source
+
+def set_input_source(source: InputSource):
+    global input_source
+    input_source = source
+
+# Everything the simulation reads from the user in one frame, polled once. Positions are in window pixels
+class InputSnapshot(NamedTuple):
+    mouse_position: tuple[int, int]
+    mouse_velocity: tuple[int, int]
+    mouse_presses: tuple[bool, bool, bool]
+    events: tuple[pygame.Event, ...]
+
+    def relative_mouse_position(self) -> tuple[float, float]:
+        return (self.mouse_position[0]/state.SCALE, self.mouse_position[1]/state.SCALE)
+
+    def with_mouse_velocity(self, mouse_velocity: tuple[int, int]):
+        return self._replace(mouse_velocity=mouse_velocity)
+
+def take_input_snapshot(source: InputSource | None = None) -> InputSnapshot:
+    source = source or input_source
+    return InputSnapshot(tuple(source.get_mouse_position()), tuple(source.get_mouse_rel()), # type: ignore
+                         tuple(source.get_mouse_presses()), tuple(source.get_events())) # type: ignore
+
+NEUTRAL_INPUT = take_input_snapshot(NeutralInput())
+
+# The snapshot of the frame being processed, read by UI and organism AI
+input_snapshot = NEUTRAL_INPUT
+def get_input_snapshot() -> InputSnapshot:
+    return input_snapshot
+
+def set_input_snapshot(snapshot: InputSnapshot):
+    global input_snapshot
+    input_snapshot = snapshot
+
 def get_relative_mouse_position() -> tuple[float, float]:
-    x, y = pygame.mouse.get_pos()
-    return (x/state.SCALE, y/state.SCALE)
+    return input_snapshot.relative_mouse_position()
 
 def biased_random_beta(toward=0.5, strength=5.0):
     a = 1 + toward * strength
     b = 1 + (1 - toward) * strength
     return random.betavariate(a, b)
 
-event_cache: list[pygame.Event] = []
-events_last_updated = 0
-def get_events() -> list[pygame.Event]:
-    global event_cache
-    global events_last_updated
-    if events_last_updated != state.frame_count:
-        event_cache = pygame.event.get()
-        events_last_updated = state.frame_count
-    return event_cache
-
-mouse_press_cache: tuple[bool, bool, bool] = (False, False, False)
-mouse_press_cache_last_updated = 0
+def get_events() -> tuple[pygame.Event, ...]:
+    return input_snapshot.events
+
 def get_mouse_presses() -> tuple[bool, bool, bool]:
-    global mouse_press_cache
-    global mouse_press_cache_last_updated
-    if mouse_press_cache_last_updated != state.frame_count:
-        mouse_press_cache = pygame.mouse.get_pressed()
-        mouse_press_cache_last_updated = state.frame_count
-    return mouse_press_cache
-
-mouse_velocity: tuple[int, int] = (0, 0)
-mouse_velocity_last_updated = 0
-def get_mouse_velocity() -> tuple[int, int]:
-    global mouse_velocity
-    global mouse_velocity_last_updated
-    if mouse_velocity_last_updated != state.frame_count:
-        mouse_velocity = pygame.mouse.get_rel()
-        mouse_velocity_last_updated = state.frame_count
-    return mouse_velocity
+    return input_snapshot.mouse_presses
 
 class Wall(Enum):
     RIGHT = 0
@@ -82,28 +125,33 @@ def normalize(vector: tuple[float, float]):
 def graduate_value_towards(current_value: float, target_value: float, rate: float) -> float:
         return (current_value - target_value) / (1 + rate) + target_value
 
+TANK_FILE_TYPES = [('Tank Save Files', '*.tank'), ('Tank JSON Files', '*.json')]
 def prompt_for_load_tank():
+    import tkinter, tkinter.filedialog
     tk_root = tkinter.Tk()
     tk_root.withdraw()
     file_name = tkinter.filedialog.askopenfilename(parent=tk_root, 
-                                                     filetypes=[('Tank Save Files', '*.tank')],
+                                                     filetypes=TANK_FILE_TYPES,
                                                      defaultextension='.tank')
     tk_root.destroy()
     return file_name
 
 def prompt_for_save_tank(save_filepath: str | None = None):
+    import tkinter, tkinter.filedialog
     tk_root = tkinter.Tk()
     tk_root.withdraw()
     file_name = tkinter.filedialog.asksaveasfilename(parent=tk_root, 
-                                                     filetypes=[('Tank Save Files', '*.tank')],
+                                                     filetypes=TANK_FILE_TYPES,
                                                      defaultextension='.tank',
                                                      confirmoverwrite=False,
                                                      initialfile=save_filepath)
     tk_root.destroy()
     return file_name
 
+# Textures are decoded once and shared, so callers must copy a texture before modifying it
+texture_cache: dict[tuple[str, bool], pygame.Surface] = {}
 def load_texture(texture_name: str, alpha: bool = False) -> pygame.Surface:
-    texture = pygame.image.load(state.TEXTURES_FP + f"\\{texture_name}.png")
-    if alpha:
-        return texture.convert_alpha()
-    return texture
\ No newline at end of file
+    if (texture_name, alpha) not in texture_cache:
+        texture = pygame.image.load(os.path.join(state.TEXTURES_FP, f"{texture_name}.png"))
+        texture_cache[(texture_name, alpha)] = texture.convert_alpha() if alpha else texture
+    return texture_cache[(texture_name, alpha)]
\ No newline at end of file
@@ -0,0 +1,174 @@
+import os
+import json
+import zlib
+import base64
+import numpy as np
+import pygame
+import state
+from collections import Counter
+from tank_format import is_binary_tank, read_tank_tables, write_atomic
+from autosave import AUTOSAVE_FP
+
+# Cached details and thumbnails of the saves and autosaves, reread only when a file changes
+SAVE_LIBRARY_INDEX_FP = os.path.join(state.SAVES_FP, ".library")
+SAVE_LIBRARY_VERSION = 1
+SAVE_EXTENSIONS = ('.tank', '.json')
+THUMBNAIL_SIZE = (24, 12)
+THUMBNAIL_OVERSAMPLE = 4 # Drawn this many times larger, then smoothly scaled down
+THUMBNAIL_WATER_COLOR = (10, 14, 20)
+THUMBNAIL_BACKGROUND_SCULPTURE_COLOR = (35, 35, 35)
+THUMBNAIL_FOREGROUND_SCULPTURE_COLOR = (70, 70, 70)
+THUMBNAIL_ORGANISM_COLOR = (150, 170, 150)
+
+class SaveEntry:
+    def __init__(self, filename: str, mtime_ns: int, file_size: int, tank_size: tuple[int, int],
+                 species_counts: dict[str, int], sculpture_count: int, thumbnail: pygame.Surface):
+        self.filename = filename
+        self.mtime_ns = mtime_ns
+        self.file_size = file_size
+        self.tank_size = tank_size
+        self.species_counts = species_counts
+        self.sculpture_count = sculpture_count
+        self.thumbnail = thumbnail
+
+    def name(self) -> str:
+        return os.path.splitext(os.path.basename(self.filename))[0]
+
+    # Saves in a subfolder of the library's, which is only the autosave folder
+    def is_autosave(self) -> bool:
+        return os.path.dirname(self.filename) != ''
+
+    def is_current(self, stat: os.stat_result) -> bool:
+        return self.mtime_ns == stat.st_mtime_ns and self.file_size == stat.st_size
+
+    def to_json(self) -> dict:
+        thumbnail = zlib.compress(pygame.image.tobytes(self.thumbnail, 'RGB'))
+        return {'filename': self.filename, 'mtime_ns': self.mtime_ns, 'file_size': self.file_size,
+                'tank_size': self.tank_size, 'species_counts': self.species_counts,
+                'sculpture_count': self.sculpture_count, 'thumbnail': base64.b64encode(thumbnail).decode()}
+
+    @staticmethod
+    def from_json(json_dict: dict):
+        thumbnail = pygame.image.frombytes(zlib.decompress(base64.b64decode(json_dict['thumbnail'])),
+                                           THUMBNAIL_SIZE, 'RGB')
+        return SaveEntry(json_dict['filename'], json_dict['mtime_ns'], json_dict['file_size'],
+                         tuple(json_dict['tank_size']), json_dict['species_counts'], json_dict['sculpture_count'],
+                         thumbnail)
+
+# Fitted into the thumbnail without stretching. Organisms are drawn as their links, sculptures as their outlines
+def render_thumbnail(tank_size: tuple[int, int], links: np.ndarray, sculptures: list[tuple[np.ndarray, bool]]
+                     ) -> pygame.Surface:
+    large_size = (THUMBNAIL_SIZE[0] * THUMBNAIL_OVERSAMPLE, THUMBNAIL_SIZE[1] * THUMBNAIL_OVERSAMPLE)
+    surface = pygame.Surface(large_size)
+    surface.fill(THUMBNAIL_WATER_COLOR)
+    scale = min(large_size[0] / max(tank_size[0], 1), large_size[1] / max(tank_size[1], 1))
+    offset = np.array([(large_size[0] - tank_size[0] * scale) / 2, (large_size[1] - tank_size[1] * scale) / 2])
+
+    for is_background in (True, False):
+        color = THUMBNAIL_BACKGROUND_SCULPTURE_COLOR if is_background else THUMBNAIL_FOREGROUND_SCULPTURE_COLOR
+        for points, sculpture_is_background in sculptures:
+            if sculpture_is_background != is_background:
+                continue
+            points = (points * scale + offset).tolist()
+            if len(points) >= 3:
+                pygame.draw.polygon(surface, color, points)
+            elif len(points) == 2:
+                pygame.draw.line(surface, color, *points, THUMBNAIL_OVERSAMPLE)
+    for x1, y1, x2, y2 in (links * scale + np.tile(offset, 2)).tolist():
+        pygame.draw.line(surface, THUMBNAIL_ORGANISM_COLOR, (x1, y1), (x2, y2), THUMBNAIL_OVERSAMPLE // 2)
+    return pygame.transform.smoothscale(surface, THUMBNAIL_SIZE)
+
+# Reads one save straight from its tables or JSON, without building any vertices or organisms
+def index_tank(tank_fp: str, filename: str, stat: os.stat_result) -> SaveEntry:
+    with open(tank_fp, "rb") as tank_file:
+        data = tank_file.read()
+    if is_binary_tank(data):
+        tables, metadata = read_tank_tables(data)
+        vertex_table, member_table, link_table, _, sculpture_table = tables
+        positions = np.column_stack((vertex_table['x'], vertex_table['y']))
+        species = [fields['type'] for fields in metadata['organisms']]
+        links = np.column_stack((positions[link_table['v1']], positions[link_table['v2']]))
+        sculptures = [(positions[member_table[member_start:member_start + member_count]], bool(is_background))
+                      for member_start, member_count, is_background in sculpture_table.tolist()]
+    else:
+        metadata = json.loads(data)
+        positions_by_id = {vertex['id']: (vertex['x'], vertex['y']) for vertex in metadata['vertices']}
+        species = [organism['type'] for organism in metadata['organisms']]
+        links = np.array([positions_by_id[link['v1_id']] + positions_by_id[link['v2_id']]
+                          for organism in metadata['organisms'] for link in organism['softbody']['links']],
+                         dtype=float).reshape(-1, 4)
+        sculptures = [(np.array([positions_by_id[vertex_id] for vertex_id in sculpture['vertex_ids']],
+                                dtype=float).reshape(-1, 2), sculpture['is_background'])
+                      for sculpture in metadata['sculptures']]
+    tank_size = tuple(metadata['rect'][2:4])
+    return SaveEntry(filename, stat.st_mtime_ns, stat.st_size, tank_size, dict(Counter(species)),
+                     len(sculptures), render_thumbnail(tank_size, links, sculptures))
+
+class SaveLibrary:
+    def __init__(self, directory: str = state.SAVES_FP, index_fp: str = SAVE_LIBRARY_INDEX_FP,
+                 autosave_directory: str = AUTOSAVE_FP):
+        self.directory = directory
+        self.autosave_directory = autosave_directory
+        self.index_fp = index_fp
+        self.entries: dict[str, SaveEntry] = {}
+        self.load_index()
+
+    def load_index(self):
+        try:
+            with open(self.index_fp, "r") as index_file:
+                index = json.load(index_file)
+            if index['version'] == SAVE_LIBRARY_VERSION:
+                self.entries = {entry.filename: entry for entry in map(SaveEntry.from_json, index['entries'])}
+        except (OSError, ValueError, KeyError, TypeError, zlib.error):
+            # A missing or damaged index is rebuilt from the saves
+            self.entries = {}
+
+    def save_index(self):
+        index = {'version': SAVE_LIBRARY_VERSION, 'entries': [entry.to_json() for entry in self.entries.values()]}
+        try:
+            write_atomic(self.index_fp, json.dumps(index).encode())
+        except OSError:
+            pass # The index is only a cache, so saves are reindexed next time instead
+
+    def get_filepath(self, entry: SaveEntry) -> str:
+        return os.path.join(self.directory, entry.filename)
+
+    # Reindexes new or changed saves, returning the saves by name and then the autosaves newest first
+    def refresh(self) -> list[SaveEntry]:
+        dir_entries = []
+        for directory in (self.directory, self.autosave_directory):
+            try:
+                dir_entries += [dir_entry for dir_entry in os.scandir(directory) if dir_entry.is_file()]
+            except OSError:
+                pass
+        entries = {}
+        changed = False
+        for dir_entry in dir_entries:
+            if dir_entry.name.startswith('.') or not dir_entry.name.lower().endswith(SAVE_EXTENSIONS):
+                continue
+            filename = os.path.relpath(dir_entry.path, self.directory)
+            stat = dir_entry.stat()
+            entry = self.entries.get(filename)
+            if entry is None or not entry.is_current(stat):
+                try:
+                    entry = index_tank(dir_entry.path, filename, stat)
+                except (OSError, ValueError, KeyError, TypeError, IndexError):
+                    continue
+                changed = True
+            entries[filename] = entry
+        changed = changed or entries.keys() != self.entries.keys()
+        self.entries = entries
+        if changed:
+            self.save_index()
+        saves = sorted((entry for entry in entries.values() if not entry.is_autosave()),
+                       key=lambda entry: entry.filename.lower())
+        autosaves = sorted((entry for entry in entries.values() if entry.is_autosave()),
+                           key=lambda entry: entry.mtime_ns, reverse=True)
+        return saves + autosaves
+
+save_library: SaveLibrary | None = None
+def get_save_library() -> SaveLibrary:
+    global save_library
+    if save_library is None:
+        save_library = SaveLibrary()
+    return save_library
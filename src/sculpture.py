@@ -5,6 +5,7 @@ DEBUG_LINK_COLOR = pygame.Color(255, 255, 0)
 class Sculpture:
     def __init__(self, vertices: list[Vertex], is_background: bool):
         self.vertices = vertices
+        self.version = 0
         self.links: list[Link] = []
         self.generate_links()
         self.is_background = is_background
@@ -14,6 +15,7 @@ class Sculpture:
         self.generate_links()
                 
     def generate_links(self):
+        self.version += 1
         self.links = []
         for i, vertex in enumerate(self.vertices):
             if i != len(self.vertices)-1:
@@ -23,27 +25,21 @@ class Sculpture:
                 self.links.append(Link(vertex, self.vertices[0], 
                                        distance(vertex.x_y(), self.vertices[0].x_y())))
 
-    def render(self, tank_rect: pygame.Rect, color: pygame.Color = BLACK):
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
-
+    # Sculpture colors are opaque, so they draw straight onto the shared layer. Returns the rect drawn into
+    def render_onto(self, surface: pygame.Surface, color: pygame.Color = BLACK) -> pygame.Rect:
         points = list(map(Vertex.x_y, self.vertices))
         if len(points) == 0:
-            pygame.draw.circle(surface, color, get_relative_mouse_position(), VERTEX_COLLISION_RADIUS-1)
+            return pygame.draw.circle(surface, color, get_relative_mouse_position(), VERTEX_COLLISION_RADIUS-1)
         elif len(points) == 1:
-            pygame.draw.circle(surface, color, points[0], VERTEX_COLLISION_RADIUS-1)
+            return pygame.draw.circle(surface, color, points[0], VERTEX_COLLISION_RADIUS-1)
         elif len(points) == 2:
-            pygame.draw.line(surface, color, points[0], points[1], VERTEX_COLLISION_RADIUS*2-1)
+            return pygame.draw.line(surface, color, points[0], points[1], VERTEX_COLLISION_RADIUS*2-1)
         else:
-            pygame.draw.polygon(surface, color, points)
-            pygame.draw.polygon(surface, color, points, VERTEX_COLLISION_RADIUS*2-1)
-
-        return surface
+            return pygame.draw.polygon(surface, color, points).union(
+                pygame.draw.polygon(surface, color, points, VERTEX_COLLISION_RADIUS*2-1))
     
-    def render_frame(self, tank_rect: pygame.Rect):
-        surface = pygame.Surface(tank_rect.size, pygame.SRCALPHA)
-        for link in self.links:
-            pygame.draw.line(surface, DEBUG_LINK_COLOR, link.v1.x_y(), link.v2.x_y())
-        return surface
+    def render_frame_onto(self, surface: pygame.Surface) -> list[pygame.Rect]:
+        return [pygame.draw.line(surface, DEBUG_LINK_COLOR, link.v1.x_y(), link.v2.x_y()) for link in self.links]
     
     def has_neighbors(self, vertex: Vertex, radius: float) -> bool:
         for neighbor in self.vertices:
@@ -55,6 +51,7 @@ class Sculpture:
         for vertex in self.vertices:
             if self.has_neighbors(vertex, simplify_radius):
                 self.vertices.remove(vertex)
+        self.version += 1
 
     def get_is_background(self):
         return self.is_background
@@ -63,7 +60,7 @@ class Sculpture:
         return not self.is_background
     
     def to_json(self) -> dict:
-        vertex_ids = list(map(id, self.vertices))
+        vertex_ids = [vertex.id for vertex in self.vertices]
         return {'vertex_ids': vertex_ids, 'is_background': self.is_background}
     
     @staticmethod
@@ -71,13 +68,27 @@ class Sculpture:
         vertices = [ids_to_vertices[vertex_id] for vertex_id in json_dict['vertex_ids']]
         return Sculpture(vertices, json_dict['is_background'])
     
-def render_sculptures(rect: pygame.Rect, sculptures: list[Sculpture], 
-                      overlay_frame: bool = False, color: pygame.Color = BLACK) -> pygame.Surface:
-    surface = pygame.Surface(rect.size, pygame.SRCALPHA)
-    for sculpture in sculptures:
-        surface.blit(sculpture.render(rect, color))
-    surface.blit(load_texture('sculpture'), special_flags=pygame.BLEND_RGB_MULT)
+# The sculpture texture cropped to the tank, as only that corner of it is ever blended in
+sculpture_texture_crops: dict[tuple[int, int], pygame.Surface] = {}
+def get_sculpture_texture(size: tuple[int, int]) -> pygame.Surface:
+    if size not in sculpture_texture_crops:
+        texture = load_texture('sculpture')
+        sculpture_texture_crops[size] = texture.subsurface(texture.get_rect().clip((0, 0), size)).copy()
+    return sculpture_texture_crops[size]
+
+# Changes whenever the rendering of these sculptures would
+def get_sculptures_signature(sculptures: list[Sculpture], overlay_frame: bool = False) -> tuple:
+    signature = tuple((id(sculpture), sculpture.version) for sculpture in sculptures)
+    if any(len(sculpture.vertices) == 0 for sculpture in sculptures):
+        # An empty sculpture is drawn at the mouse
+        return (signature, overlay_frame, get_relative_mouse_position())
+    return (signature, overlay_frame)
+
+def render_sculptures_onto(surface: pygame.Surface, sculptures: list[Sculpture], 
+                           overlay_frame: bool = False, color: pygame.Color = BLACK) -> list[pygame.Rect]:
+    regions = [sculpture.render_onto(surface, color) for sculpture in sculptures]
+    surface.blit(get_sculpture_texture(surface.get_size()), special_flags=pygame.BLEND_RGB_MULT)
     if overlay_frame:
         for sculpture in sculptures:
-            surface.blit(sculpture.render_frame(rect))
-    return surface
\ No newline at end of file
+            regions += sculpture.render_frame_onto(surface)
+    return regions
\ No newline at end of file
@@ -65,45 +65,34 @@ MOUSE_WATER_FORCE = 1
 CONSTRAINT_ITERATIONS = 8
 VERTEX_COLLISION_RADIUS = 2
 
+# Link and angle values the physics world caches per softbody. Changing one bumps its softbody's links_version
+def constraint_attribute(name: str):
+    local_name = '_' + name
+
+    def get(self):
+        return self.__dict__[local_name]
+
+    def set(self, value):
+        if self.softbody is not None and self.__dict__.get(local_name, value) != value:
+            self.softbody.links_version += 1
+        self.__dict__[local_name] = value
+
+    return property(get, set)
+
 class Link:
+    length = constraint_attribute('length')
+    tension = constraint_attribute('tension')
+
     def __init__(self, v1, v2, length: float, tension: float = LINK_TENSION, flag: LinkFlag = LinkFlag.NONE):
+        self.softbody = None # Set by the physics world once it caches this link's values
         self.v1 = v1
         self.v2 = v2
         self.length = length
         self.tension = tension
         self.flag = flag
 
-    def constrain_distance(self):
-        dx = self.v2.x - self.v1.x
-        dy = self.v2.y - self.v1.y
-        distance = max((dx**2 + dy**2)**(1/2), 1e-6)
-        fraction = ((self.length - distance) / distance) * self.tension
-        dx *= fraction
-        dy *= fraction
-
-        if self.v1.anchor:
-            self.v2.x += dx*2
-            self.v2.y += dy*2
-        elif self.v2.anchor:
-            self.v1.x -= dx*2
-            self.v1.y -= dy*2
-        else:
-            self.v1.x -= dx
-            self.v1.y -= dy
-            self.v2.x += dx
-            self.v2.y += dy
-
-        self.v1.constrain_tank_bounds()
-        self.v2.constrain_tank_bounds()
-
-    def compute_aabb(self):
-        self.minx = min(self.v1.x, self.v2.x)
-        self.maxx = max(self.v1.x, self.v2.x)
-        self.miny = min(self.v1.y, self.v2.y)
-        self.maxy = max(self.v1.y, self.v2.y)   
-
     def to_json(self):
-        return {'v1_id': id(self.v1), 'v2_id': id(self.v2), 'length': self.length, 
+        return {'v1_id': self.v1.id, 'v2_id': self.v2.id, 'length': self.length, 
                 'tension': self.tension, 'flag': self.flag.value}
     
     @staticmethod
@@ -113,38 +102,47 @@ class Link:
         return Link(v1, v2, json_dict['length'], json_dict['tension'], LinkFlag(json_dict['flag']))
     
 class AngleConstraint:
+    rest_angle = constraint_attribute('rest_angle')
+    stiffness = constraint_attribute('stiffness')
+
     def __init__(self, v1, v2, v3, rest_angle, stiffness=1.0):
+        self.softbody = None
         self.v1 = v1  # A
         self.v2 = v2  # B (pivot)
         self.v3 = v3  # C
         self.rest_angle = rest_angle
         self.stiffness = stiffness
 
-    def constrain(self):
-        a = Vector2(self.v1.x - self.v2.x, self.v1.y - self.v2.y)
-        b = Vector2(self.v3.x - self.v2.x, self.v3.y - self.v2.y)
-
-        if a.length_squared() == 0 or b.length_squared() == 0:
-            return
+# Vertex attributes that live in the PhysicsWorld arrays while the vertex is attached to one
+def world_attribute(name: str):
+    local_name = '_' + name
 
-        current = a.angle_to(b)
-        error = current - self.rest_angle
-        correction = error * self.stiffness
+    def get(self):
+        if self.world is None:
+            return getattr(self, local_name)
+        return getattr(self.world, name)[self.index]
 
-        if not self.v1.anchor:
-            a.rotate_ip(-correction * 0.5)
-            self.v1.x = self.v2.x + a.x
-            self.v1.y = self.v2.y + a.y
+    def set(self, value):
+        if self.world is None:
+            setattr(self, local_name, value)
+        else:
+            getattr(self.world, name)[self.index] = value
 
-        if not self.v3.anchor:
-            b.rotate_ip(correction * 0.5)
-            self.v3.x = self.v2.x + b.x
-            self.v3.y = self.v2.y + b.y
+    return property(get, set)
 
 class Vertex:
+    x = world_attribute('x')
+    y = world_attribute('y')
+    lx = world_attribute('lx')
+    ly = world_attribute('ly')
+    density = world_attribute('density')
+
     def __init__(self, x: float, y: float, density: float, links: list[Link], 
                  flag: VertexFlag = VertexFlag.NONE, anchor: bool = False, 
                  boundary: pygame.Rect | None = None, gravity: tuple[float, float] = (0, state.GRAVITY)):
+        self.world = None
+        self.index = -1
+        self.id = -1 # Given by the tank's vertex IdAllocator
         self.x = x
         self.y = y
         self.lx = x
@@ -159,6 +157,55 @@ class Vertex:
         else:
             self.boundary = boundary
 
+    @property
+    def anchor(self) -> bool:
+        if self.world is None:
+            return self._anchor
+        return bool(self.world.anchor[self.index])
+
+    @anchor.setter
+    def anchor(self, anchor: bool):
+        if self.world is None:
+            self._anchor = anchor
+        else:
+            self.world.anchor[self.index] = anchor
+
+    @property
+    def gravity(self) -> tuple[float, float]:
+        if self.world is None:
+            return self._gravity
+        return (self.world.gx[self.index], self.world.gy[self.index])
+
+    @gravity.setter
+    def gravity(self, gravity: tuple[float, float]):
+        if self.world is None:
+            self._gravity = gravity
+        else:
+            self.world.gx[self.index], self.world.gy[self.index] = gravity
+
+    @property
+    def boundary(self) -> pygame.Rect:
+        if self.world is None:
+            return self._boundary
+        return self.world.get_boundary(self.index)
+
+    @boundary.setter
+    def boundary(self, boundary: pygame.Rect):
+        if self.world is None:
+            self._boundary = boundary
+        else:
+            self.world.set_boundary(self.index, boundary)
+
+    # A detached vertex with its local state set directly, skipping the property setters, for bulk loading
+    @staticmethod
+    def from_values(x: float, y: float, density: float, flag: VertexFlag, anchor: bool,
+                    boundary: pygame.Rect | None, gravity: tuple[float, float], vertex_id: int = -1):
+        vertex = Vertex.__new__(Vertex)
+        vertex.__dict__.update(world=None, index=-1, id=vertex_id, _x=x, _y=y, _lx=x, _ly=y, _density=density, links=[],
+                               flag=flag, _anchor=anchor, _gravity=gravity,
+                               _boundary=boundary or pygame.Rect(0, 0, *state.tank_size()))
+        return vertex
+
     def x_y(self) -> tuple[float, float]:
         return (self.x, self.y)
     
@@ -171,176 +218,8 @@ class Vertex:
     def get_speed(self) -> float:
         return (self.get_dx()**2 + self.get_dy()**2)**(1/2)
     
-    def apply_mouse_grab_force(self):
-        self.x , self.y = get_relative_mouse_position()
-    
-    def apply_water_force(self):
-        vx, vy = get_mouse_velocity()
-        mouse_distance = distance(get_relative_mouse_position(), (self.x, self.y))
-        MWF = MOUSE_WATER_FORCE
-        self.lx -= max(-MWF, min(MWF, vx * MWF / (mouse_distance**2 + .1))) * 10
-        self.ly -= max(-MWF, min(MWF, vy * MWF / (mouse_distance**2 + .1))) * 10
-
-    def update_independently(self, collision_sculptures: list = [], do_collision: bool = True):
-        if self.anchor:
-            return
-
-        self.apply_water_force()
-
-        vx = (self.x - self.lx) * DRAG + self.gravity[0] * self.density
-        vy = (self.y - self.ly) * DRAG + self.gravity[1] * self.density
-
-        self.lx = self.x
-        self.ly = self.y
-
-        if not do_collision or not Vertex.collides_with_any_sculptures(self.x + vx, self.y + vy, collision_sculptures):
-            self.x += vx
-            self.y += vy
-
-    def constrain_tank_bounds(self):
-        if self.anchor:
-            return
-
-        if(self.x < self.boundary.x):
-            self.x = self.boundary.x
-            self.lx = self.boundary.x - self.get_dx() * BOUNCE_FORCE
-        elif(self.x > self.boundary.x + self.boundary.width):
-            self.x = self.boundary.x + self.boundary.width
-            self.lx = self.boundary.x + self.boundary.width - self.get_dx() * BOUNCE_FORCE
-        if(self.y < self.boundary.y):
-            self.y = self.boundary.y
-            self.ly = self.boundary.y - self.get_dy() * BOUNCE_FORCE
-        elif(self.y > self.boundary.y + self.boundary.height):
-            self.y = self.boundary.y + self.boundary.height
-            self.ly = self.boundary.y + self.boundary.height - self.get_dy() * BOUNCE_FORCE
-
-    def constrain_distance_to_static_link(self, link, vertex_radius: float = VERTEX_COLLISION_RADIUS):
-        # Broad-phase AABB rejection
-        if (self.x < link.minx - vertex_radius or self.x > link.maxx + vertex_radius or
-            self.y < link.miny - vertex_radius or self.y > link.maxy + vertex_radius):
-            return
-
-        # Link endpoints
-        link_start_x, link_start_y = link.v1.x, link.v1.y
-        link_end_x,   link_end_y   = link.v2.x, link.v2.y
-
-        # Current and previous vertex positions
-        curr_x, curr_y = self.x,  self.y
-        prev_x, prev_y = self.lx, self.ly
-
-        # Link direction vector
-        link_dx = link_end_x - link_start_x
-        link_dy = link_end_y - link_start_y
-        link_len_sq = link_dx * link_dx + link_dy * link_dy
-        if link_len_sq == 0:
-            return
-
-        # Project current vertex position onto link segment
-        to_curr_x = curr_x - link_start_x
-        to_curr_y = curr_y - link_start_y
-        t_closest = max(
-            0.0,
-            min(1.0, (to_curr_x * link_dx + to_curr_y * link_dy) / link_len_sq)
-        )
-
-        closest_x = link_start_x + link_dx * t_closest
-        closest_y = link_start_y + link_dy * t_closest
-
-        # Distance from vertex to link
-        sep_x = curr_x - closest_x
-        sep_y = curr_y - closest_y
-        distance = (sep_x * sep_x + sep_y * sep_y) ** 0.5
-
-        # Static overlap resolution
-        if 0 < distance < vertex_radius:
-            penetration = (vertex_radius - distance) / distance
-            self.x += sep_x * penetration
-            self.y += sep_y * penetration
-            return
-
-        # Vertex displacement over the timestep
-        vel_x = curr_x - prev_x
-        vel_y = curr_y - prev_y
-        if vel_x == 0 and vel_y == 0:
-            return
-
-        # Link outward normal (unit length)
-        inv_link_len = 1.0 / (link_len_sq ** 0.5)
-        normal_x = -link_dy * inv_link_len
-        normal_y =  link_dx * inv_link_len
-
-        # Signed distances to link plane at previous and current positions
-        prev_signed_dist = (
-            (prev_x - link_start_x) * normal_x +
-            (prev_y - link_start_y) * normal_y
-        )
-        curr_signed_dist = (
-            (curr_x - link_start_x) * normal_x +
-            (curr_y - link_start_y) * normal_y
-        )
-
-        r = vertex_radius
-
-        # No crossing of the collision slab
-        if (prev_signed_dist > r and curr_signed_dist > r) or \
-        (prev_signed_dist < -r and curr_signed_dist < -r):
-            return
-
-        denom = prev_signed_dist - curr_signed_dist
-        if denom == 0:
-            return
-
-        # Time of impact along the vertex path
-        toi = (prev_signed_dist - r) / denom
-        if toi < 0 or toi > 1:
-            return
-
-        # Contact point
-        hit_x = prev_x + vel_x * toi
-        hit_y = prev_y + vel_y * toi
-
-        # Check if contact lies within the segment
-        to_hit_x = hit_x - link_start_x
-        to_hit_y = hit_y - link_start_y
-        proj = (to_hit_x * link_dx + to_hit_y * link_dy) / link_len_sq
-        if proj < 0 or proj > 1:
-            return
-
-        # Resolve to non-penetrating position
-        self.x = hit_x + normal_x * r
-        self.y = hit_y + normal_y * r
-
-    @staticmethod
-    def collides_with_any_sculptures(px: float, py: float, collision_sculptures: list) -> bool:
-        for sculpture in collision_sculptures:
-            if Vertex.collides_with_sculpture(px, py, sculpture):
-                return True
-        return False
-
-    @staticmethod
-    def collides_with_sculpture(px: float, py: float, sculpture) -> bool:
-        polygon = sculpture.vertices
-        inside = False
-
-        n = len(polygon)
-        if n < 3:
-            return False
-
-        for i in range(n):
-            v1 = polygon[i]
-            v2 = polygon[(i + 1) % n]
-
-            x1, y1 = v1.x, v1.y
-            x2, y2 = v2.x, v2.y
-
-            intersects = ((y1 > py) != (y2 > py))
-            if intersects:
-                t = (py - y1) / (y2 - y1)
-                x_intersect = x1 + t * (x2 - x1)
-                if x_intersect > px:
-                    inside = not inside
-
-        return inside
+    def apply_mouse_grab_force(self, mouse_position: tuple[float, float]):
+        self.x , self.y = mouse_position
 
     def to_json(self) -> dict:
         if self.boundary:
@@ -365,40 +244,10 @@ class Softbody:
         self.vertices = vertices
         self.links = links
         self.angles = angles
-
-    def update(self, collision_links: list[Link] = [], collision_sculptures: list = [], 
-               do_collision: bool = True):
-        # Integrate motion
-        for vertex in self.vertices:
-            vertex.update_independently(collision_sculptures, do_collision)
-    
-            # Assign and apply mouse grab forces to the grabbed vertex
-            if get_mouse_presses()[0]:
-                if not state.vertex_grabbed and distance(vertex.x_y(), get_relative_mouse_position()) < MOUSE_GRAB_RADIUS:
-                    state.vertex_grabbed = vertex
-                if vertex == state.vertex_grabbed:
-                    vertex.apply_mouse_grab_force()
-            else:
-                state.vertex_grabbed = None
-
-        # Solve constraints + collisions together
-        for _ in range(CONSTRAINT_ITERATIONS):
-            for link in self.links:
-                link.constrain_distance()
-            for angle in self.angles:
-                angle.constrain()
-            for vertex in self.vertices:
-                vertex.constrain_tank_bounds()
-
-        if do_collision:
-            for _ in range(2):
-                for vertex in self.vertices:
-                    for static_link in collision_links:
-                        vertex.constrain_distance_to_static_link(static_link)
-
+        self.links_version = 0 # Bumped whenever one of its links or angles changes in place
 
     def to_json(self) -> dict:
-        vertex_ids = list(map(id, self.vertices))
+        vertex_ids = [vertex.id for vertex in self.vertices]
         links = [link.to_json() for link in self.links]
         return {'vertex_ids': vertex_ids, 'links': links}
     
@@ -1,8 +1,8 @@
 from pathlib import Path
 from enum import Enum
-import win32api
 import pygame
 import sys
+import os
 
 selected_tank = None
 
@@ -10,7 +10,7 @@ selected_tank = None
 SCALE: int = 5
 UI_HEIGHT: int = 19
 WINDOW_POSITION: tuple[int, int] = (0, 0)
-last_win_mouse_position = win32api.GetCursorPos()
+last_win_mouse_position: tuple[int, int] = (0, 0) # Set from win32api once the desktop window is up
 def tank_size() -> tuple[int, int]:
     if not selected_tank:
         raise BufferError("Cannot get tank dimensions: no tank assigned")
@@ -69,40 +69,57 @@ def get_base_path() -> Path:
 
 
 DESKTOP_AQUARIUM_FP = get_base_path()
-SAVES_FP = str(DESKTOP_AQUARIUM_FP) + "\\saves"
-FONT_FP = str(DESKTOP_AQUARIUM_FP) + "\\bin\\font"
-ICONS_FP = str(DESKTOP_AQUARIUM_FP) + "\\bin\\icons"
-TEXTURES_FP = str(DESKTOP_AQUARIUM_FP) + "\\bin\\textures"
+SAVES_FP = os.path.join(DESKTOP_AQUARIUM_FP, "saves")
+FONT_FP = os.path.join(DESKTOP_AQUARIUM_FP, "bin", "font")
+ICONS_FP = os.path.join(DESKTOP_AQUARIUM_FP, "bin", "icons")
+TEXTURES_FP = os.path.join(DESKTOP_AQUARIUM_FP, "bin", "textures")
 
 # Framerate control
-DEFAULT_FPS = 15
+DEFAULT_FPS = 30
 fps: int = DEFAULT_FPS
 frame_count: int = 0
 def frame_delay() -> float:
     return 1 / fps
+effects_quality: float = 1 # Fraction of ambient effects spawned, lowered by the governor under load or when idle
 
-# Buffer update scheduling
+# Physics runs on a fixed timestep of its own, independent of the display framerate
+PHYSICS_RATE = 15
+MAX_PHYSICS_SUBSTEPS = 4
+physics_rate: int = PHYSICS_RATE
+tick_count: int = 0
+def physics_delay() -> float:
+    return 1 / physics_rate
+
+# Buffer update scheduling: one key per compositor layer, flag a key to have that layer redrawn
 class BufferKey(Enum):
     BACKGROUND = 0
     STATIC_ENVIORMENT = 1
     UI = 2
     RENDERED_FRAME = 3
+    BACKGROUND_SCULPTURES = 4
+    ORGANISMS = 5
+    BUBBLES = 6
+    GODRAYS = 7
+    FOREGROUND_SCULPTURES = 8
+    PROFILER = 9
 buffer_update_flags: list[BufferKey] = []
 
 # Physics
 GRAVITY: float = 1
 vertex_grabbed = None
 
-def load_tank():
+def load_tank(tank_fp: str | None = None):
     global selected_tank
     global frame_count
+    global tick_count
     if not selected_tank:
         raise BufferError("Cannot load tank: no tank assigned")
-    new_tank = selected_tank.load() 
+    new_tank = selected_tank.load(tank_fp) 
     if new_tank:
         selected_tank = new_tank
         pygame.display.set_mode(window_size(), pygame.NOFRAME)
         frame_count = 0
+        tick_count = 0
 
 def unassign_selected_tank():
     global selected_tank
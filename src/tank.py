@@ -5,190 +5,231 @@ from graphics_resources import *
 from effects import *
 import random
 from state import BufferKey
-import win32api
-from sculpture import Sculpture, render_sculptures
+from sculpture import Sculpture, render_sculptures_onto, get_sculptures_signature
 from ui import *
 from softbody import *
+from physics import PhysicsWorld
+from collision import StaticCollisionCache
+from compositor import Compositor
+from tank_format import snapshot_tank, pack_tank, read_tank, assemble_tank, is_binary_tank, write_atomic
+from tank_journal import TankJournal, get_journal_fp, replay_journal
+from id_allocator import IdAllocator
+from autosave import is_autosave_fp
+import profiler
+import os
 import json
+import time
+from typing import Callable
 from supported_organisms import SUPPORTED_ORGANISM_TYPES, SPAWNABLE_ORGANISM_TYPES
 
 WATER_ALPHA = 80
 BACKGROUND_BRIGHTNESS = 0.8
 SCULPTURE_SIMPLIFY_RADIUS = 0.5
+FAST_FORWARD_PROGRESS_INTERVAL = 500 # ticks
+CATCH_UP_MAX_TICKS = state.PHYSICS_RATE * 60 * 60 * 4
+# Give each vertex the links that start at it
+def register_links(organisms: list[organism.Organism], sculptures: list[Sculpture]):
+    links: list[Link] = []
+    for organism_instance in organisms:
+        links += organism_instance.softbody.links
+    for sculpture in sculptures:
+        links += sculpture.links
+    for link in links:
+        link.v1.links.append(link)
+
 class Tank:
     def __init__(self, rect: pygame.Rect, organisms: list[organism.Organism], 
-                 sculptures: list[Sculpture], filepath: str | None = None):
+                 sculptures: list[Sculpture], filepath: str | None = None, saved_at: float | None = None):
         self.rect = rect
         self.organisms = organisms
-        self.buffers: dict[BufferKey, pygame.Surface] = {}
+        self.compositor = Compositor()
         self.godrays: list[Godray] = []
-        self.bubbles: list[Bubble] = []
+        self.godray_library = GodrayLibrary()
+        self.bubbles = BubbleSystem()
+        self.effects_version = 0 # Bumped whenever bubbles and godrays move, so their layers redraw only then
         self.paused = False
         self.ui: UI = UI()
         self.sculptures: list[Sculpture] = sculptures
         self.selected_sculpture: Sculpture | None = None
         self.filepath = filepath
+        self.saved_at = saved_at
+        self.input_snapshot = NEUTRAL_INPUT
+        self.pending_mouse_motion = (0, 0) # Mouse motion over the frames since the last physics tick
+        self.world = PhysicsWorld()
+        self.static_collision = StaticCollisionCache()
+        # Organisms and vertices keep the ids they were saved with
+        self.organism_ids = IdAllocator()
+        self.vertex_ids = IdAllocator()
+        self.organism_ids.adopt(self.organisms)
+        self.vertex_ids.adopt(self.get_vertices())
+        for organism_instance in self.organisms:
+            organism_instance.resolve_references(self.organism_ids)
 
         state.verify_tank_dimensions(self.rect.size)
 
-    def check_buffer_update_status(self, buffer_key: BufferKey):
-        is_in_buffers = buffer_key in self.buffers.keys()
-        flagged_for_update = buffer_key in state.buffer_update_flags
-        return (not is_in_buffers) or flagged_for_update
-    
     def spawn_organism(self):
         mouse_pos = get_relative_mouse_position()
         spawn_pos = (mouse_pos[0] - 1e-6, mouse_pos[1])
         organism_type = SPAWNABLE_ORGANISM_TYPES[self.ui.spawn_selection]
         self.organisms.append(organism_type.generate_random(spawn_pos))
 
-    def get_collision_sculptures(self) -> list[Sculpture]:
-        sculptures = []
-        for sculpture in self.sculptures:
-            if not sculpture.is_background:
-                sculptures.append(sculpture)
-        return sculptures
+    def get_static_collision(self) -> StaticCollisionCache:
+        self.static_collision.refresh(self.rect, self.sculptures)
+        return self.static_collision
 
-    def get_collision_links(self) -> list[Link]:
-        links = []
-        for sculpture in self.get_collision_sculptures():
-            links += sculpture.links
-        return links
+    # Must be called whenever sculpture geometry or layers change
+    def invalidate_static_collision(self):
+        self.static_collision.invalidate()
+        self.world.wake_all()
 
-    def update(self):
+    def update(self, input_snapshot: InputSnapshot = NEUTRAL_INPUT):
         state.buffer_update_flags = []
+        set_input_snapshot(input_snapshot)
+        self.input_snapshot = input_snapshot
+        self.pending_mouse_motion = (self.pending_mouse_motion[0] + input_snapshot.mouse_velocity[0],
+                                     self.pending_mouse_motion[1] + input_snapshot.mouse_velocity[1])
         
         # Spawn selected organism if enter is pressed
         for event in get_events():
             if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN: 
                 self.spawn_organism()
 
-        collision_links = self.get_collision_links()
-        collision_sculptures = self.get_collision_sculptures()
-        for link in collision_links:
-            link.compute_aabb()
-        if not self.paused:
-            for organism_instance in self.organisms:
-                organism_instance.update(self, collision_links, collision_sculptures)
         self.ui.update()
-    
-    def render(self, scale: float, overlay_frame: bool = False) -> pygame.Surface:
-
-        # Return what's in the buffer if the tank is paused
-        if self.paused and BufferKey.RENDERED_FRAME in self.buffers.keys():
-            return self.buffers[BufferKey.RENDERED_FRAME]
-
-        ui_surface_rect = (self.rect.width, self.rect.height + state.UI_HEIGHT)
-        surface = pygame.Surface(ui_surface_rect, pygame.SRCALPHA)
-
-        # Render background sculptures
-        surface.blit(self.render_background_sculptures(), (0, 0))
-
-        # Render background
-        surface.blit(self.render_background(), (0, 0))
 
-        # Render organisms
-        surface.blit(self.render_organisms(overlay_frame), (0, 0))
-
-        # Render foreground effects
-        surface.blit(self.render_bubbles(), (0, 0))
-        surface.blit(self.render_godrays(), (0, 0))
+    # Advance the simulation by one fixed physics tick
+    def step(self):
+        if self.paused:
+            return
+        tick_input = self.input_snapshot.with_mouse_velocity(self.pending_mouse_motion)
+        self.pending_mouse_motion = (0, 0)
+        self.simulate(tick_input)
+        self.step_effects()
+
+    # Organism AI and softbody physics only
+    def simulate(self, input_snapshot: InputSnapshot = NEUTRAL_INPUT):
+        self.world.store_previous_positions()
+        for organism_instance in self.organisms:
+            with profiler.section("ai " + type(organism_instance).__name__):
+                organism_instance.update(self)
+        static_collision = self.get_static_collision()
+        self.world.step(self.organisms, static_collision.grid, static_collision.occupancy, input_snapshot)
+        if profiler.enabled:
+            self.record_profiler_counts()
+
+    def record_profiler_counts(self):
+        profiler.record('organisms', len(self.organisms))
+        profiler.record('vertices', self.world.get_vertex_count())
+        profiler.record('awake vertices', self.world.get_vertex_count(awake_only=True))
+        profiler.record('links', sum(len(organism_instance.softbody.links) for organism_instance in self.organisms))
+        profiler.record('bubbles', len(self.bubbles))
+        profiler.record('godrays', len(self.godrays))
+
+    # Simulate ticks as fast as possible with neutral input and no rendering, returning ticks per second
+    def fast_forward(self, ticks: int, progress: Callable[[int, int, float], None] | None = None) -> float:
+        previous_input_snapshot = get_input_snapshot()
+        set_input_snapshot(NEUTRAL_INPUT)
+        state.vertex_grabbed = None
+        start_time = time.perf_counter()
+        try:
+            for tick in range(1, ticks + 1):
+                self.simulate()
+                state.tick_count += 1
+                if progress and (tick % FAST_FORWARD_PROGRESS_INTERVAL == 0 or tick == ticks):
+                    progress(tick, ticks, tick / max(time.perf_counter() - start_time, 1e-9))
+        finally:
+            set_input_snapshot(previous_input_snapshot)
+        self.world.store_previous_positions()
+        return ticks / max(time.perf_counter() - start_time, 1e-9)
+
+    # Fast forward by the time passed since the tank was saved
+    def catch_up(self, progress: Callable[[int, int, float], None] | None = None,
+                 max_ticks: int = CATCH_UP_MAX_TICKS) -> float:
+        if self.saved_at is None:
+            return 0
+        elapsed = max(time.time() - self.saved_at, 0)
+        ticks = min(int(elapsed * state.physics_rate), max_ticks)
+        return self.fast_forward(ticks, progress) if ticks else 0
+
+    def step_effects(self):
+        self.effects_version += 1
+        quality = state.effects_quality
+        if state.tick_count % GODRAY_FREQUENCY == 0 and (quality >= 1 or random.random() < quality):
+            self.godrays.append(Godray(random.random()*GODRAY_MAX_SIZE,
+                                       (biased_random_beta(strength=10)-0.5)*2*GODRAY_MAX_SLOPE))
+        for godray in self.godrays:
+            godray.update()
+        self.godrays = [godray for godray in self.godrays if godray.age <= GODRAY_LIFESPAN]
 
-        # Render foreground sculptures
-        surface.blit(self.render_foreground_sculptures(overlay_frame), (0, 0))
+        if state.tick_count % AMBIENT_BUBBLE_FREQUENCY == 0 and (quality >= 1 or random.random() < quality):
+            self.bubbles.spawn(random.random()*MAX_BUBBLE_SIZE + 0.1,
+                               random.randint(0, self.rect.width),
+                               self.rect.height+MAX_BUBBLE_SIZE)
+        for organism_instance in self.organisms:
+            bubble_chance = organism_instance.bubble_spawn_chance()
+            if bubble_chance and bubble_chance * quality > random.random():
+                self.bubbles.spawn(1, *organism_instance.root_position())
+        self.bubbles.update()
+    
+    # interpolation blends organism positions between the last two physics ticks
+    def render(self, scale: float, overlay_frame: bool = False, interpolation: float = 1) -> pygame.Surface:
 
-        # Render UI
-        surface.blit(self.render_ui(), (0, 0))
+        # Return the last frame if the tank is paused
+        compositor = self.compositor
+        compositor.fit(self.rect.size, scale)
+        if self.paused and compositor.has_frame():
+            return compositor.scaled_frame
 
-        surface = pygame.transform.scale_by(surface, scale)
-        self.buffers[BufferKey.RENDERED_FRAME] = surface
-        return surface 
-    
-    def render_background(self):
-        if self.check_buffer_update_status(BufferKey.BACKGROUND):
-
-            surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
-            background_image = load_texture('water_background')
-            background_image = pygame.transform.scale_by(background_image, 1/state.SCALE)
-            background_image.fill((255, 255, 255, WATER_ALPHA), None, pygame.BLEND_RGBA_MULT)
-            background_offset = (-(background_image.get_width() - self.rect.width)/2,
-                                 -(background_image.get_height() - self.rect.height)/2)
-            surface.blit(background_image, background_offset)
-            surface.fill((int(255*BACKGROUND_BRIGHTNESS),)*3, special_flags=pygame.BLEND_RGB_MULT)
-
-            self.buffers[BufferKey.BACKGROUND] = surface
-        return self.buffers[BufferKey.BACKGROUND]
-    
-    def render_background_sculptures(self):
         background_sculptures = list(filter(Sculpture.get_is_background, self.sculptures))
-        return render_sculptures(self.rect, background_sculptures, color=BLACK)
-
-    def render_foreground_sculptures(self, overlay_frame: bool = False):
         foreground_sculptures = list(filter(Sculpture.get_is_foreground, self.sculptures))
-        return render_sculptures(self.rect, foreground_sculptures, overlay_frame, color=WHITE)
-
-    def render_godrays(self):
-        surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
-        
-        if state.frame_count % GODRAY_FREQUENCY == 0:
-            self.godrays.append(Godray(random.random()/10, (biased_random_beta(strength=10)-0.5)*2))
-
-        new_godrays = []
-        for godray in self.godrays:
-            if godray.age <= GODRAY_LIFESPAN:
-                surface.blit(godray.render(), (0, 0))
-                new_godrays.append(godray)
-            godray.update()
-                
-        self.godrays = new_godrays
-        surface = pygame.transform.box_blur(surface, GODRAY_BLUR)
-        return surface
-
-    def render_bubbles(self):
-        surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
-        
-        if state.frame_count % AMBIENT_BUBBLE_FREQUENCY == 0:
-            self.bubbles.append(Bubble(random.random()*MAX_BUBBLE_SIZE + 0.1, 
-                                       random.randint(0, self.rect.width), 
-                                       self.rect.height+MAX_BUBBLE_SIZE))
-        new_bubbles = []
-        for bubble in self.bubbles:
-            if bubble.y + bubble.radius > 0:
-                bubble.render_onto(surface)
-                new_bubbles.append(bubble)
-            bubble.update()
-                    
-        self.bubbles = new_bubbles
-        return surface
+        compositor.draw_layer(BufferKey.BACKGROUND_SCULPTURES,
+                              lambda layer: render_sculptures_onto(layer, background_sculptures, color=BLACK),
+                              signature=get_sculptures_signature(background_sculptures))
+        compositor.draw_layer(BufferKey.BACKGROUND, self.render_background_onto, cached=True)
+        with self.world.interpolated(interpolation):
+            compositor.draw_layer(BufferKey.ORGANISMS, lambda layer: self.render_organisms_onto(layer, overlay_frame))
+        compositor.draw_layer(BufferKey.BUBBLES, self.render_bubbles_onto, signature=self.effects_version)
+        compositor.draw_layer(BufferKey.GODRAYS, self.render_godrays_onto, signature=self.effects_version)
+        compositor.draw_layer(BufferKey.FOREGROUND_SCULPTURES,
+                              lambda layer: render_sculptures_onto(layer, foreground_sculptures, overlay_frame, WHITE),
+                              signature=get_sculptures_signature(foreground_sculptures, overlay_frame))
+        compositor.draw_layer(BufferKey.UI, self.render_ui_onto, cached=True)
+        compositor.draw_layer(BufferKey.PROFILER, profiler.render_hud_onto, signature=profiler.get_hud_signature())
+        return compositor.composite()
     
-    def render_organisms(self, overlay_frame: bool = False) -> pygame.Surface:
-        surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
-        # Render organisms
+    def render_background_onto(self, surface: pygame.Surface):
+        background_image = load_texture('water_background')
+        background_image = pygame.transform.scale_by(background_image, 1/state.SCALE)
+        background_image.fill((255, 255, 255, WATER_ALPHA), None, pygame.BLEND_RGBA_MULT)
+        background_offset = (-(background_image.get_width() - self.rect.width)/2,
+                             -(background_image.get_height() - self.rect.height)/2)
+        surface.blit(background_image, background_offset)
+        surface.fill((int(255*BACKGROUND_BRIGHTNESS),)*3, special_flags=pygame.BLEND_RGB_MULT)
+
+    def render_godrays_onto(self, surface: pygame.Surface) -> list[pygame.Rect]:
+        return self.godray_library.render_onto(surface, self.godrays)
+
+    def render_bubbles_onto(self, surface: pygame.Surface) -> list[pygame.Rect]:
+        return self.bubbles.render_onto(surface)
+    
+    def render_organisms_onto(self, surface: pygame.Surface, overlay_frame: bool = False) -> list[pygame.Rect]:
+        extents = self.world.get_body_extents()
+        regions = []
         for organism_instance in self.organisms:
-            surface.blit(organism_instance.render(self.rect), (0, 0))
+            extent = extents.get(id(organism_instance.softbody))
+            regions.append(organism_instance.render_onto(surface, extent))
 
             # Overlay softbody frame if enabled
             if overlay_frame:
-                surface.blit(organism_instance.render_frame(self.rect), (0, 0))
-
-            # Spawn bubbles
-            bubble_chance = organism_instance.bubble_spawn_chance()
-            if bubble_chance and bubble_chance > random.random():
-                self.bubbles.append(Bubble(1, *organism_instance.root_position()))
-
-        return surface
+                organism_instance.render_frame_onto(surface, extent)
+        return regions
     
-    def render_ui(self) -> pygame.Surface:
-        if self.check_buffer_update_status(BufferKey.UI):
-            self.buffers[BufferKey.UI] = self.ui.render(self)
-        return self.buffers[BufferKey.UI]
+    def render_ui_onto(self, surface: pygame.Surface):
+        surface.blit(self.ui.render(self), (0, 0))
     
     def pause_tank(self):
-        state.fps = 60
         self.paused = True
 
     def unpause_tank(self):
-        state.fps = state.DEFAULT_FPS
         self.paused = False
 
     def new_sculpture(self):
@@ -202,6 +243,7 @@ class Tank:
         new_sculpture = Sculpture([], background)
         self.selected_sculpture = new_sculpture
         self.sculptures.append(new_sculpture)
+        self.invalidate_static_collision()
 
     def sculpt(self):
 
@@ -218,10 +260,12 @@ class Tank:
 
         self.selected_sculpture.add_vertex(Vertex(*get_relative_mouse_position(), 0, [], # type: ignore
                                                        VertexFlag.SCULPTURE)) 
+        self.invalidate_static_collision()
     
     def drag_window(self):
         self.pause_tank()
         # Update window position to follow mouse
+        import win32api
         mouse_pos = win32api.GetCursorPos()
         new_window_position = (state.WINDOW_POSITION[0] + mouse_pos[0] - state.last_win_mouse_position[0], 
                                state.WINDOW_POSITION[1] + mouse_pos[1] - state.last_win_mouse_position[1])
@@ -229,6 +273,11 @@ class Tank:
         state.last_win_mouse_position = mouse_pos
         pygame.display.set_window_position(new_window_position)
 
+    # Give everything new in the tank an id, after freeing the ids of whatever left it
+    def assign_ids(self):
+        self.organism_ids.assign(self.organisms)
+        self.vertex_ids.assign(self.get_vertices())
+
     def get_vertices(self) -> list[Vertex]:
         vertices = []
         for organism in self.organisms:
@@ -241,45 +290,93 @@ class Tank:
         tank_fp = prompt_for_save_tank(self.filepath)
         if tank_fp == '':
             return
-        with open(tank_fp, "w") as tank_file:
-            tank_file.write(self.to_json())
+        self.save_to(tank_fp)
 
+    # Saves in the binary format unless the path asks for JSON
+    def save_to(self, tank_fp: str):
+        if tank_fp.lower().endswith('.json'):
+            self.saved_at = time.time()
+            write_atomic(tank_fp, self.to_json().encode())
+        else:
+            write_atomic(tank_fp, self.to_bytes())
+
+    # Loads either format
     def load(self, tank_fp: str|None = None):
         if tank_fp == None:
             tank_fp = prompt_for_load_tank()
             if tank_fp == '':
                 return
-        with open(tank_fp) as tank_file:
-            loaded_tank = Tank.from_json(json.load(tank_file))
+        with open(tank_fp, "rb") as tank_file:
+            data = tank_file.read()
+        if is_binary_tank(data):
+            # Recover anything journaled since the snapshot
+            journal_data = None
+            if os.path.exists(get_journal_fp(tank_fp)):
+                with open(get_journal_fp(tank_fp), "rb") as journal_file:
+                    journal_data = journal_file.read()
+            loaded_tank = Tank.from_bytes(data, journal_data)
+        else:
+            loaded_tank = Tank.from_json(json.loads(data))
+        # A recovered autosave carries on as the tank it was saved from
+        if not (is_autosave_fp(tank_fp) and loaded_tank.filepath):
             loaded_tank.filepath = tank_fp
-            return loaded_tank
+        return loaded_tank
+
+    # The save as unpacked tables, copied so it can be packed and written off the main thread
+    def snapshot(self, journal: TankJournal | None = None) -> tuple[list, bytes]:
+        self.assign_ids()
+        if journal:
+            return journal.snapshot(self.organisms, self.sculptures, self.vertex_ids.owners, self.get_save_metadata(),
+                                    self.world)
+        return snapshot_tank(self.organisms, self.sculptures, self.vertex_ids.owners, self.get_save_metadata(),
+                             self.world)
+
+    # A journal entry holding what changed since the journal's last checkpoint
+    def checkpoint(self, journal: TankJournal) -> bytes:
+        self.assign_ids()
+        return journal.checkpoint(self.organisms, self.sculptures, self.vertex_ids.owners, self.get_save_metadata(),
+                                  self.world)
+
+    def get_save_metadata(self) -> dict:
+        self.saved_at = time.time()
+        return {'rect': (self.rect.x, self.rect.y, self.rect.width, self.rect.height),
+                'filepath': self.filepath, 'saved_at': self.saved_at}
+
+    def to_bytes(self) -> bytes:
+        return pack_tank(*self.snapshot())
+
+    @staticmethod
+    def from_bytes(data: bytes, journal_data: bytes | None = None):
+        parts = read_tank(data)
+        if journal_data:
+            parts = replay_journal(*parts, journal_data)
+        organisms, sculptures, metadata = assemble_tank(*parts)
+        register_links(organisms, sculptures)
+        return Tank(pygame.Rect(metadata['rect']), organisms, sculptures, metadata['filepath'],
+                    metadata.get('saved_at'))
 
     def to_json(self) -> str:
-        vertices = [dict(vertex.to_json(), **{'id': id(vertex)}) for vertex in self.get_vertices()]
+        self.assign_ids()
+        vertices = [dict(vertex.to_json(), **{'id': vertex.id}) for vertex in self.get_vertices()]
         rect = (self.rect.x, self.rect.y, self.rect.width, self.rect.height)
         organisms = [organism.to_json() for organism in self.organisms]
         sculptures = [sculpture.to_json() for sculpture in self.sculptures]
         json_dict = {'vertices': vertices, 'rect': rect, 'organisms': organisms, 'sculptures': sculptures,
-                     'filepath': self.filepath}
+                     'filepath': self.filepath, 'saved_at': self.saved_at}
         return json.dumps(json_dict)
 
     @staticmethod
     def from_json(json_dict: dict):
         ids_to_vertices = dict([(vertex_json['id'], Vertex.from_json(vertex_json)) 
                            for vertex_json in json_dict['vertices']])
+        for vertex_id, vertex in ids_to_vertices.items():
+            vertex.id = vertex_id
         rect = pygame.Rect(json_dict['rect'])
         organisms = [SUPPORTED_ORGANISM_TYPES[organism_json['type']].from_json(organism_json, ids_to_vertices)
                      for organism_json in json_dict['organisms']]
         sculptures = [Sculpture.from_json(sculpture_json, ids_to_vertices) 
                       for sculpture_json in json_dict['sculptures']]
         filepath = json_dict['filepath']
-        
-        links: list[Link] = []
-        for organism in organisms:
-            links += organism.softbody.links
-        for sculpture in sculptures:
-            links += sculpture.links
-        for link in links:
-            link.v1.links.append(link)
-
-        return Tank(rect, organisms, sculptures, filepath)
\ No newline at end of file
+        saved_at = json_dict.get('saved_at')
+        register_links(organisms, sculptures)
+        return Tank(rect, organisms, sculptures, filepath, saved_at)
\ No newline at end of file
@@ -0,0 +1,163 @@
+import os
+import json
+import struct
+import tempfile
+import numpy as np
+import pygame
+from softbody import *
+from sculpture import Sculpture
+from supported_organisms import SUPPORTED_ORGANISM_TYPES
+
+# Binary .tank: header, packed vertex, member, link, organism and sculpture tables, then JSON metadata
+TANK_MAGIC = b'DAQTANK\x00'
+TANK_FORMAT_VERSION = 1
+TANK_HEADER = struct.Struct('<8sHHIIIIII') # magic, version, reserved, table lengths, metadata size
+VERTEX_DTYPE = np.dtype([('x', '<f8'), ('y', '<f8'), ('density', '<f8'), ('gravity', '<f8', (2,)),
+                         ('boundary', '<i4', (4,)), ('has_boundary', 'u1'), ('flag', 'u1'), ('anchor', 'u1')])
+MEMBER_DTYPE = np.dtype('<u4')
+LINK_DTYPE = np.dtype([('v1', '<u4'), ('v2', '<u4'), ('length', '<f8'), ('tension', '<f8'), ('flag', 'u1')])
+ORGANISM_DTYPE = np.dtype([('member_start', '<u4'), ('member_count', '<u4'),
+                           ('link_start', '<u4'), ('link_count', '<u4')])
+SCULPTURE_DTYPE = np.dtype([('member_start', '<u4'), ('member_count', '<u4'), ('is_background', 'u1')])
+VERTEX_FLAGS = {flag.value: flag for flag in VertexFlag}
+LINK_FLAGS = {flag.value: flag for flag in LinkFlag}
+
+def is_binary_tank(data: bytes) -> bool:
+    return data[:len(TANK_MAGIC)] == TANK_MAGIC
+
+def vertex_row(vertex: Vertex) -> tuple:
+    boundary = vertex.boundary
+    return (vertex.x, vertex.y, vertex.density, vertex.gravity, tuple(boundary), bool(boundary),
+            vertex.flag.value, vertex.anchor)
+
+# Rows are vertex ids, with free ids left as zeroed rows
+def build_vertex_table(vertices: list[Vertex | None], world) -> np.ndarray:
+    table = np.zeros(len(vertices), dtype=VERTEX_DTYPE)
+    rows = [row for row, vertex in enumerate(vertices) if vertex is not None]
+    attached = [(row, vertices[row].index) for row in rows if vertices[row].world is world] # type: ignore
+    if attached:
+        attached_rows, slots = np.array(attached).T
+        table['x'][attached_rows] = world.x[slots]
+        table['y'][attached_rows] = world.y[slots]
+        table['density'][attached_rows] = world.density[slots]
+        table['gravity'][attached_rows] = np.column_stack((world.gx[slots], world.gy[slots]))
+        boundary = np.column_stack((world.min_x[slots], world.min_y[slots],
+                                    world.max_x[slots] - world.min_x[slots], world.max_y[slots] - world.min_y[slots]))
+        table['boundary'][attached_rows] = boundary # Truncated to whole pixels like pygame.Rect
+        table['has_boundary'][attached_rows] = (boundary[:, 2].astype(np.int32) != 0) & \
+                                               (boundary[:, 3].astype(np.int32) != 0)
+        table['anchor'][attached_rows] = world.anchor[slots]
+    detached = [row for row in rows if vertices[row].world is not world] # type: ignore
+    if detached:
+        table[detached] = np.array([vertex_row(vertices[row]) for row in detached], dtype=VERTEX_DTYPE) # type: ignore
+    table['flag'][rows] = [vertices[row].flag._value_ for row in rows] # type: ignore
+    return table
+
+def get_link_rows(links: list[Link]) -> list[tuple]:
+    return [(link.v1.id, link.v2.id, link.length, link.tension, link.flag._value_) for link in links]
+
+# Tables for a tank split up the way read_tank returns it
+def snapshot_parts(vertex_table: np.ndarray, organisms: list[tuple], sculptures: list[tuple],
+                   metadata: dict) -> tuple[list[np.ndarray], bytes]:
+    members: list[int] = []
+    links: list[tuple] = []
+    organism_rows = []
+    for organism_members, organism_links, _ in organisms:
+        organism_rows.append((len(members), len(organism_members), len(links), len(organism_links)))
+        members += organism_members
+        links += organism_links
+    sculpture_rows = []
+    for sculpture_members, is_background in sculptures:
+        sculpture_rows.append((len(members), len(sculpture_members), is_background))
+        members += sculpture_members
+
+    metadata = dict(metadata, organisms=[fields for _, _, fields in organisms])
+    tables = [vertex_table,
+              np.array(members, dtype=MEMBER_DTYPE),
+              np.array(links, dtype=LINK_DTYPE),
+              np.array(organism_rows, dtype=ORGANISM_DTYPE),
+              np.array(sculpture_rows, dtype=SCULPTURE_DTYPE)]
+    return tables, json.dumps(metadata).encode()
+
+# Copies what a save needs out of the live tank, so it can be packed and written on another thread
+def snapshot_tank(organisms: list, sculptures: list[Sculpture], vertices: list[Vertex | None], metadata: dict,
+                  world=None) -> tuple[list[np.ndarray], bytes]:
+    organism_parts = [([vertex.id for vertex in organism.softbody.vertices], get_link_rows(organism.softbody.links),
+                       organism.to_fields()) for organism in organisms]
+    sculpture_parts = [([vertex.id for vertex in sculpture.vertices], sculpture.is_background)
+                       for sculpture in sculptures]
+    return snapshot_parts(build_vertex_table(vertices, world), organism_parts, sculpture_parts, metadata)
+
+def pack_tank(tables: list[np.ndarray], metadata_bytes: bytes) -> bytes:
+    header = TANK_HEADER.pack(TANK_MAGIC, TANK_FORMAT_VERSION, 0, *map(len, tables), len(metadata_bytes))
+    return b''.join([header] + [table.tobytes() for table in tables] + [metadata_bytes])
+
+# Writes beside the target and renames over it, so the file is never left half written
+def write_atomic(fp: str, data: bytes):
+    temp_file = tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(os.path.abspath(fp)),
+                                            prefix='.', suffix='.tmp', delete=False)
+    try:
+        with temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_file.name, fp)
+    except BaseException:
+        if os.path.exists(temp_file.name):
+            os.remove(temp_file.name)
+        raise
+
+# Column by column, which numpy converts much faster than nested records
+def vertices_from_table(vertex_table: np.ndarray, ids: list[int] | range) -> list[Vertex]:
+    boundaries = [pygame.Rect(boundary) if has_boundary else None for boundary, has_boundary
+                  in zip(vertex_table['boundary'].tolist(), vertex_table['has_boundary'].tolist())]
+    return list(map(Vertex.from_values, vertex_table['x'].tolist(), vertex_table['y'].tolist(),
+                    vertex_table['density'].tolist(), map(VERTEX_FLAGS.get, vertex_table['flag'].tolist()),
+                    vertex_table['anchor'].astype(bool).tolist(), boundaries,
+                    map(tuple, vertex_table['gravity'].tolist()), ids))
+
+# The vertex, member, link, organism and sculpture tables as read-only views of data, and the metadata
+def read_tank_tables(data: bytes) -> tuple[list[np.ndarray], dict]:
+    if not is_binary_tank(data):
+        raise ValueError("Not a binary tank file")
+    magic, version, _, *lengths, metadata_size = TANK_HEADER.unpack_from(data)
+    if version > TANK_FORMAT_VERSION:
+        raise ValueError(f"Tank file version {version} is newer than supported version {TANK_FORMAT_VERSION}")
+
+    offset = TANK_HEADER.size
+    tables = []
+    for dtype, length in zip((VERTEX_DTYPE, MEMBER_DTYPE, LINK_DTYPE, ORGANISM_DTYPE, SCULPTURE_DTYPE), lengths):
+        tables.append(np.frombuffer(data, dtype, length, offset))
+        offset += dtype.itemsize * length
+    return tables, json.loads(data[offset:offset + metadata_size])
+
+# Splits a binary tank into vertices by id, then organisms and sculptures that refer to them by id
+def read_tank(data: bytes) -> tuple[list[Vertex], list[tuple], list[tuple], dict]:
+    tables, metadata = read_tank_tables(data)
+    vertex_table, member_table, link_table, organism_table, sculpture_table = tables
+
+    members = member_table.tolist()
+    links = link_table.tolist()
+    organisms = [(members[member_start:member_start + member_count], links[link_start:link_start + link_count],
+                  fields) for (member_start, member_count, link_start, link_count), fields
+                 in zip(organism_table.tolist(), metadata.pop('organisms'))]
+    sculptures = [(members[member_start:member_start + member_count], bool(is_background))
+                  for member_start, member_count, is_background in sculpture_table.tolist()]
+    return vertices_from_table(vertex_table, range(len(vertex_table))), organisms, sculptures, metadata
+
+# Builds the organisms and sculptures. Links are not yet registered with their vertices
+def assemble_tank(vertices: list[Vertex] | dict[int, Vertex], organisms: list[tuple], sculptures: list[tuple],
+                  metadata: dict) -> tuple[list, list[Sculpture], dict]:
+    organism_instances = []
+    for members, links, fields in organisms:
+        softbody = Softbody([vertices[index] for index in members],
+                            [Link(vertices[v1], vertices[v2], length, tension, LINK_FLAGS[flag])
+                             for v1, v2, length, tension, flag in links])
+        organism_instances.append(SUPPORTED_ORGANISM_TYPES[fields['type']].from_saved_fields(fields, softbody))
+    sculpture_instances = [Sculpture([vertices[index] for index in members], is_background)
+                           for members, is_background in sculptures]
+    return organism_instances, sculpture_instances, metadata
+
+# Returns (organisms, sculptures, metadata)
+def decode_tank(data: bytes) -> tuple[list, list[Sculpture], dict]:
+    return assemble_tank(*read_tank(data))
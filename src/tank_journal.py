@@ -0,0 +1,186 @@
+import os
+import json
+import zlib
+import struct
+import numpy as np
+from tank_format import *
+
+# Append-only .journal beside a .tank snapshot: a header naming the snapshot, then one entry per checkpoint
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_MAGIC = b'DAQJRNL\x00'
+JOURNAL_FORMAT_VERSION = 1
+JOURNAL_HEADER = struct.Struct('<8sHHd') # magic, version, reserved, saved_at of the snapshot
+JOURNAL_FRAME = struct.Struct('<II') # entry size, crc32 of the entry
+JOURNAL_ENTRY_HEADER = struct.Struct('<IIIII') # positions, vertex rows, members, links, changes size
+POSITION_CHANGE_DTYPE = np.dtype([('id', '<u4'), ('x', '<f8'), ('y', '<f8')])
+VERTEX_CHANGE_DTYPE = np.dtype([('id', '<u4'), ('vertex', VERTEX_DTYPE)])
+VERTEX_STATE_FIELDS = [name for name in VERTEX_DTYPE.names if name not in ('x', 'y')]
+
+def get_journal_fp(tank_fp: str) -> str:
+    return tank_fp + JOURNAL_SUFFIX
+
+def encode_journal_header(saved_at: float) -> bytes:
+    return JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_FORMAT_VERSION, 0, saved_at)
+
+def frame_journal_entry(entry: bytes) -> bytes:
+    return JOURNAL_FRAME.pack(len(entry), zlib.crc32(entry)) + entry
+
+# Appends one entry and flushes it to disk. An entry cut short by a crash fails its checksum and is dropped
+def append_journal_entry(journal_fp: str, entry: bytes):
+    with open(journal_fp, "ab") as journal_file:
+        journal_file.write(frame_journal_entry(entry))
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+
+# Tracks what the last entry recorded, so the next one only holds what changed since
+class TankJournal:
+    def __init__(self):
+        self.reset()
+
+    # Forget everything, so the next checkpoint records the whole tank
+    def reset(self):
+        self.vertex_rows = np.zeros(0, dtype=VERTEX_DTYPE) # As a replay would have them, by vertex id
+        self.structures: dict[int, tuple[list, list]] = {}
+        self.fields: dict[int, dict] = {}
+        self.order: list[int] = []
+        self.sculptures: list[tuple[list, bool]] = []
+
+    # Updates the recorded state to the tank's current one, returning the changes
+    def record(self, organisms: list, sculptures: list[Sculpture], vertices: list[Vertex | None], metadata: dict,
+               world=None) -> tuple[list[np.ndarray], dict]:
+        # Moved vertices record their position, new or otherwise changed ones their whole row
+        table = build_vertex_table(vertices, world)
+        live = np.fromiter((vertex is not None for vertex in vertices), dtype=bool, count=len(vertices))
+        previous = np.zeros(len(table), dtype=VERTEX_DTYPE)
+        previous[:len(self.vertex_rows)] = self.vertex_rows
+        changed = live & (table[VERTEX_STATE_FIELDS] != previous[VERTEX_STATE_FIELDS])
+        changed[len(self.vertex_rows):] = live[len(self.vertex_rows):]
+        moved = live & ~changed & ((table['x'] != previous['x']) | (table['y'] != previous['y']))
+        table[~live] = previous[~live]
+        self.vertex_rows = table
+        position_changes = np.zeros(np.count_nonzero(moved), dtype=POSITION_CHANGE_DTYPE)
+        position_changes['id'] = np.nonzero(moved)[0]
+        position_changes['x'] = table['x'][moved]
+        position_changes['y'] = table['y'][moved]
+        vertex_changes = np.zeros(np.count_nonzero(changed), dtype=VERTEX_CHANGE_DTYPE)
+        vertex_changes['id'] = np.nonzero(changed)[0]
+        vertex_changes['vertex'] = table[changed]
+
+        members: list[int] = []
+        links: list[tuple] = []
+        organism_changes = {}
+        order = []
+        for organism in organisms:
+            order.append(organism.id)
+            change = {}
+            structure = ([vertex.id for vertex in organism.softbody.vertices],
+                         get_link_rows(organism.softbody.links))
+            if self.structures.get(organism.id) != structure:
+                change['structure'] = (len(members), len(structure[0]), len(links), len(structure[1]))
+                members += structure[0]
+                links += structure[1]
+                self.structures[organism.id] = structure
+            fields = organism.to_fields()
+            if self.fields.get(organism.id) != fields:
+                change['fields'] = fields
+                self.fields[organism.id] = fields
+            if change:
+                organism_changes[organism.id] = change
+
+        current_ids = set(order)
+        changes: dict = {'metadata': metadata, 'organisms': organism_changes,
+                         'removed': [organism_id for organism_id in self.order if organism_id not in current_ids]}
+        for organism_id in changes['removed']:
+            del self.structures[organism_id]
+            del self.fields[organism_id]
+        if order != self.order:
+            changes['order'] = order
+        self.order = order
+
+        sculpture_parts = [([vertex.id for vertex in sculpture.vertices], sculpture.is_background)
+                           for sculpture in sculptures]
+        if sculpture_parts != self.sculptures:
+            changes['sculptures'] = []
+            for sculpture_members, is_background in sculpture_parts:
+                changes['sculptures'].append((len(members), len(sculpture_members), is_background))
+                members += sculpture_members
+            self.sculptures = sculpture_parts
+
+        tables = [position_changes, vertex_changes, np.array(members, dtype=MEMBER_DTYPE),
+                  np.array(links, dtype=LINK_DTYPE)]
+        return tables, changes
+
+    # A journal entry holding what changed since the last checkpoint
+    def checkpoint(self, organisms: list, sculptures: list[Sculpture], vertices: list[Vertex | None],
+                   metadata: dict, world=None) -> bytes:
+        tables, changes = self.record(organisms, sculptures, vertices, metadata, world)
+        changes_bytes = json.dumps(changes).encode()
+        header = JOURNAL_ENTRY_HEADER.pack(*map(len, tables), len(changes_bytes))
+        return b''.join([header] + [table.tobytes() for table in tables] + [changes_bytes])
+
+    # A full snapshot as snapshot_tank takes it, which later checkpoints record changes from
+    def snapshot(self, organisms: list, sculptures: list[Sculpture], vertices: list[Vertex | None], metadata: dict,
+                 world=None) -> tuple[list[np.ndarray], bytes]:
+        self.reset()
+        self.record(organisms, sculptures, vertices, metadata, world)
+        organism_parts = [self.structures[organism_id] + (self.fields[organism_id],) for organism_id in self.order]
+        return snapshot_parts(self.vertex_rows.copy(), organism_parts, self.sculptures, metadata)
+
+# Complete entries in order, stopping at the first one that is cut short or corrupt
+def read_journal_entries(journal_data: bytes, offset: int = JOURNAL_HEADER.size):
+    while offset + JOURNAL_FRAME.size <= len(journal_data):
+        size, checksum = JOURNAL_FRAME.unpack_from(journal_data, offset)
+        entry = journal_data[offset + JOURNAL_FRAME.size:offset + JOURNAL_FRAME.size + size]
+        if len(entry) < size or zlib.crc32(entry) != checksum:
+            return
+        yield entry
+        offset += JOURNAL_FRAME.size + size
+
+# Applies the journal to a snapshot split up by read_tank. Journals written against another snapshot are ignored
+def replay_journal(vertices: list[Vertex], organisms: list[tuple], sculptures: list[tuple], metadata: dict,
+                   journal_data: bytes) -> tuple[dict[int, Vertex], list[tuple], list[tuple], dict]:
+    magic, version, _, saved_at = JOURNAL_HEADER.unpack_from(journal_data)
+    if magic != JOURNAL_MAGIC:
+        raise ValueError("Not a tank journal")
+    if version > JOURNAL_FORMAT_VERSION:
+        raise ValueError(f"Journal version {version} is newer than supported version {JOURNAL_FORMAT_VERSION}")
+    vertex_map = dict(enumerate(vertices))
+    if saved_at != metadata.get('saved_at'):
+        return vertex_map, organisms, sculptures, metadata
+
+    organism_map = {fields['id']: (members, links, fields) for members, links, fields in organisms}
+    order = list(organism_map.keys())
+    for entry in read_journal_entries(journal_data):
+        *lengths, changes_size = JOURNAL_ENTRY_HEADER.unpack_from(entry)
+        offset = JOURNAL_ENTRY_HEADER.size
+        tables = []
+        for dtype, length in zip((POSITION_CHANGE_DTYPE, VERTEX_CHANGE_DTYPE, MEMBER_DTYPE, LINK_DTYPE), lengths):
+            tables.append(np.frombuffer(entry, dtype, length, offset))
+            offset += dtype.itemsize * length
+        position_changes, vertex_changes, member_table, link_table = tables
+        changes = json.loads(entry[offset:offset + changes_size])
+
+        for vertex_id, x, y in position_changes.tolist():
+            vertex = vertex_map[vertex_id]
+            vertex.x = vertex.lx = x
+            vertex.y = vertex.ly = y
+        vertex_ids = vertex_changes['id'].tolist()
+        vertex_map.update(zip(vertex_ids, vertices_from_table(vertex_changes['vertex'], vertex_ids)))
+        members = member_table.tolist()
+        links = link_table.tolist()
+        for organism_id in changes['removed']:
+            del organism_map[organism_id]
+        for organism_id, change in changes['organisms'].items():
+            organism_members, organism_links, fields = organism_map.get(int(organism_id), (None, None, None))
+            if 'structure' in change:
+                member_start, member_count, link_start, link_count = change['structure']
+                organism_members = members[member_start:member_start + member_count]
+                organism_links = links[link_start:link_start + link_count]
+            organism_map[int(organism_id)] = (organism_members, organism_links, change.get('fields', fields))
+        if 'order' in changes:
+            order = changes['order']
+        if 'sculptures' in changes:
+            sculptures = [(members[member_start:member_start + member_count], is_background)
+                          for member_start, member_count, is_background in changes['sculptures']]
+        metadata = changes['metadata']
+    return vertex_map, [organism_map[organism_id] for organism_id in order], sculptures, metadata
@@ -1,11 +1,14 @@
 import pygame
 import state
+import profiler
 from enum import Enum
+import os
 from types import MethodType, FunctionType
 from resources import *
 from organism import Organism
 from typing import Type
 from supported_organisms import SPAWNABLE_ORGANISM_TYPES
+from save_library import SaveEntry, get_save_library, THUMBNAIL_SIZE
 
 class SculptSwitchState(Enum):
     OFF = 0
@@ -28,15 +31,24 @@ UI_SHADOW_COLOR = (0, 0, 0)
 UI_INSET_COLOR = (10, 10, 10)
 UI_TEXT_COLOR = (50, 50, 50)
 LETTER_HEIGHT = 4
+SAVE_BROWSER_HEADER_HEIGHT = 8
+SAVE_BROWSER_CELL_SIZE = (THUMBNAIL_SIZE[0] + 2, THUMBNAIL_SIZE[1] + LETTER_HEIGHT + 1)
 class UI:
     def __init__(self):
         self.sculpt_swich_state: SculptSwitchState = SculptSwitchState.OFF
         self.spawn_selection: str = list(SPAWNABLE_ORGANISM_TYPES.keys())[0]
-        self.elements: dict[UIElementKey, UIElement] = {}
+        self.elements: dict[UIElementKey | tuple[UIElementKey, int], UIElement] = {}
+        self.browsing_saves: bool = False
+        self.save_entries: list[SaveEntry] = []
+        self.save_page: int = 0
+        self.saves_per_page: int = 1
+        self.hovered_save: int | None = None
 
     def render(self, tank) -> pygame.Surface:
+        self.elements = {}
         ui_surface_rect = (state.tank_width(), state.tank_height() + state.UI_HEIGHT)
         surface = pygame.Surface(ui_surface_rect, pygame.SRCALPHA)
+        profiler.increment('surfaces')
 
         # Tank border
 
@@ -135,7 +147,7 @@ class UI:
         surface.blit(render_button(load_button_rect, border_radius=2))
         load_label = render_text('load')
         surface.blit(load_label, (load_button_rect.left+9, load_button_rect.top+2))
-        self.elements[UIElementKey.LOAD_BUTTON] = UIElement(load_button_rect, state.load_tank, 
+        self.elements[UIElementKey.LOAD_BUTTON] = UIElement(load_button_rect, self.toggle_save_browser, 
                                                              is_button=True)
         
         layer_2_y = layer_1_y + 8
@@ -199,11 +211,106 @@ class UI:
         self.elements[UIElementKey.NEW_TANK_BUTTON] = UIElement(new_tank_button_rect, state.unassign_selected_tank, 
                                                                 is_button=True)
         
-        # Tank interactive surface (for sculpting)
-        self.elements[UIElementKey.TANK] = UIElement(pygame.Rect(0, 0, *state.tank_size()), tank.sculpt, 
-                                                     is_button=True)
+        # Save browser over the tank, or the tank interactive surface (for sculpting)
+        if self.browsing_saves:
+            self.render_save_browser(surface)
+        else:
+            self.elements[UIElementKey.TANK] = UIElement(pygame.Rect(0, 0, *state.tank_size()), tank.sculpt, 
+                                                         is_button=True)
 
         return surface
+
+    # Thumbnails of the saves folder from its index, a page at a time
+    def render_save_browser(self, surface: pygame.Surface):
+        browser_rect = pygame.Rect(0, 0, *state.tank_size())
+        pygame.draw.rect(surface, UI_INSET_COLOR, browser_rect)
+        pygame.draw.rect(surface, TANK_BORDER_COLOR, (0, 0, state.tank_width(), state.tank_height() + 1), 1)
+
+        columns = max(1, (state.tank_width() - 2) // SAVE_BROWSER_CELL_SIZE[0])
+        rows = max(1, (state.tank_height() - SAVE_BROWSER_HEADER_HEIGHT) // SAVE_BROWSER_CELL_SIZE[1])
+        self.saves_per_page = columns * rows
+        page_count = max(1, -(-len(self.save_entries) // self.saves_per_page))
+        self.save_page = min(self.save_page, page_count - 1)
+
+        # Page buttons
+        previous_page_rect = pygame.Rect(2, 1, 7, 7)
+        next_page_rect = pygame.Rect(previous_page_rect.right + 1, 1, 7, 7)
+        for page_rect, icon_name in ((previous_page_rect, 'minus'), (next_page_rect, 'plus')):
+            surface.blit(render_button(page_rect, border_radius=2))
+            surface.blit(render_icon(icon_name), (page_rect.left+2, page_rect.top+2))
+        self.elements[UIElementKey.PREVIOUS_SAVE_PAGE_BUTTON] = UIElement(previous_page_rect, 
+                                                                          self.previous_save_page, is_button=True)
+        self.elements[UIElementKey.NEXT_SAVE_PAGE_BUTTON] = UIElement(next_page_rect, self.next_save_page, 
+                                                                      is_button=True)
+
+        # File button, for tanks outside the saves folder
+        file_button_rect = pygame.Rect(next_page_rect.right + 2, 1, 19, 7)
+        surface.blit(render_button(file_button_rect, border_radius=2))
+        surface.blit(render_text('file'), (file_button_rect.left+2, file_button_rect.top+2))
+        self.elements[UIElementKey.LOAD_FILE_BUTTON] = UIElement(file_button_rect, self.load_from_file, 
+                                                                 is_button=True)
+
+        # Close button
+        close_button_rect = pygame.Rect(state.tank_width() - 22, 1, 20, 7)
+        surface.blit(render_button(close_button_rect, border_radius=2))
+        surface.blit(render_text('back'), (close_button_rect.left+2, close_button_rect.top+2))
+        self.elements[UIElementKey.CLOSE_SAVE_BROWSER_BUTTON] = UIElement(close_button_rect, 
+                                                                          self.toggle_save_browser, is_button=True)
+
+        # Details of the save under the mouse, or the page
+        if self.hovered_save is not None:
+            description = describe_save(self.save_entries[self.hovered_save])
+        elif self.save_entries:
+            description = f"page {self.save_page + 1} of {page_count}"
+        else:
+            description = 'no saves'
+        description_width = close_button_rect.left - file_button_rect.right - 6
+        surface.blit(render_text(description), (file_button_rect.right + 3, 3),
+                     (0, 0, description_width, LETTER_HEIGHT))
+
+        # Saves
+        first_index = self.save_page * self.saves_per_page
+        for index in range(first_index, min(first_index + self.saves_per_page, len(self.save_entries))):
+            entry = self.save_entries[index]
+            row, column = divmod(index - first_index, columns)
+            thumbnail_rect = pygame.Rect(2 + column * SAVE_BROWSER_CELL_SIZE[0],
+                                         SAVE_BROWSER_HEADER_HEIGHT + row * SAVE_BROWSER_CELL_SIZE[1], *THUMBNAIL_SIZE)
+            surface.blit(entry.thumbnail, thumbnail_rect)
+            if index == self.hovered_save:
+                pygame.draw.rect(surface, UI_TEXT_COLOR, thumbnail_rect, 1)
+            surface.blit(render_text(to_font_text(entry.name())), (thumbnail_rect.left, thumbnail_rect.bottom + 1),
+                         (0, 0, THUMBNAIL_SIZE[0], LETTER_HEIGHT))
+            entry_rect = thumbnail_rect.inflate(0, LETTER_HEIGHT + 1).move(0, (LETTER_HEIGHT + 1) // 2)
+            self.elements[(UIElementKey.SAVE_ENTRY, index)] = UIElement(entry_rect, 
+                                                                       lambda entry=entry: self.load_save(entry), 
+                                                                       is_button=True)
+
+    def toggle_save_browser(self):
+        self.browsing_saves = not self.browsing_saves
+        self.hovered_save = None
+        if self.browsing_saves:
+            self.save_entries = get_save_library().refresh()
+
+    def previous_save_page(self):
+        self.save_page = max(0, self.save_page - 1)
+        self.hovered_save = None
+
+    def next_save_page(self):
+        if (self.save_page + 1) * self.saves_per_page < len(self.save_entries):
+            self.save_page += 1
+        self.hovered_save = None
+
+    def load_save(self, entry: SaveEntry):
+        try:
+            state.load_tank(get_save_library().get_filepath(entry))
+        except OSError:
+            # Gone since the browser was opened
+            self.save_entries = get_save_library().refresh()
+            self.hovered_save = None
+
+    def load_from_file(self):
+        self.browsing_saves = False
+        state.load_tank()
     
     def set_sculpt_mode_off(self):
         self.sculpt_swich_state = SculptSwitchState.OFF
@@ -227,6 +334,21 @@ class UI:
         mouse_pressed = get_mouse_presses()[0]
         for ui_element in self.elements.values():
             ui_element.apply(mouse_pressed)
+        if self.browsing_saves:
+            hovered_save = next((key[1] for key, ui_element in self.elements.items()
+                                 if isinstance(key, tuple) and ui_element.mouse_collision()), None)
+            if hovered_save != self.hovered_save:
+                self.hovered_save = hovered_save
+                state.buffer_update_flags.append(state.BufferKey.UI)
+
+# Lowercased, with characters the font lacks shown as spaces
+def to_font_text(text: str) -> str:
+    return ''.join(letter if letter in FONT_CHARACTERS else ' ' for letter in text.lower()).strip() or '_'
+
+def describe_save(entry: SaveEntry) -> str:
+    species = [f"{count} {species_name}" for species_name, count in entry.species_counts.items()]
+    name = ['autosave', entry.name()] if entry.is_autosave() else [entry.name()]
+    return to_font_text(' '.join(name + species + [f"{entry.sculpture_count} sculptures"]))
 
 class UIElementKey(Enum):
     GRIP = 0
@@ -243,6 +365,11 @@ class UIElementKey(Enum):
     INCREMENT_HEIGHT_BUTTON = 11
     DECREMENT_HEIGHT_BUTTON = 12
     SPAWN_SELECTION_BUTTON = 13
+    PREVIOUS_SAVE_PAGE_BUTTON = 14
+    NEXT_SAVE_PAGE_BUTTON = 15
+    LOAD_FILE_BUTTON = 16
+    CLOSE_SAVE_BROWSER_BUTTON = 17
+    SAVE_ENTRY = 18 # Keyed with the entry's index
 
 class UIElement:
     def __init__(self, hitbox: pygame.Rect, function_reference: MethodType | FunctionType, is_button: bool = False, 
@@ -292,33 +419,59 @@ def letter_to_filename(letter: str) -> str:
             return letter
         
     
+FONT_CHARACTERS = "abcdefghijklmnopqrstuvwxyz0123456789=_ *"
+TEXT_CACHE_SIZE = 128 # Rendered strings kept, least recently used dropped first
+
+# Every glyph packed side by side into one surface the first time text is rendered
+glyph_atlas: pygame.Surface | None = None
+glyph_rects: dict[str, pygame.Rect] = {}
+def load_glyph_atlas() -> pygame.Surface:
+    global glyph_atlas
+    if glyph_atlas is None:
+        glyphs = {letter: pygame.image.load(os.path.join(state.FONT_FP, f"{letter_to_filename(letter)}.png"))
+                  for letter in FONT_CHARACTERS}
+        glyph_atlas = pygame.Surface((sum(glyph.get_width() for glyph in glyphs.values()), LETTER_HEIGHT),
+                                     pygame.SRCALPHA)
+        cursor_x = 0
+        for letter, glyph in glyphs.items():
+            glyph_rects[letter] = glyph_atlas.blit(glyph.convert_alpha(), (cursor_x, 0))
+            cursor_x += glyph.get_width()
+    return glyph_atlas
+
+# Rendered strings and icons are shared between callers, so they must not be modified
+text_cache: dict[tuple[str, tuple], pygame.Surface] = {}
 def render_text(text: str, color: pygame.Color | tuple[int, int, int] = UI_TEXT_COLOR):
     text = text.lower()
-    try:
-        letter_surfaces: list[pygame.Surface] = []
-        for letter in text:
-            letter_surface = pygame.image.load(state.FONT_FP + f"\\{letter_to_filename(letter)}.png").convert_alpha()
-            letter_surfaces.append(letter_surface)
-
-        text_surface_width = sum(list(map(pygame.Surface.get_width, letter_surfaces))) + len(text) - 1 
+    key = (text, tuple(color))
+    text_surface = text_cache.pop(key, None)
+    if text_surface is None:
+        atlas = load_glyph_atlas()
+        if not text or any(letter not in glyph_rects for letter in text):
+            raise Exception(f"Cannot render text \"{text}\": contains unsupported character(s)")
+
+        text_surface_width = sum(glyph_rects[letter].width for letter in text) + len(text) - 1
         text_surface = pygame.Surface((text_surface_width, LETTER_HEIGHT), pygame.SRCALPHA)
+        profiler.increment('surfaces')
         cursor_x = 0
-        for letter_surface in letter_surfaces:
-            text_surface.blit(letter_surface, (cursor_x, 0))
-            cursor_x += letter_surface.width + 1
-        
+        for letter in text:
+            glyph_rect = glyph_rects[letter]
+            text_surface.blit(atlas, (cursor_x, 0), glyph_rect)
+            cursor_x += glyph_rect.width + 1
+
         text_surface.fill(color, special_flags=pygame.BLEND_RGB_ADD)
-        return text_surface
-    except:
-        raise Exception(f"Cannot render text \"{text}\": contains unsupported character(s)")
+        if len(text_cache) >= TEXT_CACHE_SIZE:
+            del text_cache[next(iter(text_cache))]
+    text_cache[key] = text_surface
+    return text_surface
 
+icon_cache: dict[tuple[str, tuple], pygame.Surface] = {}
 def render_icon(name: str, color: pygame.Color | tuple[int, int, int] = UI_TEXT_COLOR):
-    
-    icon_surface = pygame.image.load(state.ICONS_FP + f"\\{name}.png").convert_alpha()
-    
-    icon_surface.fill(color, special_flags=pygame.BLEND_RGB_ADD)
-
-    return icon_surface
+    key = (name, tuple(color))
+    if key not in icon_cache:
+        icon_surface = pygame.image.load(os.path.join(state.ICONS_FP, f"{name}.png")).convert_alpha()
+        icon_surface.fill(color, special_flags=pygame.BLEND_RGB_ADD)
+        icon_cache[key] = icon_surface
+    return icon_cache[key]
 
 def render_button(rect: pygame.Rect, fill_color: pygame.Color | tuple[int, int, int] = UI_BASE_COLOR,
                   lower_border_color: pygame.Color | tuple[int, int, int] = UI_SHADOW_COLOR,
@@ -329,6 +482,7 @@ def render_button(rect: pygame.Rect, fill_color: pygame.Color | tuple[int, int,
     pygame.draw.rect(surface, lower_border_color, rect, 1, border_radius=border_radius)
 
     upper_border_surface = pygame.Surface((rect.width, rect.height/2), pygame.SRCALPHA)
+    profiler.increment('surfaces', 2)
     pygame.draw.rect(upper_border_surface, upper_border_color, (0, 0, *rect.size), 
                      1, border_radius=border_radius)
     surface.blit(upper_border_surface, rect)
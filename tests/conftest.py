@@ -0,0 +1,30 @@
+import os
+import sys
+import json
+import pytest
+
+# The game's modules live flat in src and import each other by name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from headless import init_headless_display, load_headless_tank
+import state
+
+@pytest.fixture(scope="session", autouse=True)
+def headless_display():
+    init_headless_display()
+
+@pytest.fixture
+def tank():
+    return load_headless_tank(os.path.join(state.SAVES_FP, "Twin Rocks.tank"))
+
+# Everything a save holds, minus when and where it was saved
+def describe_tank(tank) -> dict:
+    description = json.loads(tank.to_json())
+    description.pop('saved_at', None)
+    description.pop('filepath', None)
+    return description
+
+# The tank as a full save restores it. Some species don't save every field, e.g. a crab's age
+def describe_saved_tank(tank, tank_fp: str) -> dict:
+    tank.save_to(tank_fp)
+    return describe_tank(tank.load(tank_fp))
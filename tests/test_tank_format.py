@@ -0,0 +1,11 @@
+from conftest import describe_tank
+
+def test_binary_round_trip(tank, tmp_path):
+    tank_fp = str(tmp_path / "round trip.tank")
+    tank.save_to(tank_fp)
+    assert describe_tank(tank.load(tank_fp)) == describe_tank(tank)
+
+def test_json_round_trip(tank, tmp_path):
+    tank_fp = str(tmp_path / "round trip.json")
+    tank.save_to(tank_fp)
+    assert describe_tank(tank.load(tank_fp)) == describe_tank(tank)
@@ -0,0 +1,51 @@
+from autosave import Autosaver
+from headless import run_headless
+from softbody import Vertex
+from supported_organisms import SPAWNABLE_ORGANISM_TYPES
+from tank_journal import get_journal_fp
+from conftest import describe_tank, describe_saved_tank
+
+def checkpoint(autosaver: Autosaver, tank):
+    autosaver.save(tank)
+    autosaver.idle.wait()
+    assert autosaver.last_error is None
+
+def test_journal_replays_edits(tank, tmp_path):
+    autosaver = Autosaver(0, str(tmp_path / "autosave"))
+    checkpoint(autosaver, tank)
+    run_headless(tank, 20)
+    checkpoint(autosaver, tank)
+
+    del tank.organisms[1:3]
+    tank.organisms.append(SPAWNABLE_ORGANISM_TYPES['Goby'].generate_random((100, 60)))
+    run_headless(tank, 20)
+    checkpoint(autosaver, tank)
+
+    sculpture = next(sculpture for sculpture in tank.sculptures if not sculpture.is_background)
+    sculpture.add_vertex(Vertex(5, 25, 1, []))
+    checkpoint(autosaver, tank)
+    autosaver.close()
+
+    tank_fp = autosaver.get_autosave_fp(tank)
+    assert describe_tank(tank.load(tank_fp)) == describe_saved_tank(tank, str(tmp_path / "saved.tank"))
+
+def test_torn_journal_entry_is_dropped(tank, tmp_path):
+    autosaver = Autosaver(0, str(tmp_path / "autosave"))
+    checkpoint(autosaver, tank)
+    run_headless(tank, 20)
+    checkpoint(autosaver, tank)
+    expected = describe_saved_tank(tank, str(tmp_path / "saved.tank"))
+
+    tank.organisms.append(SPAWNABLE_ORGANISM_TYPES['Goby'].generate_random((100, 60)))
+    run_headless(tank, 20)
+    checkpoint(autosaver, tank)
+    autosaver.close()
+
+    # A crash partway through appending leaves only the start of the last entry
+    tank_fp = autosaver.get_autosave_fp(tank)
+    journal_fp = get_journal_fp(tank_fp)
+    with open(journal_fp, "rb") as journal_file:
+        journal_data = journal_file.read()
+    with open(journal_fp, "wb") as journal_file:
+        journal_file.write(journal_data[:-7])
+    assert describe_tank(tank.load(tank_fp)) == expected